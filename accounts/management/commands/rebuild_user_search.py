@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from accounts.models import UserSearch
+
+
+class Command(BaseCommand):
+    help = "Rebuild the lowercase search rows used by the admin user directory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        batch_size = options["batch_size"]
+        users = User.objects.only("pk", *UserSearch.SEARCH_FIELDS).order_by("pk")
+
+        total = 0
+        last_pk = 0
+        while True:
+            batch = list(users.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            UserSearch.sync(batch, batch_size=batch_size)
+            total += len(batch)
+            last_pk = batch[-1].pk
+        self.stdout.write(self.style.SUCCESS(f"User search rebuilt for {total} users."))
@@ -8,13 +8,47 @@ class Profile(models.Model):
         ATTENDEE = "attendee", "Attendee"
 
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
-    role = models.CharField(max_length=20, choices=Roles.choices, default="attendee")
+    role = models.CharField(max_length=20, choices=Roles.choices, default="attendee", db_index=True)
     phone = models.CharField(max_length=30, blank=True)
     organization = models.CharField(max_length=150, blank=True)
     position = models.CharField(max_length=150, blank=True)
     bio = models.TextField(blank=True)
     website = models.URLField(blank=True)
     verified = models.BooleanField(default=False)
+    # Set when an admin deletes the user; events.deletion purges the account later
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     def __str__(self):
-        return f"{self.user.username} ({self.role})"
\ No newline at end of file
+        return f"{self.user.username} ({self.role})"
+
+
+class UserSearch(models.Model):
+    """
+    Lowercased copies of the searchable User fields. Kept in sync on every
+    User save so the admin user directory can do indexed prefix lookups.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="search")
+    username = models.CharField(max_length=150, db_index=True)
+    first_name = models.CharField(max_length=150, db_index=True)
+    last_name = models.CharField(max_length=150, db_index=True)
+    email = models.CharField(max_length=254, db_index=True)
+
+    SEARCH_FIELDS = ("username", "first_name", "last_name", "email")
+
+    def __str__(self):
+        return self.username
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user_id=user.pk, **{f: (getattr(user, f) or "").lower() for f in cls.SEARCH_FIELDS})
+
+    @classmethod
+    def sync(cls, users, batch_size=1000):
+        """Insert or refresh the search rows for ``users``."""
+        cls.objects.bulk_create(
+            [cls.from_user(u) for u in users],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=list(cls.SEARCH_FIELDS),
+        )
@@ -0,0 +1,22 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from events.caching import invalidate as invalidate_views
+
+from .models import Profile, UserSearch
+
+
+@receiver(post_save, sender=User)
+def sync_user_search(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    UserSearch.sync([instance])
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def refresh_profile_views(sender, instance, raw=False, **kwargs):
+    """The admin dashboard counts users by role."""
+    if not raw:
+        invalidate_views("profiles")
@@ -1,3 +1,23 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from .models import UserSearch
+
+
+class UserSearchTests(TestCase):
+    def test_kept_in_sync_with_user(self):
+        user = User.objects.create_user("AnnaR", "Anna.Reyes@Example.com", "pw", first_name="Anna", last_name="Reyes")
+        row = UserSearch.objects.get(user=user)
+        self.assertEqual((row.username, row.first_name, row.last_name, row.email),
+                         ("annar", "anna", "reyes", "anna.reyes@example.com"))
+
+        user.last_name = "Santos"
+        user.save()
+        self.assertEqual(UserSearch.objects.get(user=user).last_name, "santos")
+        self.assertEqual(UserSearch.objects.count(), 1)
+
+    def test_sync_backfills_missing_rows(self):
+        user = User.objects.create_user("ben", "ben@example.com", "pw")
+        UserSearch.objects.all().delete()
+        UserSearch.sync(User.objects.all())
+        self.assertEqual(UserSearch.objects.get(user=user).username, "ben")
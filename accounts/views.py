@@ -9,6 +9,8 @@ from django.contrib.auth.decorators import login_required
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from .forms import AdminUserForm
+from events import audit
+from events.deletion import tombstone_user
 
 #def login_user(request):
     #if request.method == "POST":
@@ -75,15 +77,17 @@ def admin_user_edit(request, pk):
         messages.error(request, "Admin access only.")
         return redirect("events:admin_user_management")
 
-    user_obj = get_object_or_404(User, pk=pk)
+    user_obj = get_object_or_404(User, pk=pk, profile__deleted_at__isnull=True)
     profile, _ = Profile.objects.get_or_create(user=user_obj)
 
     if request.method == "POST":
-        form = AdminUserForm(request.POST, instance=user_obj)
+        form = AdminUserForm(request.POST, instance=user_obj, initial={"role": profile.role})
         if form.is_valid():
-            user_obj = form.save()
-            profile.role = form.cleaned_data["role"]
-            profile.save()
+            with transaction.atomic():
+                user_obj = form.save()
+                profile.role = form.cleaned_data["role"]
+                profile.save()
+                audit.record(request, "user.update", user_obj, changes=audit.form_changes(form))
             messages.success(request, "User updated successfully.")
             return redirect("events:admin_user_management")
         else:
@@ -103,14 +107,21 @@ def admin_user_delete(request, pk):
         messages.error(request, "Admin access only.")
         return redirect("events:admin_user_management")
 
-    user_obj = get_object_or_404(User, pk=pk)
+    user_obj = get_object_or_404(User, pk=pk, profile__deleted_at__isnull=True)
 
     if user_obj == request.user:
         messages.error(request, "You cannot delete your own account.")
         return redirect("events:admin_user_management")
 
     if request.method == "POST":
-        user_obj.delete()
+        with transaction.atomic():
+            profile = getattr(user_obj, "profile", None)
+            audit.record(request, "user.delete", user_obj, changes={
+                "email": user_obj.email,
+                "role": profile.role if profile else "",
+            })
+            # Their seats and feedback go now, their events in the background
+            tombstone_user(user_obj)
         messages.success(request, "User deleted successfully.")
         return redirect("events:admin_user_management")
 
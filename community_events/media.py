@@ -0,0 +1,140 @@
+"""
+Serving of user-uploaded files under MEDIA_ROOT.
+
+``serve_media`` replaces ``django.views.static.serve`` for media in every
+environment. It answers conditional requests with 304, supports single
+byte ranges (so browsers can resume large images), and sets long-lived
+cache headers. Whole files go out through FileResponse, which lets the
+WSGI server use sendfile().
+
+When MEDIA_SENDFILE_HEADER is set ("X-Accel-Redirect" for nginx,
+"X-Sendfile" for Apache/lighttpd) the view only checks the file exists and
+hands the transfer to the front-end server.
+"""
+
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def media_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) for a single "bytes=" range, None to ignore the header,
+    or False if the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # Multiple ranges or other units: serving the full file is allowed
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range, e.g. "bytes=-500" is the last 500 bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def read_range(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def not_modified(request, etag, mtime):
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        return if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]
+    since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+    return since is not None and int(mtime) <= since
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Invalid media path.")
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404("Media file not found.")
+    if not os.path.isfile(full_path):
+        raise Http404("Media file not found.")
+
+    size = stat.st_size
+    etag = f'"{int(stat.st_mtime):x}-{size:x}"'
+    last_modified = http_date(stat.st_mtime)
+    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    cache_control = f"public, max-age={media_setting('MEDIA_CACHE_MAX_AGE', 60 * 60 * 24 * 30)}"
+
+    if not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+    elif media_setting("MEDIA_SENDFILE_HEADER", None):
+        # Front-end server does the transfer, including ranges
+        response = HttpResponse(content_type=content_type)
+        header = settings.MEDIA_SENDFILE_HEADER
+        if header.lower() == "x-accel-redirect":
+            response[header] = media_setting("MEDIA_SENDFILE_PREFIX", "/protected-media/") + path
+        else:
+            response[header] = full_path
+    else:
+        byte_range = None
+        if_range = request.headers.get("If-Range")
+        if "Range" in request.headers and (if_range is None or if_range in (etag, last_modified)):
+            byte_range = parse_range(request.headers["Range"], size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+        elif byte_range is None:
+            response = FileResponse(open(full_path, "rb"), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                read_range(full_path, start, end - start + 1),
+                status=206,
+                content_type=content_type,
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = end - start + 1
+
+        response["Accept-Ranges"] = "bytes"
+        response["Last-Modified"] = last_modified
+
+    response["ETag"] = etag
+    response["Cache-Control"] = cache_control
+    return response
@@ -0,0 +1,377 @@
+"""
+Request metrics in Prometheus text format.
+
+MetricsMiddleware (in middleware.py) times every request, counts the
+database queries and cache lookups it made and the size of its response,
+labelled by resolved URL name and status. Values go into a small
+memory-mapped file owned by the current process under METRICS_DIR, so
+workers never lock each other. The ``metrics`` view reads every file in
+that directory and sums them into one exposition.
+
+Histogram buckets are stored as plain per-bucket counts and only made
+cumulative when scraped, so an observation touches a single slot.
+
+A scrape folds the files of processes that have exited into DEAD_FILE and
+deletes them, which keeps counters monotonic across worker restarts
+without the files piling up. Processes are looked up by pid, so
+METRICS_DIR must not be shared between hosts. Empty it when the whole
+server is restarted.
+"""
+
+import contextvars
+import fcntl
+import glob
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.module_loading import import_string
+
+
+HEADER = struct.Struct("<I4x")
+KEY_LENGTH = struct.Struct("<I")
+VALUE = struct.Struct("<d")
+INITIAL_SIZE = 64 * 1024
+# Totals of the processes that have exited; matches the process file pattern
+DEAD_FILE = "metrics_dead.db"
+LOCK_FILE = "scrape.lock"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+METRICS = {
+    "http_request_duration_seconds": ("histogram", "Time spent handling the request.", LATENCY_BUCKETS),
+    "http_response_size_bytes": ("histogram", "Size of the response body.", SIZE_BUCKETS),
+    "db_queries_per_request": ("histogram", "Database queries run by one request.", QUERY_BUCKETS),
+    "db_queries_total": ("counter", "Database queries run while handling requests.", None),
+    "db_query_duration_seconds_total": ("counter", "Time spent in database queries while handling requests.", None),
+    "cache_requests_total": ("counter", "Cache lookups made while handling requests, by result.", None),
+}
+
+
+def metrics_dir():
+    path = getattr(settings, "METRICS_DIR", None) or os.path.join(tempfile.gettempdir(), "community_events_metrics")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def padded(length):
+    return length + (-length % 8)
+
+
+class MmapedDict:
+    """
+    Append-only table of float slots in a memory-mapped file.
+
+    Layout: an 8 byte header holding the number of bytes in use, then
+    entries of (uint32 key length, utf-8 key padded to 8 bytes, float64).
+    The header is only bumped after an entry is fully written, so readers
+    in other processes never see half an entry.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a+b")
+        if os.fstat(self.file.fileno()).st_size == 0:
+            self.file.truncate(INITIAL_SIZE)
+        self.capacity = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), self.capacity)
+        self.positions = {}
+        self.used = HEADER.unpack_from(self.map, 0)[0] or HEADER.size
+        for key, _, position in iter_entries(self.map, self.used):
+            self.positions[key] = position
+
+    def add(self, key, amount):
+        position = self.positions.get(key)
+        if position is None:
+            position = self.append(key)
+        value = VALUE.unpack_from(self.map, position)[0]
+        VALUE.pack_into(self.map, position, value + amount)
+
+    def append(self, key):
+        encoded = key.encode("utf-8")
+        size = KEY_LENGTH.size + padded(len(encoded)) + VALUE.size
+        if self.used + size > self.capacity:
+            self.grow(self.used + size)
+        start = self.used
+        KEY_LENGTH.pack_into(self.map, start, len(encoded))
+        self.map[start + KEY_LENGTH.size:start + KEY_LENGTH.size + len(encoded)] = encoded
+        position = start + KEY_LENGTH.size + padded(len(encoded))
+        VALUE.pack_into(self.map, position, 0.0)
+        self.used += size
+        HEADER.pack_into(self.map, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def grow(self, needed):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        self.map.close()
+        self.file.truncate(capacity)
+        self.capacity = capacity
+        self.map = mmap.mmap(self.file.fileno(), capacity)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def iter_entries(data, used):
+    """Yield (key, value, value offset) from the bytes of one metrics file."""
+    offset = HEADER.size
+    while offset < used:
+        length = KEY_LENGTH.unpack_from(data, offset)[0]
+        key_start = offset + KEY_LENGTH.size
+        key = bytes(data[key_start:key_start + length]).decode("utf-8")
+        position = key_start + padded(length)
+        yield key, VALUE.unpack_from(data, position)[0], position
+        offset = position + VALUE.size
+
+
+class ProcessStore:
+    """Per-process writer. Reopens its file after a fork, so each worker gets its own."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.values = None
+
+    def table(self):
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.values = MmapedDict(os.path.join(metrics_dir(), f"metrics_{self.pid}.db"))
+        return self.values
+
+    def add(self, name, labels, amount=1.0):
+        key = sample_key(name, labels)
+        with self.lock:
+            self.table().add(key, amount)
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        le = next((str(b) for b in buckets if value <= b), "+Inf")
+        updates = [
+            (sample_key(name + "_bucket", {**labels, "le": le}), 1.0),
+            (sample_key(name + "_sum", labels), value),
+            (sample_key(name + "_count", labels), 1.0),
+        ]
+        with self.lock:
+            table = self.table()
+            for key, amount in updates:
+                table.add(key, amount)
+
+
+def sample_key(sample, labels):
+    return encoded_key(sample, tuple(sorted(labels.items())))
+
+
+@lru_cache(maxsize=4096)
+def encoded_key(sample, labels):
+    # The label sets repeat endlessly, so the JSON is worth caching
+    return json.dumps([sample, dict(labels)], separators=(",", ":"))
+
+
+store = ProcessStore()
+
+
+def read_entries(path):
+    """(key, value) of every entry in the metrics file at ``path``."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return []
+    if len(data) < HEADER.size:
+        return []
+    used = min(HEADER.unpack_from(data, 0)[0], len(data))
+    return [(key, value) for key, value, _ in iter_entries(data, used)]
+
+
+def process_exited(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def merge_exited(directory):
+    """Add the files of processes that have exited to DEAD_FILE and delete them."""
+    dead = None
+    for path in glob.glob(os.path.join(directory, "metrics_*.db")):
+        pid = os.path.basename(path)[len("metrics_"):-len(".db")]
+        if not pid.isdigit() or int(pid) == os.getpid() or not process_exited(int(pid)):
+            continue
+        if dead is None:
+            dead = MmapedDict(os.path.join(directory, DEAD_FILE))
+        for key, value in read_entries(path):
+            dead.add(key, value)
+        os.remove(path)
+    if dead is not None:
+        dead.close()
+
+
+def collect():
+    """Sum every process file into {key: value}."""
+    directory = metrics_dir()
+    totals = defaultdict(float)
+    with open(os.path.join(directory, LOCK_FILE), "a") as lock:
+        # Workers never take it; it only keeps two scrapes from merging the same file
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        merge_exited(directory)
+        for path in glob.glob(os.path.join(directory, "metrics_*.db")):
+            for key, value in read_entries(path):
+                totals[key] += value
+    return totals
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def exposition():
+    """Render every metric in Prometheus text format 0.0.4."""
+    samples = defaultdict(list)
+    for key, value in collect().items():
+        sample, labels = json.loads(key)
+        samples[sample].append((labels, value))
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for labels, value in sorted(samples.get(name, []), key=lambda s: sorted(s[0].items())):
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+            continue
+
+        per_series = defaultdict(dict)
+        for labels, value in samples.get(name + "_bucket", []):
+            le = labels.pop("le")
+            per_series[tuple(sorted(labels.items()))][le] = value
+        sums = {tuple(sorted(l.items())): v for l, v in samples.get(name + "_sum", [])}
+        counts = {tuple(sorted(l.items())): v for l, v in samples.get(name + "_count", [])}
+
+        for series in sorted(counts):
+            labels = dict(series)
+            cumulative = 0.0
+            for bound in [str(b) for b in buckets] + ["+Inf"]:
+                cumulative += per_series[series].get(bound, 0.0)
+                lines.append(f"{name}_bucket{format_labels({**labels, 'le': bound})} {format_value(cumulative)}")
+            lines.append(f"{name}_sum{format_labels(labels)} {format_value(sums.get(series, 0.0))}")
+            lines.append(f"{name}_count{format_labels(labels)} {format_value(counts[series])}")
+    return "\n".join(lines) + "\n"
+
+
+# Per-request counters, filled in by the query wrapper and MeteredCache
+
+class RequestStats:
+    __slots__ = ("queries", "query_time", "cache_hits", "cache_misses")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+current_request = contextvars.ContextVar("metrics_request", default=None)
+
+
+def record_cache(hits, misses):
+    stats = current_request.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+_MISSING = object()
+
+
+class MeteredCache:
+    """
+    Cache backend that counts hits and misses for the current request and
+    hands everything to the real backend named in OPTIONS["BACKEND"].
+    """
+
+    def __init__(self, location, params):
+        params = dict(params)
+        options = dict(params.get("OPTIONS", {}))
+        backend = options.pop("BACKEND")
+        params["OPTIONS"] = options
+        self._cache = import_string(backend)(location, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cache, name)
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def get(self, key, default=None, version=None):
+        value = self._cache.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            record_cache(0, 1)
+            return default
+        record_cache(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self._cache.get_many(keys, version=version)
+        record_cache(len(found), len(keys) - len(found))
+        return found
+
+    async def aget(self, key, default=None, version=None):
+        value = await self._cache.aget(key, _MISSING, version=version)
+        if value is _MISSING:
+            record_cache(0, 1)
+            return default
+        record_cache(1, 0)
+        return value
+
+
+def metrics_allowed(request):
+    """
+    The METRICS_TOKEN bearer token, or with DEBUG on an address in
+    METRICS_ALLOWED_IPS. Behind a proxy on the same host every request
+    arrives from 127.0.0.1, so in production the address proves nothing.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token and constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return True
+    if not settings.DEBUG:
+        return False
+    allowed_ips = getattr(settings, "METRICS_ALLOWED_IPS", ["127.0.0.1", "::1"])
+    return request.META.get("REMOTE_ADDR") in allowed_ips
+
+
+def metrics(request):
+    if not metrics_allowed(request):
+        # Don't reveal that the endpoint exists
+        raise Http404()
+    return HttpResponse(exposition(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,227 @@
+"""
+Project-wide middleware.
+"""
+
+import mimetypes
+import os
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connections
+from django.http import FileResponse, HttpResponseNotModified
+from django.middleware.gzip import GZipMiddleware
+from django.utils._os import safe_join
+from django.utils.http import http_date
+
+from . import metrics, profiling
+
+
+# ManifestStaticFilesStorage names look like "styles/forms.3f2a9c1b7e4d.css"
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{12}\.[^/.]+$")
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+SHORT_CACHE = "public, max-age=60"
+
+# Checked in order of preference
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+
+def accepted_encodings(header):
+    """Return the content codings from an Accept-Encoding header that aren't q=0."""
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding)
+    return accepted
+
+
+class StaticFile:
+    """Stat info for one file under STATIC_ROOT and its precompressed siblings."""
+
+    def __init__(self, path, name):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.last_modified = http_date(stat.st_mtime)
+        # Weak, since the same tag covers every encoded variant
+        self.etag = f'W/"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+        self.content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.cache_control = IMMUTABLE_CACHE if HASHED_NAME_RE.search(name) else SHORT_CACHE
+        self.variants = {
+            coding: path + suffix
+            for coding, suffix in ENCODINGS
+            if os.path.isfile(path + suffix)
+        }
+
+
+class StaticFilesMiddleware:
+    """
+    Serve collected static files straight from STATIC_ROOT.
+
+    Requests under STATIC_URL are answered before the rest of the middleware
+    stack and the URL resolver run. Hashed file names get a far-future
+    immutable Cache-Control, and a precompressed .br/.gz variant is sent when
+    the client accepts it. Files that don't exist fall through to the normal
+    request cycle, so DEBUG's staticfiles view keeps working.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith("/") else "/" + settings.STATIC_URL
+        self.root = str(settings.STATIC_ROOT) if settings.STATIC_ROOT else None
+        # Collected files don't change while the process is running
+        self.files = {}
+
+    def __call__(self, request):
+        if (
+            self.root
+            and request.method in ("GET", "HEAD")
+            and request.path_info.startswith(self.prefix)
+        ):
+            static_file = self.find(request.path_info[len(self.prefix):])
+            if static_file is not None:
+                return self.serve(request, static_file)
+        return self.get_response(request)
+
+    def find(self, name):
+        if name in self.files:
+            return self.files[name]
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        static_file = StaticFile(path, name) if os.path.isfile(path) else None
+        if static_file is not None:
+            self.files[name] = static_file
+        return static_file
+
+    def serve(self, request, static_file):
+        if request.headers.get("If-None-Match") == static_file.etag:
+            response = HttpResponseNotModified()
+        else:
+            accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+            coding = next((c for c, _ in ENCODINGS if c in accepted and c in static_file.variants), None)
+            path = static_file.variants[coding] if coding else static_file.path
+
+            response = FileResponse(
+                open(path, "rb"),
+                content_type=static_file.content_type,
+                filename=os.path.basename(static_file.path),
+            )
+            if coding:
+                response["Content-Encoding"] = coding
+            response["Last-Modified"] = static_file.last_modified
+
+        response["ETag"] = static_file.etag
+        response["Cache-Control"] = static_file.cache_control
+        if static_file.variants:
+            response["Vary"] = "Accept-Encoding"
+        return response
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that leaves already-compressed media and partial responses
+    alone. Recompressing a JPEG wastes CPU, and gzipping a 206 body would
+    break its Content-Range.
+    """
+
+    def process_response(self, request, response):
+        content_type = response.get("Content-Type", "")
+        if response.status_code == 206 or not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        return super().process_response(request, response)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, response size, DB queries and cache lookups for every
+    request into the per-process metrics store (see metrics.py), labelled
+    by the resolved URL name and the response status.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = metrics.RequestStats()
+        token = metrics.current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self.count_query))
+                response = self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, "resolver_match", None)
+        labels = {
+            "view": match.view_name if match else "<unresolved>",
+            "method": request.method,
+            "status": str(response.status_code),
+        }
+        store = metrics.store
+        store.observe("http_request_duration_seconds", labels, elapsed)
+        if not response.streaming:
+            store.observe("http_response_size_bytes", labels, len(response.content))
+        elif response.has_header("Content-Length"):
+            store.observe("http_response_size_bytes", labels, int(response["Content-Length"]))
+
+        view = {"view": labels["view"]}
+        store.observe("db_queries_per_request", view, stats.queries)
+        if stats.queries:
+            store.add("db_queries_total", view, stats.queries)
+            store.add("db_query_duration_seconds_total", view, stats.query_time)
+        if stats.cache_hits:
+            store.add("cache_requests_total", {**view, "result": "hit"}, stats.cache_hits)
+        if stats.cache_misses:
+            store.add("cache_requests_total", {**view, "result": "miss"}, stats.cache_misses)
+        return response
+
+    def count_query(self, execute, sql, params, many, context):
+        stats = metrics.current_request.get()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if stats is not None:
+                stats.queries += 1
+                stats.query_time += time.perf_counter() - started
+
+
+class ProfilerMiddleware:
+    """
+    Profiles the requests profiling.wanted() picks (a superuser's
+    ``?_profile=1``, or the sampling set on the admin Profiles page) and
+    stores the result. Has to come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = profiling.wanted(request)
+        if mode is None:
+            return self.get_response(request)
+        profile = profiling.RequestProfile(mode)
+        response = profile.run(self.get_response, request)
+        profile_id = profiling.save(profile, request, response)
+        response["X-Profile-Id"] = profile_id
+        return response
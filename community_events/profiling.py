@@ -0,0 +1,396 @@
+"""
+On-demand request profiling for superusers.
+
+A request is profiled when a superuser adds ``_profile=1`` to its URL
+(``_profile=cprofile`` for the deterministic profiler), or when it is
+picked by the sampling set on the admin Profiles page: a fraction of
+requests under a path prefix, for a limited time. ProfilerMiddleware asks
+wanted() about every request; with no ``_profile`` in the query string
+and no sampling running that is a substring test and a clock comparison.
+The sampling setting lives in the shared cache and each process rereads
+it at most every PROFILE_POLL_INTERVAL seconds.
+
+Two profilers:
+
+- "sample" (default) reads the request thread's stack every
+  PROFILE_SAMPLE_INTERVAL seconds from a helper thread. Cheap, and the
+  stacks are real.
+- "cprofile" runs cProfile, which sees every call but slows the request
+  down. Its caller/callee table has no whole stacks, so they are rebuilt by
+  walking the call graph down from the view and splitting each function's
+  time between its callees in proportion, as flameprof does.
+
+Every database query is timed too, and the statements are totalled in the
+profile's summary. In sampled stacks a query's time also shows up under a
+"SQL: <statement>" frame on top of the code that ran it.
+
+Profiles are written to PROFILE_DIR as folded stacks ("frame;frame;frame
+weight" per line, weights in microseconds), the input of flamegraph.pl,
+speedscope and d3-flame-graph, next to a JSON summary. Only the newest
+PROFILE_MAX_STORED are kept.
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+SAMPLING_KEY = "profiling:sampling"
+MODES = ("sample", "cprofile")
+MAX_DEPTH = 128
+# Rebuilding cProfile stacks, calls below MIN_SECONDS are counted in their
+# caller and the walk stops after MAX_NODES frames
+MIN_SECONDS = 0.00005
+MAX_NODES = 20_000
+SQL_LABEL_LENGTH = 80
+TOP_QUERIES = 25
+PROFILE_ID_RE = re.compile(r"^[0-9]{14}-[0-9a-f]{8}$")
+
+
+def profile_setting(name):
+    defaults = {
+        "PROFILE_DIR": None,
+        "PROFILE_SAMPLE_INTERVAL": 0.005,
+        "PROFILE_MAX_STORED": 200,
+        "PROFILE_POLL_INTERVAL": 5,
+    }
+    return getattr(settings, name, defaults[name])
+
+
+def profile_dir():
+    path = profile_setting("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "community_events_profiles")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# Deciding which requests to profile
+
+class SamplingState:
+    """This process's copy of the sampling setting, reread now and then."""
+
+    def __init__(self):
+        self.config = None
+        self.checked_at = float("-inf")
+
+    def current(self):
+        now = time.monotonic()
+        if now - self.checked_at >= profile_setting("PROFILE_POLL_INTERVAL"):
+            self.checked_at = now
+            self.config = cache.get(SAMPLING_KEY)
+        config = self.config
+        if config and config["until"] <= time.time():
+            return None
+        return config
+
+
+sampling_state = SamplingState()
+
+
+def wanted(request):
+    """The profiler to run on ``request`` ("sample" or "cprofile"), or None."""
+    if "_profile=" in request.META.get("QUERY_STRING", ""):
+        mode = request.GET.get("_profile")
+        user = getattr(request, "user", None)
+        if user is not None and user.is_superuser and mode:
+            return mode if mode in MODES else "sample"
+        return None
+    config = sampling_state.current()
+    if config is None or not request.path.startswith(config["path"]):
+        return None
+    return config["mode"] if random.random() < config["rate"] else None
+
+
+def sampling():
+    """The sampling setting in force: {"rate", "path", "mode", "until", "ends_at"}, or None."""
+    config = cache.get(SAMPLING_KEY)
+    if config and config["until"] > time.time():
+        return {**config, "ends_at": datetime.fromtimestamp(config["until"], tz=dt_timezone.utc)}
+    return None
+
+
+def start_sampling(rate, path="/", mode="sample", minutes=10):
+    config = {"rate": rate, "path": path or "/", "mode": mode, "until": time.time() + minutes * 60}
+    cache.set(SAMPLING_KEY, config, minutes * 60)
+    return config
+
+
+def stop_sampling():
+    cache.delete(SAMPLING_KEY)
+
+
+# Profilers
+
+def short_path(filename):
+    for root in sys.path:
+        if root and filename.startswith(root):
+            return filename[len(root):].lstrip(os.sep)
+    return filename
+
+
+def frame_label(name, filename, line):
+    return f"{name} ({short_path(filename)}:{line})"
+
+
+def sql_label(sql):
+    # ";" separates frames in folded stacks
+    statement = " ".join(sql.split()).replace(";", ",")
+    return "SQL: " + (statement[:SQL_LABEL_LENGTH] + "…" if len(statement) > SQL_LABEL_LENGTH else statement)
+
+
+class QueryRecorder:
+    """execute_wrapper that times every query and tells the sampler what is running."""
+
+    def __init__(self):
+        self.queries = defaultdict(lambda: [0, 0.0])
+        self.current = None
+
+    def __call__(self, execute, sql, params, many, context):
+        label = sql_label(sql)
+        self.current = label
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.current = None
+            totals = self.queries[label]
+            totals[0] += 1
+            totals[1] += time.perf_counter() - started
+
+    def summary(self):
+        rows = [
+            {"sql": label[5:], "count": count, "ms": round(seconds * 1000, 3)}
+            for label, (count, seconds) in self.queries.items()
+        ]
+        rows.sort(key=lambda row: -row["ms"])
+        return rows
+
+
+class StackSampler:
+    """Samples one thread's stack from a helper thread."""
+
+    def __init__(self, thread_id, queries):
+        self.thread_id = thread_id
+        self.queries = queries
+        self.interval = profile_setting("PROFILE_SAMPLE_INTERVAL")
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self.last = time.perf_counter()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return self.stacks
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            elapsed, self.last = now - self.last, now
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                code = frame.f_code
+                stack.append(frame_label(code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.reverse()
+            if self.queries.current:
+                stack.append(self.queries.current)
+            self.stacks[";".join(stack)] += int(elapsed * 1_000_000)
+
+
+def code_key(func):
+    """cProfile's (filename, line, name) key for a Python callable."""
+    code = getattr(func, "__code__", None) or getattr(getattr(func, "__call__", None), "__code__", None)
+    return (code.co_filename, code.co_firstlineno, code.co_name) if code else None
+
+
+def cprofile_stacks(profiler, root):
+    """Folded stacks rebuilt from cProfile's call graph below ``root``, a code_key()."""
+    stats = pstats.Stats(profiler).stats
+    callees = defaultdict(dict)
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge[3]
+
+    def label(func):
+        filename, line, name = func
+        # Built-ins have no file
+        return name if filename == "~" else frame_label(name, filename, line)
+
+    stacks = Counter()
+    budget = [MAX_NODES]
+
+    def walk(func, inclusive, path):
+        budget[0] -= 1
+        _, _, own_time, total_time, _ = stats[func]
+        path = path + [label(func)]
+        own = min(own_time * inclusive / total_time, inclusive) if total_time > 0 else inclusive
+        # The rest is split between the callees by their share of the time
+        # spent in them. Recursive edges (Django's middleware chain is one)
+        # count their time more than once, so the split is normalized to
+        # keep the total right. Callees too small to follow stay in ``own``.
+        edges = callees.get(func, {})
+        spent = sum(edges.values())
+        rest = inclusive - own
+        for callee, edge_time in edges.items():
+            share = rest * edge_time / spent if spent else 0
+            if share >= MIN_SECONDS and len(path) < MAX_DEPTH and budget[0] > 0:
+                walk(callee, share, path)
+            else:
+                own += share
+        if int(own * 1_000_000):
+            stacks[";".join(path)] += int(own * 1_000_000)
+
+    if root in stats:
+        walk(root, stats[root][3], [])
+    return stacks
+
+
+class RequestProfile:
+    def __init__(self, mode):
+        self.mode = mode
+        self.queries = QueryRecorder()
+        self.stacks = Counter()
+        self.duration = 0.0
+
+    def run(self, get_response, request):
+        """Call ``get_response(request)`` under the profiler and return the response."""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self.queries))
+            started = time.perf_counter()
+            if self.mode == "cprofile":
+                profiler = cProfile.Profile()
+                try:
+                    # runcall makes get_response the root of the call graph
+                    return profiler.runcall(get_response, request)
+                finally:
+                    self.duration = time.perf_counter() - started
+                    self.stacks = cprofile_stacks(profiler, code_key(get_response))
+            sampler = StackSampler(threading.get_ident(), self.queries)
+            sampler.start()
+            try:
+                return get_response(request)
+            finally:
+                self.duration = time.perf_counter() - started
+                self.stacks = sampler.stop()
+
+
+# Storage
+
+def save(profile, request, response):
+    """Write ``profile`` as <id>.folded and <id>.json. Returns the id."""
+    now = timezone.now()
+    profile_id = f"{now:%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+    match = getattr(request, "resolver_match", None)
+    queries = profile.queries.summary()
+    user = getattr(request, "user", None)
+    meta = {
+        "id": profile_id,
+        "created_at": now.isoformat(),
+        "mode": profile.mode,
+        "method": request.method,
+        "path": request.get_full_path(),
+        "view": match.view_name if match else "",
+        "status": response.status_code,
+        "user": user.get_username() if user is not None and user.is_authenticated else "",
+        "duration_ms": round(profile.duration * 1000, 3),
+        "sql_count": sum(q["count"] for q in queries),
+        "sql_ms": round(sum(q["ms"] for q in queries), 3),
+        "samples": len(profile.stacks),
+        "queries": queries[:TOP_QUERIES],
+    }
+    directory = profile_dir()
+    with open(os.path.join(directory, f"{profile_id}.folded"), "w", encoding="utf-8") as f:
+        for stack, weight in sorted(profile.stacks.items()):
+            if weight > 0:
+                f.write(f"{stack} {weight}\n")
+    with open(os.path.join(directory, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    prune(directory)
+    return profile_id
+
+
+def prune(directory):
+    names = sorted(n[:-5] for n in os.listdir(directory) if n.endswith(".json"))
+    for profile_id in names[:-profile_setting("PROFILE_MAX_STORED")]:
+        for suffix in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(directory, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """Summaries of the stored profiles, newest first."""
+    directory = profile_dir()
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        meta["created_at"] = parse_datetime(meta["created_at"])
+        profiles.append(meta)
+    return profiles
+
+
+def load_profile(profile_id):
+    """(summary, folded text) of a stored profile, or None."""
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    directory = profile_dir()
+    try:
+        with open(os.path.join(directory, f"{profile_id}.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, f"{profile_id}.folded"), encoding="utf-8") as f:
+            folded = f.read()
+    except (OSError, ValueError):
+        return None
+    return meta, folded
+
+
+def folded_tree(folded):
+    """Folded stacks as the nested {"name", "value", "children"} d3-flame-graph draws."""
+    root = {"name": "all", "value": 0, "children": {}}
+    for line in folded.splitlines():
+        stack, _, weight = line.rpartition(" ")
+        if not stack or not weight.isdigit():
+            continue
+        weight = int(weight)
+        node = root
+        node["value"] += weight
+        for frame in stack.split(";"):
+            node = node["children"].setdefault(frame, {"name": frame, "value": 0, "children": {}})
+            node["value"] += weight
+
+    def finish(node):
+        node["children"] = [finish(child) for child in node["children"].values()]
+        return node
+
+    return finish(root)
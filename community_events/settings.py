@@ -47,6 +47,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'community_events.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -117,7 +118,7 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = '/static/'
-STATICFILES_DIRS = []
+STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
 
@@ -131,3 +132,51 @@ LOGIN_REDIRECT_URL = 'accounts:route_after_login'
 LOGOUT_REDIRECT_URL = 'login'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Uploads are stored under the hash of their content (community_events.storage);
+# `python manage.py collect_media` removes files nothing refers to any more.
+STORAGES = {
+    "default": {
+        "BACKEND": "community_events.storage.ContentAddressedStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+MEDIA_GC_GRACE = 60 * 60
+
+# Static snapshots of the public catalogue, written by
+# `python manage.py prerender_events` (see events/prerender.py)
+PRERENDER_ROOT = BASE_DIR / "prerendered"
+PRERENDER_PAGE_SIZE = 24
+
+# Event image uploads
+# Uploads stream to disk and are cut off at EVENT_IMAGE_MAX_UPLOAD_SIZE for
+# images and EVENT_UPLOAD_MAX_SIZE for other files (event imports).
+# Decoding/re-encoding runs in a pool of EVENT_IMAGE_WORKERS processes
+# (0 runs it inline, which is handy for debugging).
+FILE_UPLOAD_HANDLERS = ["events.images.BoundedUploadHandler"]
+EVENT_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+EVENT_UPLOAD_MAX_SIZE = 50 * 1024 * 1024
+EVENT_IMAGE_MAX_PIXELS = 40_000_000
+EVENT_IMAGE_MAX_DIMENSION = 2048
+EVENT_IMAGE_WORKERS = 2
+EVENT_IMAGE_TIMEOUT = 30
+
+# Email
+# Notifications are queued in the outbox and sent by
+# `python manage.py dispatch_notifications`. Locally they're printed to the console.
+EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+DEFAULT_FROM_EMAIL = "BIG-IN Community Events <no-reply@localhost>"
+
+# Events dated more than this many days ago are moved to the archive tables
+# by `python manage.py archive_events`.
+EVENT_ARCHIVE_AFTER_DAYS = 365
+
+# Audit log (events.audit)
+# Entries are buffered per process and written in one INSERT every
+# AUDIT_FLUSH_SIZE entries or AUDIT_FLUSH_INTERVAL seconds. Set
+# AUDIT_LOG_FILE to also append them to a rotating JSONL file.
+AUDIT_FLUSH_SIZE = 100
+AUDIT_FLUSH_INTERVAL = 5
+AUDIT_LOG_FILE = None
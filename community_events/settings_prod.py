@@ -0,0 +1,226 @@
+"""
+Production settings for community_events project.
+
+Builds on the development settings in ``settings.py`` and overrides
+everything that should come from the environment on a deployed server.
+Select it with:
+
+    DJANGO_SETTINGS_MODULE=community_events.settings_prod
+
+Environment variables:
+    DJANGO_SECRET_KEY             required
+    DJANGO_DEBUG                  "1"/"true" to turn debug on (default off)
+    DJANGO_ALLOWED_HOSTS          comma separated host names
+    DJANGO_DB_PATH                SQLite database file (default BASE_DIR/db.sqlite3)
+    DJANGO_CONN_MAX_AGE           seconds to keep DB connections open (default 60)
+    DJANGO_CACHE_BACKEND          cache backend dotted path (default files under BASE_DIR/cache)
+    DJANGO_CACHE_LOCATION         cache location, e.g. a directory or redis URL
+    DJANGO_CACHE_MAX_ENTRIES      entries kept by the file cache (default 50000)
+    DJANGO_CACHE_TIMEOUT          default cache timeout in seconds (default 300)
+    DJANGO_STATIC_ROOT            collectstatic target (default BASE_DIR/staticfiles)
+    DJANGO_MEDIA_ROOT             uploaded files (default BASE_DIR/media)
+    DJANGO_MEDIA_SENDFILE         "X-Accel-Redirect" or "X-Sendfile" to offload media
+    DJANGO_MEDIA_SENDFILE_PREFIX  internal nginx location for X-Accel-Redirect
+    DJANGO_MEDIA_CACHE_MAX_AGE    Cache-Control max-age for media (default 30 days)
+    DJANGO_PRERENDER_ROOT         prerendered catalogue pages (default BASE_DIR/prerendered)
+    DJANGO_SECURE_SSL             "1"/"true" when served over HTTPS only
+    DJANGO_EMAIL_BACKEND          email backend dotted path (default SMTP)
+    DJANGO_EMAIL_HOST             SMTP host (default localhost)
+    DJANGO_EMAIL_PORT             SMTP port (default 25)
+    DJANGO_EMAIL_HOST_USER        SMTP user name
+    DJANGO_EMAIL_HOST_PASSWORD    SMTP password
+    DJANGO_EMAIL_USE_TLS          "1"/"true" for STARTTLS
+    DJANGO_EMAIL_TIMEOUT          SMTP socket timeout in seconds (default 30)
+    DJANGO_DEFAULT_FROM_EMAIL     sender address for notifications
+    DJANGO_AUDIT_LOG_FILE         append audit entries to this JSONL file as well
+    DJANGO_METRICS_DIR            shared directory for the per-process metrics files
+    DJANGO_METRICS_TOKEN          bearer token required to scrape /metrics (closed without it)
+    DJANGO_PROFILE_DIR            shared directory for stored request profiles
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DEFAULT_FROM_EMAIL, MIDDLEWARE, TEMPLATES
+
+
+def env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def env_list(name, default=None):
+    value = os.environ.get(name)
+    if not value:
+        return list(default or [])
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+SECRET_KEY = os.environ.get("DJANGO_SECRET_KEY", "")
+if not SECRET_KEY:
+    raise ImproperlyConfigured("DJANGO_SECRET_KEY must be set for the production profile.")
+
+DEBUG = env_bool("DJANGO_DEBUG", False)
+
+ALLOWED_HOSTS = env_list("DJANGO_ALLOWED_HOSTS", ["localhost", "127.0.0.1"])
+
+
+# Static files are answered right after the security middleware, before
+# anything else runs. Metrics come next so they see the final (compressed)
+# response size, then compression wraps every dynamic text response.
+
+MIDDLEWARE = list(MIDDLEWARE)
+_after_security = MIDDLEWARE.index("django.middleware.security.SecurityMiddleware") + 1
+MIDDLEWARE[_after_security:_after_security] = [
+    "community_events.middleware.StaticFilesMiddleware",
+    "community_events.middleware.MetricsMiddleware",
+    "community_events.middleware.CompressionMiddleware",
+]
+
+
+# Templates are compiled once per process and kept in memory.
+# APP_DIRS has to be off when loaders are given explicitly.
+
+TEMPLATES = [dict(TEMPLATES[0])]
+TEMPLATES[0]["APP_DIRS"] = False
+TEMPLATES[0]["OPTIONS"] = {
+    **TEMPLATES[0]["OPTIONS"],
+    "loaders": [
+        (
+            "django.template.loaders.cached.Loader",
+            [
+                "django.template.loaders.filesystem.Loader",
+                "django.template.loaders.app_directories.Loader",
+            ],
+        ),
+    ],
+}
+
+
+# Database
+# Keep connections open between requests instead of reconnecting each time.
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ.get("DJANGO_DB_PATH", str(BASE_DIR / "db.sqlite3")),
+        "CONN_MAX_AGE": env_int("DJANGO_CONN_MAX_AGE", 60),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            # WAL lets readers keep going while a join/leave holds the write lock
+            "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;",
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+        },
+    }
+}
+
+
+# Cache
+# MeteredCache counts hits and misses for /metrics and passes every call
+# on to the configured backend.
+# Every worker must see the same cache: ticket duplicate checks and
+# revocations, view cache tags and single-flight locks, calendar and
+# suggestion versions, the prerender lock and profiler sampling all live
+# in it. The default is a directory shared by the workers on this host;
+# set DJANGO_CACHE_BACKEND to django.core.cache.backends.redis.RedisCache
+# (with a redis:// DJANGO_CACHE_LOCATION) for several hosts, or for atomic
+# add() and incr() under heavy load. A per-process LocMemCache is refused.
+
+CACHE_BACKEND = os.environ.get("DJANGO_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache")
+if CACHE_BACKEND == "django.core.cache.backends.locmem.LocMemCache":
+    raise ImproperlyConfigured("DJANGO_CACHE_BACKEND must be shared by all workers, not LocMemCache.")
+CACHE_OPTIONS = {"BACKEND": CACHE_BACKEND}
+if CACHE_BACKEND == "django.core.cache.backends.filebased.FileBasedCache":
+    # The default 300 would cull ticket scans and cache tags long before they expire
+    CACHE_OPTIONS["MAX_ENTRIES"] = env_int("DJANGO_CACHE_MAX_ENTRIES", 50_000)
+
+CACHES = {
+    "default": {
+        "BACKEND": "community_events.metrics.MeteredCache",
+        "LOCATION": os.environ.get("DJANGO_CACHE_LOCATION", str(BASE_DIR / "cache")),
+        "TIMEOUT": env_int("DJANGO_CACHE_TIMEOUT", 300),
+        "OPTIONS": CACHE_OPTIONS,
+    }
+}
+
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+
+# Static and media files
+# Static file names carry a content hash so they can be cached forever,
+# and collectstatic writes gzip/brotli copies next to them.
+
+STATIC_ROOT = os.environ.get("DJANGO_STATIC_ROOT", str(BASE_DIR / "staticfiles"))
+MEDIA_ROOT = os.environ.get("DJANGO_MEDIA_ROOT", str(BASE_DIR / "media"))
+
+# Media is served by community_events.media.serve_media; let the front-end
+# server do the actual transfer when it's configured for it.
+MEDIA_SENDFILE_HEADER = os.environ.get("DJANGO_MEDIA_SENDFILE") or None
+MEDIA_SENDFILE_PREFIX = os.environ.get("DJANGO_MEDIA_SENDFILE_PREFIX", "/protected-media/")
+MEDIA_CACHE_MAX_AGE = env_int("DJANGO_MEDIA_CACHE_MAX_AGE", 60 * 60 * 24 * 30)
+
+# Written by the prerender_events worker; the front-end server can serve
+# /events/catalogue/ from it directly. The worker notices changes through
+# the cache, so with --loop it has to run on a host that shares it.
+PRERENDER_ROOT = os.environ.get("DJANGO_PRERENDER_ROOT", str(BASE_DIR / "prerendered"))
+
+STORAGES = {
+    "default": {
+        "BACKEND": "community_events.storage.ContentAddressedStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "community_events.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
+
+# Email
+# Notifications go out from the dispatch_notifications worker, which keeps
+# one SMTP connection open per run.
+EMAIL_BACKEND = os.environ.get("DJANGO_EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
+EMAIL_HOST = os.environ.get("DJANGO_EMAIL_HOST", "localhost")
+EMAIL_PORT = env_int("DJANGO_EMAIL_PORT", 25)
+EMAIL_HOST_USER = os.environ.get("DJANGO_EMAIL_HOST_USER", "")
+EMAIL_HOST_PASSWORD = os.environ.get("DJANGO_EMAIL_HOST_PASSWORD", "")
+EMAIL_USE_TLS = env_bool("DJANGO_EMAIL_USE_TLS", False)
+EMAIL_TIMEOUT = env_int("DJANGO_EMAIL_TIMEOUT", 30)
+DEFAULT_FROM_EMAIL = os.environ.get("DJANGO_DEFAULT_FROM_EMAIL", DEFAULT_FROM_EMAIL)
+
+
+# Metrics
+# Every worker writes its own memory-mapped file here; /metrics sums them.
+# Use a directory on this host shared by all workers and empty it when the
+# server restarts (defaults to a folder in the system temp directory).
+# Scraping needs DJANGO_METRICS_TOKEN.
+METRICS_DIR = os.environ.get("DJANGO_METRICS_DIR") or None
+METRICS_TOKEN = os.environ.get("DJANGO_METRICS_TOKEN", "")
+
+# Request profiles taken by superusers (see community_events/profiling.py).
+# Every worker writes here, so the admin Profiles page sees all of them.
+PROFILE_DIR = os.environ.get("DJANGO_PROFILE_DIR") or None
+
+
+# Audit log
+# One file per worker process is safest, since rotation isn't coordinated
+# between processes, e.g. DJANGO_AUDIT_LOG_FILE=/var/log/events/audit-%(pid)s.jsonl
+AUDIT_LOG_FILE = os.environ.get("DJANGO_AUDIT_LOG_FILE") or None
+
+
+# Security
+
+SECURE_SSL_REDIRECT = env_bool("DJANGO_SECURE_SSL", False)
+SESSION_COOKIE_SECURE = SECURE_SSL_REDIRECT
+CSRF_COOKIE_SECURE = SECURE_SSL_REDIRECT
+if SECURE_SSL_REDIRECT:
+    SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
+SECURE_CONTENT_TYPE_NOSNIFF = True
@@ -0,0 +1,148 @@
+"""
+File storages.
+
+CompressedManifestStaticFilesStorage, for static files in production: on
+top of Django's hashed file names, ``collectstatic`` also writes a ``.gz``
+and (when the optional ``brotli`` package is installed) a ``.br`` copy of
+every text asset next to it. StaticFilesMiddleware picks the smallest
+variant the browser accepts.
+
+ContentAddressedStorage, for uploads: a file is stored under the SHA-256
+of its content, in the directory upload_to asked for, sharded two levels
+deep by the first hex digits (events/images/3f/a2/3fa2….jpg). Uploading
+the same image twice stores it once, and no directory ever holds more
+than 256 entries plus its files. Several rows can point at one file, so
+files are only removed by events.mediafiles, which counts references.
+"""
+
+import gzip
+import hashlib
+import os
+import tempfile
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".css", ".js", ".mjs", ".map", ".json", ".svg", ".txt", ".html", ".xml", ".ico",
+}
+
+# Tiny files are not worth an extra round of content negotiation
+MIN_COMPRESS_SIZE = 512
+
+
+def compress_file(path):
+    """Write .gz/.br siblings for ``path``, keeping only variants that are smaller."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return []
+
+    variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((".br", brotli.compress(data, quality=11)))
+
+    written = []
+    for suffix, compressed in variants:
+        if len(compressed) >= len(data):
+            continue
+        with open(path + suffix, "wb") as f:
+            f.write(compressed)
+        written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also precompresses the hashed files."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        for name in self.hashed_files.values():
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            for compressed in compress_file(self.path(name)):
+                yield os.path.relpath(compressed, self.location), compressed, True
+
+
+# Directory levels under the upload directory, each named by two hex digits
+SHARD_LEVELS = 2
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by their content (see the module docstring)."""
+
+    def hashed_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        shards = [digest[i * 2:i * 2 + 2] for i in range(SHARD_LEVELS)]
+        return "/".join(filter(None, [directory.replace(os.sep, "/"), *shards, digest + ext]))
+
+    def get_available_name(self, name, max_length=None):
+        # The name is picked by _save() and an existing file is the same file
+        return name
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content_hash(content))
+        path = self.path(name)
+        if os.path.exists(path):
+            # Mark it as just used, so garbage collection leaves it alone
+            # until the row that refers to it has been committed
+            os.utime(path)
+            return name
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True, mode=self.directory_permissions_mode or 0o777)
+        fd, temporary = tempfile.mkstemp(dir=directory, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            os.chmod(temporary, self.file_permissions_mode or 0o644)
+            # Readers never see a half-written file, and two uploads of the
+            # same content racing each other write the same bytes
+            os.replace(temporary, path)
+        except BaseException:
+            try:
+                os.remove(temporary)
+            except FileNotFoundError:
+                pass
+            raise
+        return name
+
+    def is_hashed(self, name):
+        parts = name.split("/")
+        digest = os.path.splitext(parts[-1])[0]
+        return (
+            len(parts) > SHARD_LEVELS
+            and len(digest) == 64
+            and parts[-1 - SHARD_LEVELS:-1] == [digest[i * 2:i * 2 + 2] for i in range(SHARD_LEVELS)]
+        )
+
+    def delete(self, name):
+        super().delete(name)
+        if not self.is_hashed(name):
+            return
+        # Drop shard directories the file leaves empty
+        directory = os.path.dirname(self.path(name))
+        for _ in range(SHARD_LEVELS):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
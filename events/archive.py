@@ -0,0 +1,143 @@
+"""
+Archival of past events.
+
+archive_events() moves events dated before the retention horizon out of
+the live tables, one batch of events per transaction:
+
+- the event and its capacity become one ArchivedEvent row;
+- participations and feedback are copied to ArchivedParticipation and
+  ArchivedFeedback;
+- the live rows are then deleted, along with anything else hanging off
+  the event (recommendations, per-event rollups);
+- a series date is added to the series' cancelled dates, as when an
+  organizer deletes it, so it doesn't come back as an unmaterialized
+  occurrence.
+
+Rows are copied with INSERT ... SELECT so nothing is loaded into Python.
+Participations and feedback are deleted in SQL too: going through the ORM
+would fire a post_delete signal per row and queue every attendee for a
+recommendation refresh they don't need.
+
+Organizer-level analytics rollups are kept; per-event ones go with the event.
+"""
+
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import (
+    ArchivedEvent,
+    ArchivedFeedback,
+    ArchivedParticipation,
+    Event,
+    EventCapacity,
+    Feedback,
+    Participation,
+)
+from .recurrence import cancel_dates
+
+
+def retention_days():
+    return getattr(settings, "EVENT_ARCHIVE_AFTER_DAYS", 365)
+
+
+def archive_cutoff(days=None):
+    """Events dated strictly before this day get archived."""
+    return date.today() - timedelta(days=retention_days() if days is None else days)
+
+
+def table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def col(model, name, alias=None):
+    column = connection.ops.quote_name(model._meta.get_field(name).column)
+    return f"{alias}.{column}" if alias else column
+
+
+def copy_events(cursor, ids, archived_at):
+    fields = ["id", "title", "date", "start_time", "end_time", "location",
+              "short_description", "organizer", "status", "image"]
+    target = [col(ArchivedEvent, f) for f in fields]
+    target += [col(ArchivedEvent, f) for f in ("max_participants", "participant_count", "archived_at")]
+    source = [col(Event, f, "e") for f in fields]
+    placeholders = ", ".join(["%s"] * len(ids))
+    cursor.execute(
+        f"INSERT INTO {table(ArchivedEvent)} ({', '.join(target)}) "
+        f"SELECT {', '.join(source)}, {col(EventCapacity, 'max_participants', 'c')}, "
+        f"(SELECT COUNT(*) FROM {table(Participation)} p WHERE {col(Participation, 'event', 'p')} = {col(Event, 'id', 'e')}), %s "
+        f"FROM {table(Event)} e "
+        f"LEFT JOIN {table(EventCapacity)} c ON {col(EventCapacity, 'event', 'c')} = {col(Event, 'id', 'e')} "
+        f"WHERE {col(Event, 'id', 'e')} IN ({placeholders})",
+        [archived_at, *ids],
+    )
+
+
+def move_rows(cursor, source, target, fields, ids):
+    """Copy ``fields`` of ``source`` rows belonging to the events ``ids`` into ``target``, then delete them."""
+    columns_from = ", ".join(col(source, f) for f in fields)
+    columns_to = ", ".join(col(target, f) for f in fields)
+    placeholders = ", ".join(["%s"] * len(ids))
+    where = f"{col(source, 'event')} IN ({placeholders})"
+    cursor.execute(
+        f"INSERT INTO {table(target)} ({columns_to}) SELECT {columns_from} FROM {table(source)} WHERE {where}",
+        ids,
+    )
+    copied = cursor.rowcount
+    cursor.execute(f"DELETE FROM {table(source)} WHERE {where}", ids)
+    return copied
+
+
+def archive_batch(ids):
+    """Archive the events ``ids`` in one transaction. Returns (participations, feedback) moved."""
+    archived_at = ArchivedEvent._meta.get_field("archived_at").get_db_prep_save(timezone.now(), connection)
+    with transaction.atomic(), connection.cursor() as cursor:
+        copy_events(cursor, ids, archived_at)
+        participations = move_rows(
+            cursor, Participation, ArchivedParticipation, ("id", "user", "event", "joined_at"), ids,
+        )
+        feedback = move_rows(
+            cursor, Feedback, ArchivedFeedback, ("id", "event", "user", "rating", "comment", "created_at"), ids,
+        )
+        # Otherwise an archived series date would come back as an unmaterialized occurrence
+        occurrences = defaultdict(list)
+        dated = Event.objects.filter(id__in=ids, series__isnull=False).values_list("series_id", "occurrence_date")
+        for series_id, day in dated:
+            occurrences[series_id].append(day)
+        for series_id, days in occurrences.items():
+            cancel_dates(series_id, days)
+        # Whatever else references the event goes through the normal cascade
+        Event.objects.filter(id__in=ids).delete()
+    return participations, feedback
+
+
+def archive_events(cutoff=None, batch_size=500, stdout=None):
+    """
+    Archive every event dated before ``cutoff`` (default: the retention
+    horizon). Returns {"events", "participations", "feedback"} moved.
+    """
+    cutoff = cutoff or archive_cutoff()
+    totals = {"events": 0, "participations": 0, "feedback": 0}
+    while True:
+        ids = list(
+            Event.objects
+            .filter(date__lt=cutoff)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        participations, feedback = archive_batch(ids)
+        totals["events"] += len(ids)
+        totals["participations"] += participations
+        totals["feedback"] += feedback
+        if stdout is not None:
+            stdout.write(f"  {totals['events']} events archived")
+    return totals
+
+
+def pending_archive_count(cutoff=None):
+    return Event.objects.filter(date__lt=cutoff or archive_cutoff()).count()
@@ -0,0 +1,190 @@
+"""
+Append-only audit trail for admin and organizer actions.
+
+record() is called from the views once the action has committed. Entries
+are kept in a per-process buffer and written with one bulk INSERT when
+AUDIT_FLUSH_SIZE entries have piled up, every AUDIT_FLUSH_INTERVAL seconds
+from a background thread, and at interpreter exit. That keeps the extra
+SQLite write lock off the request path almost all of the time.
+
+When AUDIT_LOG_FILE is set, every flushed entry is also appended to that
+file as one JSON object per line, rotated at AUDIT_LOG_MAX_BYTES. The
+rotation is per process, so with several workers put "%(pid)s" in the
+file name to give each one its own file.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import AuditEntry
+
+
+logger = logging.getLogger(__name__)
+
+
+def audit_setting(name):
+    defaults = {
+        "AUDIT_FLUSH_SIZE": 100,
+        "AUDIT_FLUSH_INTERVAL": 5,
+        "AUDIT_MAX_BUFFER": 10_000,
+        "AUDIT_LOG_FILE": None,
+        "AUDIT_LOG_MAX_BYTES": 10 * 1024 * 1024,
+        "AUDIT_LOG_BACKUP_COUNT": 10,
+    }
+    return getattr(settings, name, defaults[name])
+
+
+def plain(value):
+    """Make a form value JSON friendly: files by name, model instances by pk."""
+    if hasattr(value, "_meta"):
+        return value.pk
+    if isinstance(value, File):
+        # An empty FieldFile has no file to read, only an empty name
+        return value.name or None
+    return value
+
+
+def form_changes(form, exclude=()):
+    """{field: [old, new]} for every field the user actually changed."""
+    return {
+        name: [plain(form.initial.get(name)), plain(form.cleaned_data.get(name))]
+        for name in form.changed_data
+        if name not in exclude
+    }
+
+
+def client_ip(request):
+    return request.META.get("REMOTE_ADDR") or None
+
+
+def record(request, action, target, changes=None):
+    """
+    Queue an audit entry for ``action`` on ``target`` (an Event or User).
+    The entry only enters the buffer if the surrounding transaction commits.
+    """
+    user = request.user
+    entry = AuditEntry(
+        created_at=timezone.now(),
+        actor_id=user.pk if user.is_authenticated else None,
+        actor_username=user.get_username() if user.is_authenticated else "",
+        action=action,
+        target_type=target._meta.model_name,
+        target_id=target.pk,
+        target_repr=str(target)[:200],
+        changes=changes or {},
+        ip_address=client_ip(request),
+    )
+    transaction.on_commit(lambda: buffer.add(entry))
+
+
+class AuditBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.entries = []
+        self.thread = None
+        self.mirror = None
+
+    def add(self, entry):
+        with self.lock:
+            self.entries.append(entry)
+            full = len(self.entries) >= audit_setting("AUDIT_FLUSH_SIZE")
+            if self.thread is None:
+                self.start()
+        if full:
+            self.flush()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="audit-flush", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(audit_setting("AUDIT_FLUSH_INTERVAL"))
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Periodic audit flush failed")
+            finally:
+                # This thread's connection would otherwise stay open forever
+                connection.close()
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of entries written."""
+        with self.flush_lock:
+            with self.lock:
+                entries, self.entries = self.entries, []
+            if not entries:
+                return 0
+            try:
+                AuditEntry.objects.bulk_create(entries, batch_size=500)
+            except Exception:
+                logger.exception("Could not write %d audit entries; keeping them for the next flush", len(entries))
+                with self.lock:
+                    # Keep the newest ones if the database stays unavailable
+                    self.entries = (entries + self.entries)[-audit_setting("AUDIT_MAX_BUFFER"):]
+                return 0
+            self.write_mirror(entries)
+            return len(entries)
+
+    def write_mirror(self, entries):
+        path = audit_setting("AUDIT_LOG_FILE")
+        if not path:
+            return
+        if self.mirror is None:
+            self.mirror = RotatingFileHandler(
+                path.replace("%(pid)s", str(os.getpid())),
+                maxBytes=audit_setting("AUDIT_LOG_MAX_BYTES"),
+                backupCount=audit_setting("AUDIT_LOG_BACKUP_COUNT"),
+                encoding="utf-8",
+            )
+            self.mirror.setFormatter(logging.Formatter("%(message)s"))
+        for entry in entries:
+            line = json.dumps({
+                "id": entry.pk,
+                "created_at": entry.created_at,
+                "actor_id": entry.actor_id,
+                "actor": entry.actor_username,
+                "action": entry.action,
+                "target_type": entry.target_type,
+                "target_id": entry.target_id,
+                "target": entry.target_repr,
+                "changes": entry.changes,
+                "ip": entry.ip_address,
+            }, cls=DjangoJSONEncoder, ensure_ascii=False)
+            self.mirror.emit(logging.makeLogRecord({"msg": line}))
+
+
+buffer = AuditBuffer()
+atexit.register(buffer.flush)
+
+
+def flush():
+    return buffer.flush()
+
+
+def audit_entries(actor_id=None, target_type=None, target_id=None, start=None, end=None):
+    """Audit entries filtered on the indexed columns, newest first."""
+    entries = AuditEntry.objects.all()
+    if actor_id is not None:
+        entries = entries.filter(actor_id=actor_id)
+    if target_type:
+        entries = entries.filter(target_type=target_type)
+        if target_id is not None:
+            entries = entries.filter(target_id=target_id)
+    if start is not None:
+        entries = entries.filter(created_at__gte=start)
+    if end is not None:
+        entries = entries.filter(created_at__lt=end)
+    return entries
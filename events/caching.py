@@ -0,0 +1,146 @@
+"""
+Caching expensive view data without stampedes.
+
+cached(key, compute, ttl, tags) returns compute()'s value from the cache.
+Each entry is kept for its ttl plus a stale window, and:
+
+- only one caller recomputes a key at a time (single flight). Whoever wins
+  cache.add() on the key's lock recomputes; the others get the stale value
+  if there is one, or wait up to CACHE_WAIT seconds for the winner's
+  result before computing it themselves;
+- a value past its ttl but inside the stale window is returned as is while
+  the winner refreshes it in a background thread (stale-while-revalidate);
+- ttls are jittered by CACHE_JITTER either way, so keys filled together
+  don't all expire together;
+- an entry records the version of each of its tags when it was computed.
+  invalidate() bumps tag versions, from the signals in signals.py and from
+  bulk updates that skip them, and an entry whose tags moved on is
+  recomputed by its next reader, synchronously: a page shown right after a
+  change should show the change. Callers that lose the race still get the
+  old value rather than wait.
+
+The lock expires after CACHE_LOCK_TIMEOUT, so a recomputation that dies
+doesn't block the key for good.
+"""
+
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+
+logger = logging.getLogger(__name__)
+
+def caching_setting(name):
+    defaults = {
+        "VIEW_CACHE_TTL": 10 * 60,
+        "CACHE_STALE_TTL": 5 * 60,
+        "CACHE_JITTER": 0.1,
+        "CACHE_LOCK_TIMEOUT": 30,
+        "CACHE_WAIT": 2.0,
+        "CACHE_WAIT_STEP": 0.05,
+    }
+    return getattr(settings, name, defaults[name])
+
+
+def entry_key(key):
+    return f"view:{key}"
+
+
+def lock_key(key):
+    return f"view:{key}:lock"
+
+
+def tag_key(tag):
+    return f"view-tag:{tag}"
+
+
+def jittered(seconds):
+    spread = caching_setting("CACHE_JITTER")
+    return seconds * random.uniform(1 - spread, 1 + spread)
+
+
+def tag_versions(tags):
+    """{tag: version}, starting a version for tags that have none."""
+    keys = {tag_key(tag): tag for tag in tags}
+    found = cache.get_many(list(keys))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            cache.add(key, now, None)
+        found.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in found.items()}
+
+
+def store(key, compute, ttl, tags):
+    # Versions are read first: a change made while computing leaves the
+    # entry behind the tags, and the next reader recomputes it
+    versions = tag_versions(tags)
+    value = compute()
+    entry = {"value": value, "fresh_until": time.time() + jittered(ttl), "tags": versions}
+    cache.set(entry_key(key), entry, ttl + jittered(caching_setting("CACHE_STALE_TTL")))
+    cache.delete(lock_key(key))
+    return value
+
+
+def refresh_in_background(key, compute, ttl, tags):
+    def run():
+        try:
+            store(key, compute, ttl, tags)
+        except Exception:
+            logger.exception("Background refresh of %s failed", key)
+            cache.delete(lock_key(key))
+        finally:
+            connection.close()
+
+    threading.Thread(target=run, name=f"cache-refresh:{key}", daemon=True).start()
+
+
+def acquire(key):
+    return cache.add(lock_key(key), 1, caching_setting("CACHE_LOCK_TIMEOUT"))
+
+
+def cached(key, compute, ttl, tags=()):
+    """compute()'s value for ``key``, from the cache when it can be (see the module docstring)."""
+    entry = cache.get(entry_key(key))
+    if entry is not None:
+        current = entry["tags"] == tag_versions(tags) if tags else True
+        if current and entry["fresh_until"] > time.time():
+            return entry["value"]
+        if not acquire(key):
+            # Someone else is already on it
+            return entry["value"]
+        if current:
+            refresh_in_background(key, compute, ttl, tags)
+            return entry["value"]
+        try:
+            return store(key, compute, ttl, tags)
+        except Exception:
+            cache.delete(lock_key(key))
+            raise
+
+    if not acquire(key):
+        deadline = time.monotonic() + caching_setting("CACHE_WAIT")
+        while time.monotonic() < deadline:
+            time.sleep(caching_setting("CACHE_WAIT_STEP"))
+            entry = cache.get(entry_key(key))
+            if entry is not None:
+                return entry["value"]
+        # The winner is slow or gone; don't keep the page waiting
+        return compute()
+    try:
+        return store(key, compute, ttl, tags)
+    except Exception:
+        cache.delete(lock_key(key))
+        raise
+
+
+def invalidate(*tags):
+    """Mark everything cached under ``tags`` out of date once the transaction commits."""
+    keys = [tag_key(tag) for tag in set(tags)]
+    transaction.on_commit(lambda: cache.set_many({key: time.time_ns() for key in keys}, None))
@@ -0,0 +1,192 @@
+"""
+Month and week calendars of approved events.
+
+A calendar window is read from per-month buckets, cached: for each day of
+the month, the approved (or full) events as (id, title, start time) and
+the dates of recurring events that have no Event row yet. A month grid
+with its leading and trailing days touches at most three buckets, a week
+at most two; the ones missing from the cache are filled together by one
+range query on Event.date, which is indexed, plus the two series lookups
+of occurrences_between(). A warm window costs two cache reads and no
+query.
+
+Buckets are dropped, after the commit, when something in them changes:
+
+- saving or deleting an event drops the bucket of its month, and of the
+  month it moved from when the date changed (signals.py);
+- every bucket key carries a generation number. Changes that reach many
+  months at once or bypass signals (series edits and approval, tombstones)
+  bump it, which drops every bucket without listing them.
+
+CALENDAR_CACHE_TTL bounds how long anything else (a status changed with
+update(), say) can go unnoticed.
+"""
+
+import calendar
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Event, EventSeries
+from .recurrence import occurrences_between
+
+
+CALENDAR_STATUSES = ("approved", "full")
+GENERATION_KEY = "calendar:generation"
+VIEWS = ("month", "week")
+
+
+def calendar_setting(name):
+    defaults = {
+        "CALENDAR_CACHE_TTL": 60 * 60,
+    }
+    return getattr(settings, name, defaults[name])
+
+
+# Windows
+
+def month_bounds(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def window(view, anchor):
+    """(start, end) of the ``view`` around ``anchor``: a Monday-to-Sunday month grid or week."""
+    if view == "week":
+        start = anchor - timedelta(days=anchor.weekday())
+        return start, start + timedelta(days=6)
+    first, last = month_bounds(anchor.year, anchor.month)
+    return first - timedelta(days=first.weekday()), last + timedelta(days=6 - last.weekday())
+
+
+def months_in(start, end):
+    """(year, month) of every month from ``start`` to ``end``."""
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+# Buckets
+
+def generation():
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        # Never restart from a number old buckets may still be stored under
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        value = cache.get(GENERATION_KEY)
+    return value
+
+
+def bucket_key(year, month, current):
+    return f"calendar:month:{current}:{year}-{month:02d}"
+
+
+def time_label(value):
+    return value.strftime("%H:%M") if value else None
+
+
+def fill(months):
+    """Buckets of ``months``, read with one range query over all of them."""
+    start = month_bounds(*months[0])[0]
+    end = month_bounds(*months[-1])[1]
+    buckets = {m: {"events": defaultdict(list), "occurrences": defaultdict(list)} for m in months}
+
+    events = (
+        Event.objects
+        .filter(status__in=CALENDAR_STATUSES, date__range=(start, end))
+        .order_by("date", "start_time", "id")
+        .values_list("id", "date", "title", "start_time")
+    )
+    for pk, day, title, start_time in events:
+        bucket = buckets.get((day.year, day.month))
+        if bucket is not None:
+            bucket["events"][day.isoformat()].append((pk, title, time_label(start_time)))
+
+    series = EventSeries.objects.filter(status="approved")
+    for occurrence in occurrences_between(series, start, end):
+        day = occurrence.date
+        bucket = buckets.get((day.year, day.month))
+        if bucket is not None:
+            bucket["occurrences"][day.isoformat()].append(
+                (occurrence.series_id, occurrence.title, time_label(occurrence.start_time))
+            )
+
+    return {m: {kind: dict(days) for kind, days in b.items()} for m, b in buckets.items()}
+
+
+def buckets_for(months):
+    """{(year, month): bucket}, from the cache where possible."""
+    current = generation()
+    keys = {bucket_key(year, month, current): (year, month) for year, month in months}
+    found = cache.get_many(list(keys))
+    buckets = {keys[key]: bucket for key, bucket in found.items()}
+
+    missing = [m for m in months if m not in buckets]
+    if missing:
+        # Months in between are filled too, so one query spans the window
+        filled = fill(months_in(month_bounds(*missing[0])[0], month_bounds(*missing[-1])[0]))
+        cache.set_many(
+            {bucket_key(year, month, current): filled[(year, month)] for year, month in missing},
+            calendar_setting("CALENDAR_CACHE_TTL"),
+        )
+        buckets.update((m, filled[m]) for m in missing)
+    return buckets
+
+
+def calendar_window(view, anchor):
+    """
+    The ``view`` ("month" or "week") around ``anchor``: start, end, and days,
+    one per date of the window with its events ({"id", "title",
+    "start_time"}), occurrences ({"series", "title", "start_time"}) and
+    count.
+    """
+    start, end = window(view, anchor)
+    buckets = buckets_for(months_in(start, end))
+    days = []
+    day = start
+    while day <= end:
+        bucket = buckets[(day.year, day.month)]
+        key = day.isoformat()
+        events = [
+            {"id": pk, "title": title, "start_time": start_time}
+            for pk, title, start_time in bucket["events"].get(key, ())
+        ]
+        occurrences = [
+            {"series": pk, "title": title, "start_time": start_time}
+            for pk, title, start_time in bucket["occurrences"].get(key, ())
+        ]
+        days.append({
+            "date": day,
+            "events": events,
+            "occurrences": occurrences,
+            "count": len(events) + len(occurrences),
+            "in_month": view == "week" or day.month == anchor.month,
+        })
+        day += timedelta(days=1)
+    return {"view": view, "anchor": anchor, "start": start, "end": end, "days": days}
+
+
+# Invalidation
+
+def invalidate_dates(dates):
+    """Drop the buckets of the months of ``dates`` once the transaction commits."""
+    months = {(d.year, d.month) for d in dates if d}
+    if not months:
+        return
+
+    def drop():
+        current = generation()
+        cache.delete_many([bucket_key(year, month, current) for year, month in months])
+
+    transaction.on_commit(drop)
+
+
+def invalidate_all():
+    """Drop every bucket once the transaction commits."""
+    transaction.on_commit(lambda: cache.set(GENERATION_KEY, time.time_ns(), None))
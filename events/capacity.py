@@ -0,0 +1,137 @@
+"""
+Keeping EventCapacity.current_participants honest.
+
+current_participants is a cached count. Join and leave recount it for one
+event, but participations removed any other way (the Django admin,
+cascades, bulk SQL) leave it stale, and with it the full/approved status.
+
+reconcile_capacities() checks every event at once:
+
+- one query counts participations with a single GROUP BY, joins the
+  counts to the capacities and returns only the rows that disagree, either
+  on the count or on the status;
+- an UPDATE per UPDATE_BATCH of those rows recounts just them, so a clean
+  run writes nothing and the count is correct as of the update even if
+  people joined since;
+- two more UPDATEs mark approved events that reached capacity as full and
+  reopen full events that have room again.
+
+It is cheap enough to run every few minutes from cron.
+"""
+
+from django.db import connection, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .archive import col, table
+from .caching import invalidate as invalidate_views
+from .models import Event, EventCapacity, Participation
+
+
+# Ids per UPDATE, well under SQLite's limit on query parameters
+UPDATE_BATCH = 500
+
+
+def participant_count():
+    """Live participation count of the row's event, for annotate() and update()."""
+    counts = (
+        Participation.objects
+        .filter(event_id=OuterRef("event_id"))
+        .values("event_id")
+        .annotate(c=Count("id"))
+        .values("c")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def sync_status(event_ids):
+    """Mark the events full or reopen them according to their capacity. Returns (filled, reopened)."""
+    events = Event.all_objects.filter(id__in=event_ids)
+    filled = events.filter(
+        status="approved",
+        capacity__current_participants__gte=F("capacity__max_participants"),
+    ).update(status="full")
+    reopened = events.filter(
+        status="full",
+        capacity__current_participants__lt=F("capacity__max_participants"),
+    ).update(status="approved")
+    if filled or reopened:
+        organizers = events.values_list("organizer_id", flat=True).distinct()
+        invalidate_views("events", *(f"organizer:{pk}" for pk in organizers))
+    return filled, reopened
+
+
+def drifted_rows():
+    """(event id, title, status, cached, actual, max) for every capacity that is off."""
+    counted = "COALESCE(p.n, 0)"
+    cached = col(EventCapacity, "current_participants", "c")
+    limit = col(EventCapacity, "max_participants", "c")
+    status = col(Event, "status", "e")
+    sql = (
+        f"SELECT {col(Event, 'id', 'e')}, {col(Event, 'title', 'e')}, {status}, {cached}, {counted}, {limit} "
+        f"FROM {table(EventCapacity)} c "
+        f"JOIN {table(Event)} e ON {col(Event, 'id', 'e')} = {col(EventCapacity, 'event', 'c')} "
+        f"LEFT JOIN (SELECT {col(Participation, 'event')} AS event_id, COUNT(*) AS n "
+        f"FROM {table(Participation)} GROUP BY {col(Participation, 'event')}) p "
+        f"ON p.event_id = {col(EventCapacity, 'event', 'c')} "
+        f"WHERE {col(Event, 'deleted_at', 'e')} IS NULL AND ("
+        f"{cached} <> {counted} "
+        f"OR ({status} = 'approved' AND {counted} >= {limit}) "
+        f"OR ({status} = 'full' AND {counted} < {limit})) "
+        f"ORDER BY ABS({cached} - {counted}) DESC, {col(Event, 'id', 'e')}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        return cursor.fetchall()
+
+
+def reconcile_capacities(dry_run=False):
+    """
+    Recount drifted capacities and fix full/approved statuses. Returns a
+    report: checked, drifted (count mismatches), total_drift (seats the
+    cached counts were off by), filled, reopened, and rows, the drifted
+    events as dicts, worst first. With ``dry_run`` nothing is written and
+    filled/reopened are what would change.
+    """
+    rows = drifted_rows()
+    report = {
+        "checked": EventCapacity.objects.count(),
+        "drifted": 0,
+        "total_drift": 0,
+        "filled": 0,
+        "reopened": 0,
+        "missing_capacity": Event.objects.filter(status__in=("approved", "full"), capacity__isnull=True).count(),
+        "rows": [],
+    }
+    for event_id, title, status, cached, actual, limit in rows:
+        expected = "full" if actual >= limit else "approved"
+        report["rows"].append({
+            "event_id": event_id,
+            "title": title,
+            "status": status,
+            "cached": cached,
+            "actual": actual,
+            "max_participants": limit,
+            "new_status": expected if status in ("approved", "full") and status != expected else status,
+        })
+        if cached != actual:
+            report["drifted"] += 1
+            report["total_drift"] += abs(cached - actual)
+
+    if dry_run:
+        report["filled"] = sum(1 for r in report["rows"] if r["status"] == "approved" and r["new_status"] == "full")
+        report["reopened"] = sum(1 for r in report["rows"] if r["status"] == "full" and r["new_status"] == "approved")
+        return report
+
+    ids = [r["event_id"] for r in report["rows"]]
+    if not ids:
+        return report
+    with transaction.atomic():
+        for start in range(0, len(ids), UPDATE_BATCH):
+            batch = ids[start:start + UPDATE_BATCH]
+            EventCapacity.objects.filter(event_id__in=batch).update(current_participants=participant_count())
+            filled, reopened = sync_status(batch)
+            report["filled"] += filled
+            report["reopened"] += reopened
+        invalidate_views("capacity")
+    return report
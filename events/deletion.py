@@ -0,0 +1,348 @@
+"""
+Deleting events, recurring events and users in the background.
+
+Deleting an organizer used to be one ORM .delete() cascading through all
+their events, participations, feedback and capacities in one transaction,
+holding SQLite's write lock for seconds. Deletion now has two steps:
+
+- tombstone_event(), tombstone_series() and tombstone_user() run in the
+  request. A few UPDATEs stamp deleted_at on the object (for a user, also
+  on their events and series, and the account is deactivated) and queue a
+  DeletionJob. Event.objects and EventSeries.objects leave tombstoned rows
+  out, so the object disappears from every page at once. A user's own
+  registrations and feedback are deleted there and then, so their seats
+  free up and their ratings stop counting straight away.
+- purge() runs from the purge_deletions command. It removes the dependent
+  rows ``batch_size`` at a time, one short transaction per batch, then the
+  object itself, then image files nothing else refers to.
+
+Rows are deleted in SQL, as in events.archive: going through the ORM would
+fire post_delete per participation and queue every attendee for a
+recommendation refresh. Whatever is left when the object's own row goes is
+handled by the normal cascade.
+
+A purge can stop anywhere and picks up where it left off on the next run.
+Each job counts the rows it has to remove when it starts and records every
+batch it removes, which is the progress shown on the admin Deletions page.
+"""
+
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts.models import Profile
+
+from .archive import col, table
+from .caching import invalidate as invalidate_views
+from .calendars import invalidate_all, invalidate_dates
+from .capacity import participant_count, sync_status
+from .models import (
+    ArchivedEvent,
+    ArchivedFeedback,
+    ArchivedParticipation,
+    CheckIn,
+    DeletionJob,
+    Event,
+    EventActivityRollup,
+    EventCapacity,
+    EventRecommendation,
+    EventSeries,
+    Feedback,
+    NotificationDelivery,
+    OrganizerActivityRollup,
+    Participation,
+    RevokedTicket,
+)
+from .mediafiles import delete_file, unused
+from .notifications import retry_delay
+from .prerender import withdraw
+from .suggest import changed as suggestions_changed
+from .tickets import invalidate, revoke
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+MAX_ATTEMPTS = 5
+
+
+# Tombstoning, in the request
+
+def queue(kind, obj):
+    return DeletionJob.objects.create(kind=kind, object_id=obj.pk, object_repr=str(obj)[:200])
+
+
+def tombstone_event(event):
+    """Hide ``event`` and queue its purge. Call inside the deleting transaction."""
+    event.deleted_at = timezone.now()
+    Event.all_objects.filter(pk=event.pk).update(deleted_at=event.deleted_at)
+    invalidate([event.pk])
+    withdraw([event.pk])
+    invalidate_dates([event.date])
+    invalidate_views("events", f"organizer:{event.organizer_id}")
+    suggestions_changed([event.pk])
+    return queue("event", event)
+
+
+def tombstone_series(series):
+    """Hide ``series`` and its materialized dates and queue their purge."""
+    series.deleted_at = timezone.now()
+    EventSeries.all_objects.filter(pk=series.pk).update(deleted_at=series.deleted_at)
+    events = Event.objects.filter(series=series)
+    withdraw(events.values_list("pk", flat=True))
+    events.update(deleted_at=series.deleted_at)
+    invalidate_all()
+    invalidate_views("events", f"organizer:{series.organizer_id}")
+    suggestions_changed()
+    return queue("series", series)
+
+
+def tombstone_user(user):
+    """
+    Deactivate ``user``, free their seats, drop their feedback, hide their
+    events and series and queue the purge of the account and everything it
+    owns.
+    """
+    now = timezone.now()
+    user.is_active = False
+    get_user_model().objects.filter(pk=user.pk).update(is_active=False)
+    Profile.objects.filter(user_id=user.pk).update(deleted_at=now)
+    # Left in place until the purge, their registrations would hold seats
+    # and their feedback count in ratings; one attendee's rows are few
+    attendance = Participation.objects.filter(user_id=user.pk).order_by("id").values_list("id", "event_id")
+    while True:
+        rows = list(attendance[:BATCH_SIZE])
+        if not rows:
+            break
+        release_seats(rows)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table(Feedback)} WHERE {col(Feedback, 'user')} = %s", [user.pk])
+        if cursor.rowcount:
+            invalidate_views("feedback")
+    events = Event.objects.filter(organizer_id=user.pk)
+    withdraw(events.values_list("pk", flat=True))
+    events.update(deleted_at=now)
+    EventSeries.objects.filter(organizer_id=user.pk).update(deleted_at=now)
+    invalidate_all()
+    invalidate_views("events", "profiles", f"organizer:{user.pk}")
+    suggestions_changed()
+    return queue("user", user)
+
+
+# Purging, in the background
+
+def advance(job, label, count):
+    job.progress[label] = job.progress.get(label, 0) + count
+    job.save(update_fields=["progress"])
+
+
+def delete_ids(cursor, model, ids):
+    placeholders = ", ".join(["%s"] * len(ids))
+    cursor.execute(f"DELETE FROM {table(model)} WHERE {col(model, model._meta.pk.name)} IN ({placeholders})", ids)
+
+
+def delete_batches(job, label, queryset, batch_size):
+    """Delete the rows of ``queryset`` a batch per transaction."""
+    model = queryset.model
+    ids_query = queryset.order_by("pk").values_list("pk", flat=True)
+    while True:
+        ids = list(ids_query[:batch_size])
+        if not ids:
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            delete_ids(cursor, model, ids)
+            advance(job, label, len(ids))
+
+
+def release_seats(rows):
+    """Delete the (participation id, event id) ``rows``, revoking their tickets and freeing the seats."""
+    event_ids = {event_id for _, event_id in rows}
+    with connection.cursor() as cursor:
+        delete_ids(cursor, Participation, [pk for pk, _ in rows])
+    revoke([(event_id, pk) for pk, event_id in rows])
+    EventCapacity.objects.filter(event_id__in=event_ids).update(current_participants=participant_count())
+    sync_status(event_ids)
+    invalidate_views("participations", "capacity")
+
+
+def delete_attendance(job, user_id, batch_size):
+    """
+    Remove a user's registrations, freeing their seats as each batch goes.
+    tombstone_user() already did; this catches any made in the meantime.
+    """
+    rows_query = Participation.objects.filter(user_id=user_id).order_by("id").values_list("id", "event_id")
+    while True:
+        rows = list(rows_query[:batch_size])
+        if not rows:
+            return
+        with transaction.atomic():
+            release_seats(rows)
+            advance(job, "participations", len(rows))
+
+
+def remove_unused_files(job, names):
+    """Delete image files no event, series or archived event refers to any more."""
+    # e.g. the dates of a series share its image, and identical uploads one file
+    for name in unused(names):
+        if delete_file(name) is not None:
+            advance(job, "files", 1)
+
+
+def purge_event(job, event_id, batch_size):
+    delete_batches(job, "participations", Participation.objects.filter(event_id=event_id), batch_size)
+    delete_batches(job, "feedback", Feedback.objects.filter(event_id=event_id), batch_size)
+    delete_batches(job, "recommendations", EventRecommendation.objects.filter(event_id=event_id), batch_size)
+    delete_batches(job, "rollups", EventActivityRollup.objects.filter(event_id=event_id), batch_size)
+    delete_batches(job, "check-ins", CheckIn.objects.filter(event_id=event_id), batch_size)
+    delete_batches(job, "revoked tickets", RevokedTicket.objects.filter(event_id=event_id), batch_size)
+
+    image = Event.all_objects.filter(pk=event_id).values_list("image", flat=True).first()
+    with transaction.atomic():
+        # Only the capacity and stragglers are left to cascade
+        deleted = Event.all_objects.filter(pk=event_id).delete()[1].get(Event._meta.label, 0)
+        if deleted:
+            advance(job, "events", deleted)
+    remove_unused_files(job, [image])
+
+
+def purge_series(job, series_id, batch_size):
+    for event_id in Event.all_objects.filter(series_id=series_id).values_list("id", flat=True):
+        purge_event(job, event_id, batch_size)
+
+    image = EventSeries.all_objects.filter(pk=series_id).values_list("image", flat=True).first()
+    with transaction.atomic():
+        if EventSeries.all_objects.filter(pk=series_id).delete()[0]:
+            advance(job, "series", 1)
+    remove_unused_files(job, [image])
+
+
+def purge_user(job, user_id, batch_size):
+    delete_attendance(job, user_id, batch_size)
+    delete_batches(job, "feedback", Feedback.objects.filter(user_id=user_id), batch_size)
+    invalidate_views("feedback")
+    delete_batches(job, "recommendations", EventRecommendation.objects.filter(user_id=user_id), batch_size)
+    delete_batches(job, "notifications", NotificationDelivery.objects.filter(user_id=user_id), batch_size)
+
+    for series_id in EventSeries.all_objects.filter(organizer_id=user_id).values_list("id", flat=True):
+        purge_series(job, series_id, batch_size)
+    for event_id in Event.all_objects.filter(organizer_id=user_id).values_list("id", flat=True):
+        purge_event(job, event_id, batch_size)
+    delete_batches(job, "rollups", OrganizerActivityRollup.objects.filter(organizer_id=user_id), batch_size)
+
+    # Their history: what they attended, then the events they ran
+    delete_batches(job, "participations", ArchivedParticipation.objects.filter(user_id=user_id), batch_size)
+    delete_batches(job, "feedback", ArchivedFeedback.objects.filter(user_id=user_id), batch_size)
+    archived = ArchivedEvent.objects.filter(organizer_id=user_id)
+    delete_batches(job, "participations", ArchivedParticipation.objects.filter(event__in=archived), batch_size)
+    delete_batches(job, "feedback", ArchivedFeedback.objects.filter(event__in=archived), batch_size)
+    images = list(archived.exclude(image="").values_list("image", flat=True))
+    delete_batches(job, "events", archived, batch_size)
+    remove_unused_files(job, images)
+
+    with transaction.atomic():
+        # Profile, search row and the like go with the account
+        if get_user_model().objects.filter(pk=user_id).delete()[0]:
+            advance(job, "users", 1)
+
+
+def planned_rows(job):
+    """How many rows the job is going to remove, counted once when it starts."""
+    pk = job.object_id
+    if job.kind == "event":
+        events = Event.all_objects.filter(pk=pk)
+    elif job.kind == "series":
+        events = Event.all_objects.filter(series_id=pk)
+    else:
+        events = Event.all_objects.filter(organizer_id=pk)
+
+    total = events.count()
+    total += Participation.objects.filter(event__in=events).count()
+    total += Feedback.objects.filter(event__in=events).count()
+    total += EventRecommendation.objects.filter(event__in=events).count()
+    total += EventActivityRollup.objects.filter(event__in=events).count()
+    total += CheckIn.objects.filter(event__in=events).count()
+    total += RevokedTicket.objects.filter(event__in=events).count()
+    if job.kind == "series":
+        total += 1
+    elif job.kind == "user":
+        archived = ArchivedEvent.objects.filter(organizer_id=pk)
+        total += 1 + EventSeries.all_objects.filter(organizer_id=pk).count()
+        total += Participation.objects.filter(user_id=pk).exclude(event__in=events).count()
+        total += Feedback.objects.filter(user_id=pk).exclude(event__in=events).count()
+        total += EventRecommendation.objects.filter(user_id=pk).exclude(event__in=events).count()
+        total += NotificationDelivery.objects.filter(user_id=pk).count()
+        total += OrganizerActivityRollup.objects.filter(organizer_id=pk).count()
+        total += archived.count()
+        total += ArchivedParticipation.objects.filter(user_id=pk).exclude(event__in=archived).count()
+        total += ArchivedParticipation.objects.filter(event__in=archived).count()
+        total += ArchivedFeedback.objects.filter(user_id=pk).exclude(event__in=archived).count()
+        total += ArchivedFeedback.objects.filter(event__in=archived).count()
+    return total
+
+
+PURGERS = {
+    "event": purge_event,
+    "series": purge_series,
+    "user": purge_user,
+}
+
+
+def run_job(job, batch_size):
+    if job.started_at is None:
+        job.status = "running"
+        job.started_at = timezone.now()
+        job.total = planned_rows(job)
+        job.save(update_fields=["status", "started_at", "total"])
+    PURGERS[job.kind](job, job.object_id, batch_size)
+    job.status = "done"
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "finished_at"])
+
+
+def record_failure(job, exc, stats):
+    job.attempts += 1
+    job.last_error = f"{type(exc).__name__}: {exc}"
+    if job.attempts >= MAX_ATTEMPTS:
+        job.status = "failed"
+        stats["jobs_failed"] += 1
+    else:
+        job.next_attempt_at = timezone.now() + retry_delay(job.attempts)
+        stats["jobs_retrying"] += 1
+    job.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+
+
+def purge(limit=10, batch_size=BATCH_SIZE, stdout=None):
+    """
+    Work through up to ``limit`` due deletion jobs, oldest first. Returns
+    {"jobs_done", "jobs_retrying", "jobs_failed", "rows"}.
+    """
+    stats = dict.fromkeys(("jobs_done", "jobs_retrying", "jobs_failed", "rows"), 0)
+    jobs = list(
+        DeletionJob.objects
+        .filter(status__in=("pending", "running"), next_attempt_at__lte=timezone.now())
+        .order_by("id")[:limit]
+    )
+    for job in jobs:
+        removed_before = job.removed
+        try:
+            run_job(job, batch_size)
+        except Exception as exc:
+            logger.warning("Deletion job %s failed: %s", job.pk, exc)
+            record_failure(job, exc, stats)
+        else:
+            stats["jobs_done"] += 1
+        stats["rows"] += job.removed - removed_before
+        if stdout is not None:
+            stdout.write(f"  {job.get_kind_display()} #{job.object_id} “{job.object_repr}”: "
+                         f"{job.removed} of {job.total} rows removed ({job.status})")
+    return stats
+
+
+def deletion_backlog():
+    """Jobs still to run and failed ones, for monitoring."""
+    return {
+        "pending": DeletionJob.objects.filter(status__in=("pending", "running")).count(),
+        "failed": DeletionJob.objects.filter(status="failed").count(),
+    }
@@ -1,8 +1,59 @@
 from django import forms
-from .models import Event, Feedback, EventCapacity
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+from datetime import date
+from itertools import islice
+from .models import Event, EventSeries, Feedback, EventCapacity
+from .recurrence import MAX_COUNT, dates_between
+from .images import read_image_header, reencode_upload
+from .schedule import slot_label, venue_conflicts
 
 
-class EventForm(forms.ModelForm):
+class EventImageField(forms.ImageField):
+    """
+    ImageField that only reads the image header during validation.
+    The full decode happens later, in the re-encoding pool.
+    """
+
+    def to_python(self, data):
+        f = forms.FileField.to_python(self, data)
+        if f is None:
+            return None
+        image_format, width, height = read_image_header(f)
+        f.content_type = Image.MIME.get(image_format)
+        return f
+
+
+class EventImageMixin:
+    """Upload handling shared by the event and series forms."""
+
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_errors = upload_errors or {}
+
+    def clean_image(self):
+        image = self.cleaned_data.get("image")
+        # Only new uploads get re-encoded; an unchanged image is a FieldFile
+        if isinstance(image, UploadedFile):
+            image = reencode_upload(image)
+        return image
+
+    def add_upload_errors(self):
+        for field, message in self.upload_errors.items():
+            self.add_error(field if field in self.fields else None, message)
+
+
+class EventForm(EventImageMixin, forms.ModelForm):
+    # Bulk imports check venue clashes per chunk instead (events.imports)
+    check_conflicts = True
+
+    image = EventImageField(
+        required=False,
+        label="Event image",
+        widget=forms.FileInput(attrs={
+            "class": "form-control",
+        }),
+    )
     max_participants = forms.IntegerField(
         min_value=1,
         label="Maximum Participants",
@@ -55,6 +106,120 @@ class EventForm(forms.ModelForm):
             "max_participants": "Maximum Participants",
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        self.add_upload_errors()
+        if not self.check_conflicts:
+            return cleaned_data
+
+        clashes = venue_conflicts(
+            cleaned_data.get("location"),
+            cleaned_data.get("date"),
+            cleaned_data.get("start_time"),
+            cleaned_data.get("end_time"),
+            exclude_pk=self.instance.pk,
+        )
+        for other in clashes:
+            self.add_error(None, f"“{other.title}” is already booked at this location on that date ({slot_label(other)}).")
+        return cleaned_data
+
+
+class EventImportForm(EventForm):
+    """One row of a bulk import: EventForm's rules without the image."""
+    check_conflicts = False
+    image = None
+
+    class Meta(EventForm.Meta):
+        fields = ["title", "short_description", "date", "start_time", "end_time", "location", "max_participants"]
+
+
+class EventImportFileForm(forms.Form):
+    file = forms.FileField(
+        label="CSV or iCalendar file",
+        widget=forms.FileInput(attrs={"class": "form-control", "accept": ".csv,.ics,text/csv,text/calendar"}),
+    )
+    dry_run = forms.BooleanField(required=False, label="Only check the file, don’t import")
+
+
+class EventSeriesForm(EventImageMixin, forms.ModelForm):
+    WEEKDAY_CHOICES = [(str(i), name) for i, name in enumerate(["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"])]
+    # Occurrences checked for venue clashes when the series is submitted
+    CONFLICT_CHECK_OCCURRENCES = 12
+
+    image = EventImageField(
+        required=False,
+        label="Event image",
+        widget=forms.FileInput(attrs={"class": "form-control"}),
+    )
+    weekdays = forms.MultipleChoiceField(
+        choices=WEEKDAY_CHOICES,
+        required=False,
+        label="On",
+        help_text="Weekly series only. Defaults to the weekday of the first date.",
+        widget=forms.CheckboxSelectMultiple,
+    )
+
+    class Meta:
+        model = EventSeries
+        fields = [
+            "image", "title", "short_description", "start_time", "end_time", "location", "max_participants",
+            "freq", "interval", "weekdays", "starts_on", "until", "count",
+        ]
+        widgets = {
+            "title": forms.TextInput(attrs={"class": "form-control"}),
+            "short_description": forms.Textarea(attrs={"class": "form-control", "rows": 4}),
+            "start_time": forms.TimeInput(attrs={"type": "time", "class": "form-control"}),
+            "end_time": forms.TimeInput(attrs={"type": "time", "class": "form-control"}),
+            "location": forms.TextInput(attrs={"class": "form-control"}),
+            "max_participants": forms.NumberInput(attrs={"class": "form-control", "min": 1}),
+            "freq": forms.Select(attrs={"class": "form-select"}),
+            "interval": forms.NumberInput(attrs={"class": "form-control", "min": 1}),
+            "starts_on": forms.DateInput(attrs={"type": "date", "class": "form-control"}),
+            "until": forms.DateInput(attrs={"type": "date", "class": "form-control"}),
+            "count": forms.NumberInput(attrs={"class": "form-control", "min": 1}),
+        }
+        labels = {
+            "short_description": "Short description",
+            "max_participants": "Maximum Participants (per date)",
+            "freq": "Repeats",
+            "interval": "Every",
+            "starts_on": "First date",
+            "until": "Last date (optional)",
+            "count": "Number of dates (optional)",
+        }
+
+    def clean_weekdays(self):
+        return ",".join(self.cleaned_data.get("weekdays") or [])
+
+    def clean_interval(self):
+        interval = self.cleaned_data.get("interval")
+        if interval is not None and not 1 <= interval <= 52:
+            raise forms.ValidationError("Choose between 1 and 52.")
+        return interval
+
+    def clean_count(self):
+        count = self.cleaned_data.get("count")
+        if count is not None and not 1 <= count <= MAX_COUNT:
+            raise forms.ValidationError(f"A series can have at most {MAX_COUNT} dates.")
+        return count
+
+    def clean(self):
+        cleaned_data = super().clean()
+        self.add_upload_errors()
+
+        starts_on, until = cleaned_data.get("starts_on"), cleaned_data.get("until")
+        if starts_on and until and until < starts_on:
+            self.add_error("until", "The last date can't be before the first date.")
+        if self.errors:
+            return cleaned_data
+
+        # Check the first few dates against one-off events at the same venue
+        series = EventSeries(**{f: cleaned_data.get(f) for f in ("freq", "interval", "weekdays", "starts_on", "until", "count")})
+        series.interval = series.interval or 1
+        for day in islice(dates_between(series, starts_on, date.max), self.CONFLICT_CHECK_OCCURRENCES):
+            for other in venue_conflicts(cleaned_data.get("location"), day, cleaned_data.get("start_time"), cleaned_data.get("end_time")):
+                self.add_error(None, f"On {day:%b %d, %Y} “{other.title}” is already booked at this location ({slot_label(other)}).")
+        return cleaned_data
 
 
 class FeedbackForm(forms.ModelForm):
@@ -0,0 +1,248 @@
+"""
+Geocoding and "events near me" queries.
+
+Locations are free text, so geocode() looks them up in a small offline
+gazetteer (events/data/ph_gazetteer.csv by default, or GAZETTEER_PATH):
+every run of words in the location is tried against the place names and
+aliases, and the most specific hit wins - a landmark over a city, a city
+over a province, a longer name over a shorter one. Coordinates are
+city-centre or venue approximations, which is all a radius filter needs.
+
+Each geocoded event also stores geo_cell, the number of the 0.1 degree grid
+square it falls in (about 11 km on a side). Cells are numbered row by row,
+so the cells of a bounding box are one contiguous range per row and a
+radius query is a handful of index range scans on geo_cell. Candidates are
+then filtered by exact distance and sorted in Python.
+"""
+
+import csv
+import math
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+
+
+CELL_DEGREES = 0.1
+COLUMNS = round(360 / CELL_DEGREES)
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+MAX_RADIUS_KM = 500
+
+KIND_RANK = {"landmark": 0, "city": 1, "province": 2}
+
+DEFAULT_GAZETTEER = os.path.join(os.path.dirname(__file__), "data", "ph_gazetteer.csv")
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    latitude: float
+    longitude: float
+    kind: str
+
+
+def normalize(text):
+    """Lowercase, strip accents and punctuation: "Parañaque City" -> "paranaque city"."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def name_variants(name):
+    key = normalize(name)
+    yield key
+    if key.endswith(" city"):
+        yield key[:-5]
+    if key.startswith("city of "):
+        yield key[8:]
+
+
+@lru_cache(maxsize=1)
+def gazetteer():
+    """{normalized name: Place} plus the longest name in words."""
+    path = getattr(settings, "GAZETTEER_PATH", None) or DEFAULT_GAZETTEER
+    names = {}
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            place = Place(row["name"], float(row["latitude"]), float(row["longitude"]), row.get("kind") or "city")
+            aliases = [a for a in (row.get("aliases") or "").split("|") if a.strip()]
+            for name in [row["name"], *aliases]:
+                for key in name_variants(name):
+                    # First entry wins, so list the better-known place first
+                    if key and key not in names:
+                        names[key] = place
+    longest = max((len(key.split()) for key in names), default=0)
+    return names, longest
+
+
+@lru_cache(maxsize=4096)
+def geocode(location):
+    """The Place a free-text location refers to, or None."""
+    words = normalize(location).split()
+    if not words:
+        return None
+    names, longest = gazetteer()
+    best = None
+    for size in range(min(longest, len(words)), 0, -1):
+        for start in range(len(words) - size + 1):
+            place = names.get(" ".join(words[start:start + size]))
+            if place is None:
+                continue
+            rank = (KIND_RANK.get(place.kind, len(KIND_RANK)), -size, start)
+            if best is None or rank < best[0]:
+                best = (rank, place)
+    return best[1] if best else None
+
+
+def cell_for(latitude, longitude):
+    row = min(int((latitude + 90) // CELL_DEGREES), round(180 / CELL_DEGREES) - 1)
+    column = int((longitude + 180) // CELL_DEGREES) % COLUMNS
+    return row * COLUMNS + column
+
+
+def apply_geocode(event):
+    """Set the coordinate fields of ``event`` from its location. Doesn't save."""
+    place = geocode(event.location)
+    if place is None:
+        event.latitude = event.longitude = event.geo_cell = None
+    else:
+        event.latitude = place.latitude
+        event.longitude = place.longitude
+        event.geo_cell = cell_for(place.latitude, place.longitude)
+    event.geocoded_location = event.location
+    return place
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(south, west, north, east) enclosing the circle. West > east when it crosses 180°."""
+    dlat = radius_km / KM_PER_DEGREE
+    south, north = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+    if south <= -90 or north >= 90:
+        return south, -180.0, north, 180.0
+    widest = max(abs(south), abs(north))
+    dlng = radius_km / (KM_PER_DEGREE * math.cos(math.radians(widest)))
+    if dlng >= 180:
+        return south, -180.0, north, 180.0
+    west = (longitude - dlng + 180) % 360 - 180
+    east = (longitude + dlng + 180) % 360 - 180
+    return south, west, north, east
+
+
+def cell_ranges(south, west, north, east):
+    """Contiguous geo_cell ranges covering the box, one or two per grid row."""
+    first_row = cell_for(south, 0) // COLUMNS
+    last_row = cell_for(north, 0) // COLUMNS
+    west_column = cell_for(0, west) % COLUMNS
+    east_column = cell_for(0, east) % COLUMNS
+    if west == -180 and east == 180:
+        spans = [(0, COLUMNS - 1)]
+    elif west_column <= east_column:
+        spans = [(west_column, east_column)]
+    else:
+        spans = [(west_column, COLUMNS - 1), (0, east_column)]
+    return [
+        (row * COLUMNS + lo, row * COLUMNS + hi)
+        for row in range(first_row, last_row + 1)
+        for lo, hi in spans
+    ]
+
+
+def in_box(queryset, south, west, north, east):
+    """Narrow ``queryset`` to geocoded events inside the box, via the cell index."""
+    cells = Q()
+    for lo, hi in cell_ranges(south, west, north, east):
+        cells |= Q(geo_cell__range=(lo, hi))
+    exact = Q(latitude__gte=south, latitude__lte=north)
+    if west <= east:
+        exact &= Q(longitude__gte=west, longitude__lte=east)
+    else:
+        exact &= Q(longitude__gte=west) | Q(longitude__lte=east)
+    return queryset.filter(cells, exact)
+
+
+def nearby(queryset, latitude, longitude, radius_km):
+    """
+    Events of ``queryset`` within ``radius_km`` of the point, nearest first,
+    each with a ``distance_km`` attribute.
+    """
+    radius_km = min(max(float(radius_km), 0.0), MAX_RADIUS_KM)
+    box = bounding_box(latitude, longitude, radius_km)
+    found = []
+    for event in in_box(queryset, *box):
+        event.distance_km = haversine_km(latitude, longitude, event.latitude, event.longitude)
+        if event.distance_km <= radius_km:
+            found.append(event)
+    found.sort(key=lambda e: (e.distance_km, e.pk))
+    return found
+
+
+def nearby_items(items, latitude, longitude, radius_km):
+    """
+    nearby() for objects without stored coordinates, such as occurrences of
+    a recurring series: their location is geocoded on the fly.
+    """
+    radius_km = min(max(float(radius_km), 0.0), MAX_RADIUS_KM)
+    found = []
+    for item in items:
+        place = geocode(item.location)
+        if place is None:
+            continue
+        item.distance_km = haversine_km(latitude, longitude, place.latitude, place.longitude)
+        if item.distance_km <= radius_km:
+            found.append(item)
+    found.sort(key=lambda item: item.distance_km)
+    return found
+
+
+def geocode_events(everything=False, batch_size=1000, stdout=None):
+    """
+    Geocode events whose location changed since they were last looked up,
+    or every event with ``everything`` (after editing the gazetteer). Also
+    stores each event's venue key for schedule clash lookups. Returns
+    {"events", "matched", "unmatched"}.
+    """
+    from .models import Event
+    from .schedule import venue_key
+
+    queryset = Event.objects.order_by("id").only("id", "location")
+    if not everything:
+        queryset = queryset.exclude(geocoded_location=F("location"))
+    totals = {"events": 0, "matched": 0, "unmatched": 0}
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        # Events at the same place get the same values, so write one UPDATE per place
+        groups = defaultdict(list)
+        for event in batch:
+            place = apply_geocode(event)
+            if place is not None:
+                totals["matched"] += 1
+            elif event.location:
+                totals["unmatched"] += 1
+            values = (event.latitude, event.longitude, event.geo_cell, event.geocoded_location, venue_key(event.location))
+            groups[values].append(event.id)
+        with transaction.atomic():
+            for (latitude, longitude, cell, location, key), ids in groups.items():
+                Event.objects.filter(id__in=ids).update(
+                    latitude=latitude, longitude=longitude, geo_cell=cell, geocoded_location=location, venue_key=key,
+                )
+        totals["events"] += len(batch)
+        last_id = batch[-1].id
+        if stdout is not None:
+            stdout.write(f"  {totals['events']} events geocoded")
+    return totals
@@ -0,0 +1,212 @@
+"""
+Bounded handling of event image uploads.
+
+- BoundedUploadHandler streams uploads to a temporary file and stops
+  storing a file as soon as it goes over EVENT_IMAGE_MAX_UPLOAD_SIZE
+  (EVENT_UPLOAD_MAX_SIZE for files other than images).
+- read_image_header() only parses the image header, so the pixel limit is
+  enforced before anything gets decoded.
+- reencode_upload() decodes, strips EXIF and downsizes the image in a small
+  process pool, keeping the request worker's memory flat.
+"""
+
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+ALLOWED_FORMATS = {"JPEG", "PNG", "GIF", "WEBP"}
+
+# Form fields that take an event image
+IMAGE_FIELDS = {"image"}
+
+
+def image_setting(name):
+    defaults = {
+        "EVENT_IMAGE_MAX_UPLOAD_SIZE": 10 * 1024 * 1024,
+        "EVENT_UPLOAD_MAX_SIZE": 50 * 1024 * 1024,
+        "EVENT_IMAGE_MAX_PIXELS": 40_000_000,
+        "EVENT_IMAGE_MAX_DIMENSION": 2048,
+        "EVENT_IMAGE_WORKERS": 2,
+        "EVENT_IMAGE_TIMEOUT": 30,
+    }
+    return getattr(settings, name, defaults[name])
+
+
+def upload_errors(request):
+    """Errors recorded by BoundedUploadHandler, keyed by form field name."""
+    return getattr(request, "upload_errors", {})
+
+
+def too_large_message(limit):
+    return f"The uploaded file is too large. The maximum size is {limit / (1024 * 1024):g} MB."
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Temporary-file upload handler with a hard per-file byte cap.
+
+    The cap is EVENT_IMAGE_MAX_UPLOAD_SIZE for the IMAGE_FIELDS and
+    EVENT_UPLOAD_MAX_SIZE for any other file (the event import, say), since
+    the handler is installed for every request. A file that goes over it is
+    skipped as soon as that's known and the rest of the form, CSRF token
+    included, is still parsed, so the view can show an error.
+    """
+
+    def new_file(self, field_name, file_name, content_type, content_length, *args, **kwargs):
+        self.max_bytes = image_setting(
+            "EVENT_IMAGE_MAX_UPLOAD_SIZE" if field_name in IMAGE_FIELDS else "EVENT_UPLOAD_MAX_SIZE"
+        )
+        if content_length is not None and content_length > self.max_bytes:
+            self._reject(field_name)
+            raise SkipFile()
+        super().new_file(field_name, file_name, content_type, content_length, *args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_bytes:
+            self._reject(self.field_name)
+            raise SkipFile()
+        return super().receive_data_chunk(raw_data, start)
+
+    def _reject(self, field_name):
+        if self.request is None:
+            return
+        if not hasattr(self.request, "upload_errors"):
+            self.request.upload_errors = {}
+        self.request.upload_errors[field_name] = too_large_message(self.max_bytes)
+
+
+def read_image_header(uploaded):
+    """
+    Open just enough of the file to learn its format and size.
+    Raises ValidationError for unknown formats or too many pixels.
+    """
+    uploaded.seek(0)
+    try:
+        with Image.open(uploaded) as image:
+            image_format, (width, height) = image.format, image.size
+    except Image.DecompressionBombError:
+        raise ValidationError("The image has too many pixels.")
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise ValidationError("Upload a valid image. The file you uploaded was either not an image or a corrupted image.")
+    finally:
+        uploaded.seek(0)
+
+    if image_format not in ALLOWED_FORMATS:
+        raise ValidationError("Only JPEG, PNG, GIF and WebP images are allowed.")
+    if width * height > image_setting("EVENT_IMAGE_MAX_PIXELS"):
+        raise ValidationError(f"The image has too many pixels ({width}×{height}).")
+    return image_format, width, height
+
+
+def reencode_image(src_path, dst_path, max_pixels, max_dimension):
+    """
+    Runs in the worker process: decode, apply and drop EXIF orientation,
+    downsize to max_dimension and save without metadata.
+    Returns the output format.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(src_path) as image:
+        # Lets the JPEG decoder scale down while decoding instead of after
+        image.draft("RGB", (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dimension, max_dimension))
+
+        if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+            image.convert("RGBA").save(dst_path, "PNG", optimize=True)
+            return "PNG"
+        image.convert("RGB").save(dst_path, "JPEG", quality=85, optimize=True, progressive=True)
+        return "JPEG"
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = None
+
+
+def get_executor():
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            workers = image_setting("EVENT_IMAGE_WORKERS")
+            # Recycle workers now and then so a bad image can't leave one bloated
+            _executor = ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=50)
+            # At most one queued job per worker on top of the running ones
+            _slots = threading.BoundedSemaphore(workers * 2)
+    return _executor, _slots
+
+
+def reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def reencode_upload(uploaded):
+    """
+    Re-encode an uploaded image off the request thread and return it as a
+    new ContentFile ready to be assigned to Event.image.
+    """
+    timeout = image_setting("EVENT_IMAGE_TIMEOUT")
+    limits = (image_setting("EVENT_IMAGE_MAX_PIXELS"), image_setting("EVENT_IMAGE_MAX_DIMENSION"))
+
+    cleanup = []
+    if hasattr(uploaded, "temporary_file_path"):
+        src_path = uploaded.temporary_file_path()
+    else:
+        uploaded.seek(0)
+        with tempfile.NamedTemporaryFile(suffix=".upload", delete=False) as src:
+            for chunk in uploaded.chunks():
+                src.write(chunk)
+        src_path = src.name
+        cleanup.append(src_path)
+
+    fd, dst_path = tempfile.mkstemp(suffix=".img")
+    os.close(fd)
+    cleanup.append(dst_path)
+
+    try:
+        if image_setting("EVENT_IMAGE_WORKERS") <= 0:
+            image_format = reencode_image(src_path, dst_path, *limits)
+        else:
+            executor, slots = get_executor()
+            if not slots.acquire(timeout=timeout):
+                raise ValidationError("The server is busy processing images. Please try again.")
+            try:
+                future = executor.submit(reencode_image, src_path, dst_path, *limits)
+                image_format = future.result(timeout=timeout)
+            except FutureTimeout:
+                raise ValidationError("The image took too long to process.")
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); start a fresh pool next time
+                reset_executor()
+                raise
+            finally:
+                slots.release()
+
+        with open(dst_path, "rb") as f:
+            data = f.read()
+    except ValidationError:
+        raise
+    except Exception:
+        raise ValidationError("Upload a valid image. The file you uploaded was either not an image or a corrupted image.")
+    finally:
+        for path in cleanup:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    ext = "png" if image_format == "PNG" else "jpg"
+    return ContentFile(data, name=f"{uuid.uuid4().hex}.{ext}")
@@ -0,0 +1,315 @@
+"""
+Bulk event import from CSV or iCalendar (.ics) files.
+
+The file is read as a stream and handled ``chunk_size`` rows at a time, so
+memory stays flat however long it is:
+
+- each row is cleaned by EventImportForm's fields, i.e. the same rules as
+  EventForm;
+- venue clashes are checked once per chunk with a single query, instead of
+  one query per row, and against earlier rows of the same chunk (a dry run
+  also remembers earlier chunks, since nothing reaches the database);
+- valid rows are geocoded and inserted with two bulk_creates (events, then
+  capacities) in one transaction per chunk.
+
+Rows that fail are reported by line number and skipped; the rest are
+imported as pending events. Only the first MAX_REPORTED_ERRORS failures
+are kept in the report. A file that stops being parseable ends the import
+there, keeping the rows before it.
+
+CSV files need a header row. Recognised columns: title, date, start_time,
+end_time, location, short_description (or description) and
+max_participants (or capacity). ICS files are read VEVENT by VEVENT:
+SUMMARY, DTSTART, DTEND, LOCATION and DESCRIPTION, with the capacity taken
+from X-MAX-PARTICIPANTS or the default.
+"""
+
+import csv
+import io
+import time
+from collections import defaultdict
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .caching import invalidate as invalidate_views
+from .forms import EventImportForm
+from .geo import apply_geocode
+from .models import Event, EventCapacity
+from .schedule import ACTIVE_STATUSES, overlaps, slot, venue_key
+
+
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+DEFAULT_MAX_PARTICIPANTS = 50
+
+COLUMN_ALIASES = {
+    "description": "short_description",
+    "capacity": "max_participants",
+    "start": "start_time",
+    "end": "end_time",
+}
+
+
+class ImportFormatError(Exception):
+    """The file can't be read (any further) as the declared format."""
+
+
+def text_stream(binary):
+    """Decode an uploaded or opened binary file lazily, tolerating a BOM."""
+    return io.TextIOWrapper(binary, encoding="utf-8-sig", errors="replace", newline="")
+
+
+def column_name(header):
+    name = (header or "").strip().lower().replace(" ", "_").replace("-", "_")
+    return COLUMN_ALIASES.get(name, name)
+
+
+def read_csv(stream):
+    """Yield (line number, row dict) from a CSV text stream."""
+    reader = csv.reader(stream)
+    try:
+        header = [column_name(h) for h in next(reader)]
+    except StopIteration:
+        return
+    except csv.Error as exc:
+        raise ImportFormatError(f"Not a CSV file: {exc}")
+    if "title" not in header:
+        raise ImportFormatError("The CSV header must include a “title” column.")
+
+    while True:
+        try:
+            values = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as exc:
+            raise ImportFormatError(f"Line {reader.line_num}: {exc}")
+        if not any(v.strip() for v in values):
+            continue
+        yield reader.line_num, dict(zip(header, (v.strip() for v in values)))
+
+
+def unfold(stream):
+    """Yield (line number, logical line), joining RFC 5545 folded lines."""
+    pending, pending_line = None, 0
+    for number, raw in enumerate(stream, start=1):
+        line = raw.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield pending_line, pending
+        pending, pending_line = line, number
+    if pending is not None:
+        yield pending_line, pending
+
+
+def ics_text(value):
+    return (
+        value.replace("\\n", "\n").replace("\\N", "\n")
+        .replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\")
+    )
+
+
+def ics_datetime(value, params):
+    """(date, time or None) of a DTSTART/DTEND value, in the site's time zone."""
+    value = value.strip()
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return datetime.strptime(value[:8], "%Y%m%d").date(), None
+    moment = datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S")
+    local = ZoneInfo(settings.TIME_ZONE)
+    if value.endswith("Z"):
+        moment = moment.replace(tzinfo=ZoneInfo("UTC")).astimezone(local)
+    elif "TZID" in params:
+        try:
+            moment = moment.replace(tzinfo=ZoneInfo(params["TZID"])).astimezone(local)
+        except (KeyError, ValueError):
+            pass
+    return moment.date(), moment.time()
+
+
+def read_ics(stream):
+    """Yield (line number of BEGIN:VEVENT, row dict) from an iCalendar text stream."""
+    event, start_line = None, 0
+    seen_calendar = False
+    for number, line in unfold(stream):
+        name, _, value = line.partition(":")
+        name, *raw_params = name.split(";")
+        name = name.upper()
+        params = dict(p.split("=", 1) for p in raw_params if "=" in p)
+
+        if name == "BEGIN" and value.upper() == "VCALENDAR":
+            seen_calendar = True
+        elif name == "BEGIN" and value.upper() == "VEVENT":
+            event, start_line = {}, number
+        elif name == "END" and value.upper() == "VEVENT" and event is not None:
+            yield start_line, event
+            event = None
+        elif event is not None:
+            try:
+                if name == "SUMMARY":
+                    event["title"] = ics_text(value)
+                elif name == "LOCATION":
+                    event["location"] = ics_text(value)
+                elif name == "DESCRIPTION":
+                    event["short_description"] = ics_text(value)
+                elif name == "X-MAX-PARTICIPANTS":
+                    event["max_participants"] = value.strip()
+                elif name == "DTSTART":
+                    day, start = ics_datetime(value, params)
+                    event["date"] = day.isoformat()
+                    event["start_time"] = start.strftime("%H:%M") if start else ""
+                elif name == "DTEND":
+                    _, end = ics_datetime(value, params)
+                    event["end_time"] = end.strftime("%H:%M") if end else ""
+            except ValueError:
+                event.setdefault("_errors", []).append(f"{name}: invalid date “{value}”.")
+    if not seen_calendar:
+        raise ImportFormatError("Not an iCalendar file: no BEGIN:VCALENDAR line.")
+
+
+def detect_format(filename):
+    return "ics" if filename.lower().endswith((".ics", ".ical", ".ifb")) else "csv"
+
+
+def rows(stream, file_format):
+    return read_ics(stream) if file_format == "ics" else read_csv(stream)
+
+
+class Importer:
+    def __init__(self, organizer, chunk_size=CHUNK_SIZE, dry_run=False):
+        self.organizer = organizer
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        # One form's fields, reused for every row: building a form per row
+        # costs more than the validation itself
+        self.fields = EventImportForm().fields
+        # (venue, date) -> slots accepted from this file and not yet in the database
+        self.accepted = defaultdict(list)
+        self.report = {"rows": 0, "created": 0, "failed": 0, "errors": [], "errors_truncated": False, "error": ""}
+
+    def fail(self, line, messages):
+        self.report["failed"] += 1
+        if len(self.report["errors"]) < MAX_REPORTED_ERRORS:
+            self.report["errors"].append({"line": line, "errors": messages})
+        else:
+            self.report["errors_truncated"] = True
+
+    def run(self, row_iter):
+        started = time.monotonic()
+        chunk = []
+        try:
+            for line, data in row_iter:
+                chunk.append((line, data))
+                if len(chunk) >= self.chunk_size:
+                    self.import_chunk(chunk)
+                    chunk = []
+        except ImportFormatError as exc:
+            # Keep what was read before the file became unreadable
+            self.report["error"] = str(exc)
+        if chunk:
+            self.import_chunk(chunk)
+        self.report["seconds"] = round(time.monotonic() - started, 3)
+        return self.report
+
+    def validate(self, chunk):
+        valid = []
+        for line, data in chunk:
+            self.report["rows"] += 1
+            errors = data.pop("_errors", [])
+            if not data.get("max_participants"):
+                data["max_participants"] = str(DEFAULT_MAX_PARTICIPANTS)
+            cleaned = {}
+            for name, field in self.fields.items():
+                try:
+                    cleaned[name] = field.clean(field.widget.value_from_datadict(data, {}, name))
+                except ValidationError as exc:
+                    errors.extend(f"{name}: {message}" for message in exc.messages)
+            if errors:
+                self.fail(line, errors)
+            else:
+                valid.append((line, cleaned))
+        return valid
+
+    def booked(self, valid):
+        """Slots already taken at the venues and dates of this chunk, from one query."""
+        keys = {venue_key(c["location"]) for _, c in valid} - {""}
+        dates = {c["date"] for _, c in valid if c["date"]}
+        booked = defaultdict(list)
+        if not keys or not dates:
+            return booked
+        existing = (
+            Event.objects
+            .filter(venue_key__in=keys, date__in=dates, status__in=ACTIVE_STATUSES)
+            .values_list("venue_key", "date", "start_time", "end_time", "title")
+        )
+        for venue, day, start, end, title in existing:
+            booked[(venue, day)].append((slot(start, end), title))
+        return booked
+
+    def clashes(self, cleaned, booked):
+        key = (venue_key(cleaned["location"]), cleaned["date"])
+        if not key[0] or key[1] is None:
+            return []
+        wanted = slot(cleaned["start_time"], cleaned["end_time"])
+        return [
+            f"“{title}” is already booked at this location on that date."
+            for taken, title in booked.get(key, []) + self.accepted.get(key, [])
+            if overlaps(wanted, taken)
+        ]
+
+    def import_chunk(self, chunk):
+        valid = self.validate(chunk)
+        booked = self.booked(valid)
+
+        events, capacities = [], []
+        for line, cleaned in valid:
+            errors = self.clashes(cleaned, booked)
+            if errors:
+                self.fail(line, errors)
+                continue
+            key = (venue_key(cleaned["location"]), cleaned["date"])
+            self.accepted[key].append((slot(cleaned["start_time"], cleaned["end_time"]), cleaned["title"]))
+            event = Event(
+                title=cleaned["title"],
+                date=cleaned["date"],
+                start_time=cleaned["start_time"],
+                end_time=cleaned["end_time"],
+                location=cleaned["location"],
+                venue_key=key[0],
+                short_description=cleaned["short_description"],
+                organizer=self.organizer,
+                status="pending",
+            )
+            # bulk_create skips pre_save, so geocode here (lookups are cached)
+            apply_geocode(event)
+            events.append(event)
+            capacities.append(cleaned["max_participants"])
+
+        if events and not self.dry_run:
+            with transaction.atomic():
+                Event.objects.bulk_create(events)
+                EventCapacity.objects.bulk_create([
+                    EventCapacity(event=event, max_participants=limit, current_participants=0)
+                    for event, limit in zip(events, capacities)
+                ])
+                # bulk_create sends no post_save either
+                invalidate_views("events", f"organizer:{self.organizer.pk}")
+            # Committed rows are found by the next chunk's query, so only a
+            # dry run has to remember them
+            self.accepted.clear()
+        self.report["created"] += len(events)
+
+
+def import_events(binary, organizer, file_format="csv", chunk_size=CHUNK_SIZE, dry_run=False):
+    """
+    Import events for ``organizer`` from an open binary file. Returns a
+    report with rows, created, failed, errors ([{"line", "errors"}]),
+    seconds, and error if the file stopped being readable part way. With
+    ``dry_run``, created counts the rows that would be imported.
+    """
+    importer = Importer(organizer, chunk_size=chunk_size, dry_run=dry_run)
+    return importer.run(rows(text_stream(binary), file_format))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from events.archive import archive_cutoff, archive_events, pending_archive_count
+
+
+class Command(BaseCommand):
+    help = "Move events past the retention horizon, with their participations and feedback, into the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Archive events older than this many days (default EVENT_ARCHIVE_AFTER_DAYS).")
+        parser.add_argument("--batch-size", type=int, default=500, help="Events archived per transaction.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many events would be archived.")
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options["days"])
+        if options["dry_run"]:
+            count = pending_archive_count(cutoff)
+            self.stdout.write(f"{count} events dated before {cutoff} would be archived.")
+            return
+
+        totals = archive_events(cutoff=cutoff, batch_size=options["batch_size"], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {totals['events']} events dated before {cutoff} "
+            f"({totals['participations']} participations, {totals['feedback']} feedback)."
+        ))
@@ -0,0 +1,110 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+# Runs inside a fresh interpreter so "cold" really means a new process:
+# import + django.setup() + first request, then N warm requests.
+CHILD_SCRIPT = r"""
+import json, os, statistics, sys, time
+t0 = time.perf_counter()
+import django
+django.setup()
+t_setup = time.perf_counter() - t0
+
+from django.test import Client
+client = Client(HTTP_HOST="localhost")
+path, runs = sys.argv[1], int(sys.argv[2])
+
+t1 = time.perf_counter()
+first = client.get(path)
+t_first = time.perf_counter() - t1
+
+samples = []
+for _ in range(runs):
+    t = time.perf_counter()
+    client.get(path)
+    samples.append(time.perf_counter() - t)
+samples.sort()
+
+print(json.dumps({
+    "status": first.status_code,
+    "setup_ms": t_setup * 1000,
+    "first_request_ms": t_first * 1000,
+    "mean_ms": statistics.mean(samples) * 1000,
+    "p50_ms": samples[len(samples) // 2] * 1000,
+    "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+}))
+"""
+
+PROFILES = {
+    "dev": "community_events.settings",
+    "prod": "community_events.settings_prod",
+}
+
+
+class Command(BaseCommand):
+    help = "Compare cold-start and steady-state request overhead of the dev and prod settings profiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/", help="URL to request (default: the login page).")
+        parser.add_argument("--runs", type=int, default=200, help="Warm requests per process.")
+        parser.add_argument("--repeat", type=int, default=3, help="Fresh processes per profile.")
+
+    def handle(self, *args, **options):
+        base_dir = str(settings.BASE_DIR)
+
+        with tempfile.TemporaryDirectory() as static_root:
+            env = {
+                **os.environ,
+                "DJANGO_SECRET_KEY": os.environ.get("DJANGO_SECRET_KEY", "benchmark-only-secret-key"),
+                "DJANGO_ALLOWED_HOSTS": "localhost",
+                "DJANGO_STATIC_ROOT": static_root,
+                "DJANGO_CACHE_LOCATION": os.path.join(static_root, "cache"),
+            }
+
+            # Hashed static storage needs a manifest before templates can render
+            self._run(base_dir, env, PROFILES["prod"], [
+                sys.executable, "manage.py", "collectstatic", "--noinput", "-v", "0",
+            ])
+
+            results = {}
+            for name, module in PROFILES.items():
+                runs = [
+                    json.loads(self._run(base_dir, env, module, [
+                        sys.executable, "-c", CHILD_SCRIPT, options["path"], str(options["runs"]),
+                    ]))
+                    for _ in range(options["repeat"])
+                ]
+                results[name] = {
+                    key: sum(r[key] for r in runs) / len(runs)
+                    for key in runs[0] if key != "status"
+                }
+                results[name]["status"] = runs[0]["status"]
+
+        header = f"{'profile':<8}{'status':>7}{'setup':>10}{'first req':>11}{'mean':>9}{'p50':>9}{'p95':>9}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for name, r in results.items():
+            self.stdout.write(
+                f"{name:<8}{r['status']:>7}{r['setup_ms']:>8.1f}ms{r['first_request_ms']:>9.1f}ms"
+                f"{r['mean_ms']:>7.2f}ms{r['p50_ms']:>7.2f}ms{r['p95_ms']:>7.2f}ms"
+            )
+
+    def _run(self, cwd, env, settings_module, cmd):
+        proc = subprocess.run(
+            cmd,
+            cwd=cwd,
+            env={**env, "DJANGO_SETTINGS_MODULE": settings_module},
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            self.stderr.write(proc.stderr)
+            raise SystemExit(proc.returncode)
+        return proc.stdout.strip().splitlines()[-1] if proc.stdout.strip() else ""
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from events.mediafiles import BATCH_SIZE, collect_garbage
+
+
+class Command(BaseCommand):
+    help = "Delete uploaded image files no event, recurring event or archived event refers to."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report the orphaned files, delete nothing.")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Files checked per reference query.")
+        parser.add_argument(
+            "--grace", type=int, default=None,
+            help="Keep files modified in the last N seconds (default MEDIA_GC_GRACE).",
+        )
+
+    def handle(self, *args, **options):
+        report = collect_garbage(
+            batch_size=max(options["batch_size"], 1),
+            grace=options["grace"],
+            dry_run=options["dry_run"],
+        )
+        verb = "would be" if options["dry_run"] else "were"
+        count = report["orphaned"] if options["dry_run"] else report["deleted"]
+        if report["orphaned"] != report["deleted"] and not options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"{report['orphaned'] - report['deleted']} files could not be removed."))
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {report['scanned']} files: {report['referenced']} in use, {report['recent']} too recent to judge; "
+            f"{count} orphaned files {verb} removed ({report['bytes'] / (1024 * 1024):.1f} MB)."
+        ))
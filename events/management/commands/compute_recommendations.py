@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.recommendations import TOP_K, compute_recommendations, stale_user_ids
+
+
+class Command(BaseCommand):
+    help = "Precompute \"events you may like\" for attendees from participations and feedback."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only rebuild users whose participations or feedback changed since the last run.",
+        )
+        parser.add_argument("--top-k", type=int, default=TOP_K, help="Recommendations stored per user.")
+        parser.add_argument("--batch-size", type=int, default=2000, help="Users scored per batch.")
+        parser.add_argument("--item-block", type=int, default=2048, help="Events per similarity block.")
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options["incremental"]:
+            user_ids = stale_user_ids()
+            if not user_ids:
+                self.stdout.write("No users need refreshing.")
+                return
+
+        started = time.perf_counter()
+        count = compute_recommendations(
+            user_ids=user_ids,
+            top_k=options["top_k"],
+            batch_size=options["batch_size"],
+            item_block=options["item_block"],
+            stdout=self.stdout if options["verbosity"] > 1 else None,
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Recommendations rebuilt for {count} users in {elapsed:.1f}s."))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.notifications import dispatch, outbox_backlog
+
+
+class Command(BaseCommand):
+    help = "Send pending event notifications from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=100, help="Outbox messages handled per run.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Emails sent per chunk over one connection.")
+        parser.add_argument("--loop", action="store_true", help="Keep running, polling the outbox.")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            stats = dispatch(limit=options["limit"], batch_size=options["batch_size"])
+            handled = stats["messages_sent"] + stats["messages_retrying"] + stats["messages_failed"]
+            if handled or not options["loop"]:
+                backlog = outbox_backlog()
+                self.stdout.write(
+                    f"{stats['messages_sent']} sent, {stats['messages_retrying']} retrying, "
+                    f"{stats['messages_failed']} failed | {stats['emails_sent']} emails "
+                    f"({stats['emails_per_second']}/s), {stats['duplicates_skipped']} already delivered, "
+                    f"{stats['no_email']} without email | backlog {backlog['pending']} "
+                    f"(oldest {backlog['oldest_pending_seconds']}s), {backlog['failed']} failed total"
+                )
+            if not options["loop"]:
+                return
+            # Drain a backlog straight away; only wait once caught up
+            if not handled:
+                time.sleep(options["interval"])
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from events.geo import geocode_events
+
+
+class Command(BaseCommand):
+    help = "Geocode event locations against the bundled gazetteer and fill in the grid index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Geocode every event again, e.g. after updating the gazetteer.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Events updated per query.")
+
+    def handle(self, *args, **options):
+        totals = geocode_events(everything=options["all"], batch_size=options["batch_size"], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f"Geocoded {totals['events']} events: {totals['matched']} matched, "
+            f"{totals['unmatched']} locations not found in the gazetteer."
+        ))
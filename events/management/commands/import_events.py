@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from events.imports import CHUNK_SIZE, detect_format, import_events
+
+
+class Command(BaseCommand):
+    help = "Import events from a CSV or iCalendar file as pending events of one organizer."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or .ics file to import.")
+        parser.add_argument("--organizer", required=True, help="Username of the organizer the events belong to.")
+        parser.add_argument("--format", choices=["csv", "ics"], help="File format (default: from the file extension).")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows validated and inserted per transaction.")
+        parser.add_argument("--dry-run", action="store_true", help="Validate the file without importing anything.")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            organizer = User.objects.get(username=options["organizer"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['organizer']!r}.")
+
+        try:
+            f = open(options["path"], "rb")
+        except OSError as exc:
+            raise CommandError(str(exc))
+        with f:
+            report = import_events(
+                f,
+                organizer,
+                file_format=options["format"] or detect_format(options["path"]),
+                chunk_size=options["chunk_size"],
+                dry_run=options["dry_run"],
+            )
+
+        for failure in report["errors"]:
+            self.stdout.write(f"  line {failure['line']}: {'; '.join(failure['errors'])}")
+        if report["errors_truncated"]:
+            self.stdout.write(f"  … only the first {len(report['errors'])} failed rows are listed")
+        if report["error"]:
+            self.stderr.write(report["error"])
+
+        verb = "would be imported" if options["dry_run"] else "imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['rows']} rows read in {report['seconds']}s: {report['created']} {verb}, {report['failed']} failed."
+        ))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.prerender import change_token, prerender, prerender_setting
+
+
+class Command(BaseCommand):
+    help = "Write static HTML and JSON snapshots of the public event catalogue, rewriting only pages that changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Rewrite every page, changed or not.")
+        parser.add_argument("--loop", action="store_true", help="Keep running, re-rendering after each change.")
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds between change checks with --loop.")
+
+    def handle(self, *args, **options):
+        full = options["all"]
+        last_token, last_run = None, 0.0
+        while True:
+            # Read before rendering, so changes made during a run trigger the next one
+            token = change_token()
+            due = time.monotonic() - last_run >= prerender_setting("PRERENDER_CHECK_INTERVAL")
+            if token != last_token or due:
+                report = prerender(full=full)
+                if report is None:
+                    self.stdout.write(self.style.WARNING("Another prerender run is in progress."))
+                else:
+                    full, last_token, last_run = False, token, time.monotonic()
+                    written = report["events_written"] + report["pages_written"]
+                    removed = report["events_removed"] + report["pages_removed"]
+                    if written or removed or not options["loop"]:
+                        self.stdout.write(
+                            f"{report['events_written']} event and {report['pages_written']} catalogue pages written, "
+                            f"{removed} removed, {report['unchanged']} unchanged in {report['seconds']}s"
+                        )
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.deletion import BATCH_SIZE, deletion_backlog, purge
+
+
+class Command(BaseCommand):
+    help = "Purge deleted events, recurring events and users, with everything that depends on them, in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=10, help="Deletion jobs handled per run.")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows deleted per transaction.")
+        parser.add_argument("--loop", action="store_true", help="Keep running, polling for new deletions.")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            stats = purge(limit=options["limit"], batch_size=options["batch_size"], stdout=self.stdout)
+            handled = stats["jobs_done"] + stats["jobs_retrying"] + stats["jobs_failed"]
+            if handled or not options["loop"]:
+                backlog = deletion_backlog()
+                self.stdout.write(self.style.SUCCESS(
+                    f"{stats['jobs_done']} purged, {stats['jobs_retrying']} retrying, "
+                    f"{stats['jobs_failed']} failed | {stats['rows']} rows removed | "
+                    f"backlog {backlog['pending']}, {backlog['failed']} failed total"
+                ))
+            if not options["loop"]:
+                return
+            if not handled:
+                time.sleep(options["interval"])
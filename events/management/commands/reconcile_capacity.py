@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from events.capacity import reconcile_capacities
+
+
+class Command(BaseCommand):
+    help = "Recount every event's cached participant count and fix full/approved statuses that disagree with it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report the drift, change nothing.")
+        parser.add_argument("--show", type=int, default=20, help="Drifted events listed in the report.")
+
+    def handle(self, *args, **options):
+        report = reconcile_capacities(dry_run=options["dry_run"])
+        for row in report["rows"][:options["show"]]:
+            status = row["status"] if row["new_status"] == row["status"] else f"{row['status']} -> {row['new_status']}"
+            self.stdout.write(
+                f"  #{row['event_id']} {row['title']}: cached {row['cached']}, actual {row['actual']} "
+                f"of {row['max_participants']} ({status})"
+            )
+        if len(report["rows"]) > options["show"]:
+            self.stdout.write(f"  ... and {len(report['rows']) - options['show']} more")
+        if report["missing_capacity"]:
+            self.stdout.write(self.style.WARNING(f"{report['missing_capacity']} open events have no capacity row."))
+
+        verb = "would be" if options["dry_run"] else "were"
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {report['checked']} capacities: {report['drifted']} drifted by {report['total_drift']} seats in total; "
+            f"{report['filled']} events {verb} marked full and {report['reopened']} reopened."
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from events.rollups import update_rollups
+
+
+class Command(BaseCommand):
+    help = "Fold new participations and feedback into the hourly/daily analytics rollups."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=10_000, help="Rows folded per transaction.")
+
+    def handle(self, *args, **options):
+        processed = update_rollups(chunk_size=options["chunk_size"])
+        summary = ", ".join(f"{count} {source}" for source, count in processed.items())
+        self.stdout.write(self.style.SUCCESS(f"Rollups updated: {summary}."))
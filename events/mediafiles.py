@@ -0,0 +1,148 @@
+"""
+Removing image files nothing refers to.
+
+With content-addressed storage (community_events.storage) one file can be
+the image of any number of events, series dates and archived events, so a
+file may only go once its reference count, the rows of those three tables
+naming it, is zero:
+
+- release() runs after a commit that dropped references, e.g. an event's
+  image being replaced, and deletes the files left unreferenced;
+- collect_garbage() walks the upload directories and deletes every
+  unreferenced file, counting references for BATCH_SIZE files per query.
+  It picks up what nothing released: files of rows deleted in the Django
+  admin, uploads whose form failed, files from before content addressing.
+
+A new upload of content that is already stored reuses the file and only
+touches its mtime, and the row referring to it may not be committed yet.
+Files modified within MEDIA_GC_GRACE seconds are therefore never deleted.
+"""
+
+import logging
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import ArchivedEvent, Event, EventSeries
+
+
+logger = logging.getLogger(__name__)
+
+# Directories upload_to writes to
+UPLOAD_DIRECTORIES = ("events/images",)
+BATCH_SIZE = 500
+
+
+def mediafiles_setting(name):
+    defaults = {
+        "MEDIA_GC_GRACE": 60 * 60,
+    }
+    return getattr(settings, name, defaults[name])
+
+
+def referring_querysets():
+    return (Event.all_objects.all(), EventSeries.all_objects.all(), ArchivedEvent.objects.all())
+
+
+def reference_counts(names):
+    """{name: rows referring to it} for the names among ``names`` that are referred to."""
+    counts = {}
+    for queryset in referring_querysets():
+        rows = queryset.filter(image__in=names).order_by().values("image").annotate(n=Count("pk"))
+        for row in rows:
+            counts[row["image"]] = counts.get(row["image"], 0) + row["n"]
+    return counts
+
+
+def recently_used(name, grace):
+    try:
+        modified = default_storage.get_modified_time(name)
+    except OSError:
+        # Gone already
+        return False
+    if timezone.is_naive(modified):
+        modified = timezone.make_aware(modified)
+    return modified > timezone.now() - timedelta(seconds=grace)
+
+
+def unused(names, grace=None):
+    """The names among ``names`` nothing refers to and no upload reused within ``grace`` seconds."""
+    names = sorted(set(filter(None, names)))
+    if not names:
+        return []
+    grace = mediafiles_setting("MEDIA_GC_GRACE") if grace is None else grace
+    counts = reference_counts(names)
+    return [name for name in names if not counts.get(name) and not recently_used(name, grace)]
+
+
+def delete_file(name):
+    """Delete ``name``; returns its size, or None when it couldn't be removed."""
+    try:
+        size = default_storage.size(name)
+        default_storage.delete(name)
+    except OSError as exc:
+        logger.warning("Could not remove %s: %s", name, exc)
+        return None
+    return size
+
+
+def release(names):
+    """Delete the files among ``names`` nothing refers to any more, once the transaction commits."""
+    names = [name for name in names if name]
+    if not names:
+        return
+
+    def run():
+        for name in unused(names):
+            delete_file(name)
+
+    transaction.on_commit(run)
+
+
+def stored_files(directory):
+    """Names of every file under ``directory``, depth first."""
+    try:
+        directories, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for filename in sorted(files):
+        yield f"{directory}/{filename}"
+    for subdirectory in sorted(directories):
+        yield from stored_files(f"{directory}/{subdirectory}")
+
+
+def collect_garbage(batch_size=BATCH_SIZE, grace=None, dry_run=False):
+    """
+    Delete unreferenced files under UPLOAD_DIRECTORIES. Returns a report:
+    scanned, referenced, recent (unreferenced but inside the grace
+    period), orphaned, deleted and bytes freed. With ``dry_run`` nothing is
+    deleted and bytes is what would be freed.
+    """
+    grace = mediafiles_setting("MEDIA_GC_GRACE") if grace is None else grace
+    report = {"scanned": 0, "referenced": 0, "recent": 0, "orphaned": 0, "deleted": 0, "bytes": 0}
+    for directory in UPLOAD_DIRECTORIES:
+        names = stored_files(directory)
+        while batch := list(islice(names, batch_size)):
+            counts = reference_counts(batch)
+            report["scanned"] += len(batch)
+            for name in batch:
+                if counts.get(name):
+                    report["referenced"] += 1
+                    continue
+                if recently_used(name, grace):
+                    report["recent"] += 1
+                    continue
+                report["orphaned"] += 1
+                if dry_run:
+                    report["bytes"] += default_storage.size(name)
+                    continue
+                size = delete_file(name)
+                if size is not None:
+                    report["deleted"] += 1
+                    report["bytes"] += size
+    return report
@@ -1,8 +1,17 @@
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 import uuid
 import os
 
+class LiveManager(models.Manager):
+    """Leaves out rows tombstoned for deletion (see events.deletion)."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+# ContentAddressedStorage then names the file after its content
 def event_image_upload_path(instance, filename):
     ext = filename.split('.')[-1]
     new_filename = f"{uuid.uuid4().hex}.{ext}"
@@ -33,7 +42,103 @@ class Event(models.Model):
         null=True,
         blank=True,
     )
-    
+
+    # Filled in from the gazetteer by events.geo; geo_cell is the grid index
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    geo_cell = models.BigIntegerField(null=True, blank=True, editable=False, db_index=True)
+    geocoded_location = models.CharField(max_length=200, blank=True, default="", editable=False)
+    # Normalised location for venue clash lookups, see events.schedule
+    venue_key = models.CharField(max_length=200, blank=True, default="", editable=False)
+
+    # Set when this row is a materialized occurrence of a recurring series
+    series = models.ForeignKey(
+        "EventSeries",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="occurrences",
+    )
+    occurrence_date = models.DateField(null=True, blank=True)
+
+    # Set on delete; the row and everything hanging off it are purged later
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["series", "occurrence_date"],
+                condition=models.Q(series__isnull=False),
+                name="unique_series_occurrence",
+            ),
+        ]
+        indexes = [
+            # Interval lookups for schedule conflicts: venue + day, then start time
+            models.Index(fields=["venue_key", "date", "start_time"], name="event_venue_slot_idx"),
+            # Archival picks everything before the retention horizon
+            models.Index(fields=["date"]),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class EventSeries(models.Model):
+    """
+    A recurring event, e.g. a weekly meetup. Occurrences are computed from
+    the rule when a date range is listed (see events.recurrence); an Event
+    row is only created for one when someone joins it or the organizer
+    edits it.
+    """
+    FREQ_CHOICES = [
+        ("daily", "Daily"),
+        ("weekly", "Weekly"),
+        ("monthly", "Monthly"),
+    ]
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("approved", "Approved"),
+        ("declined", "Declined"),
+    ]
+    title = models.CharField(max_length=200)
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    location = models.CharField(max_length=200, blank=True)
+    short_description = models.TextField(blank=True)
+    organizer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="event_series",
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    image = models.ImageField(upload_to=event_image_upload_path, null=True, blank=True)
+    max_participants = models.PositiveIntegerField(default=1)
+
+    # The rule, RRULE-style: FREQ, INTERVAL, BYDAY (weekly only), UNTIL, COUNT
+    freq = models.CharField(max_length=10, choices=FREQ_CHOICES, default="weekly")
+    interval = models.PositiveSmallIntegerField(default=1)
+    weekdays = models.CharField(max_length=13, blank=True, help_text="Weekday numbers, Monday = 0, comma separated.")
+    starts_on = models.DateField()
+    until = models.DateField(null=True, blank=True)
+    count = models.PositiveIntegerField(null=True, blank=True)
+    cancelled_dates = models.JSONField(default=list, blank=True)
+    # Date of the final occurrence, derived from until/count; null means open-ended
+    last_date = models.DateField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            # Window lookups: approved series overlapping [start, end]
+            models.Index(fields=["status", "starts_on", "last_date"]),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -97,3 +202,345 @@ class EventCapacity(models.Model):
         self.current_participants = self.event.participants.count()
         self.save()
 
+
+
+class CheckIn(models.Model):
+    """
+    An attendee let in at the door, recorded from a signed ticket (see
+    events.tickets). Keyed by the participation's id rather than a foreign
+    key so participations can still be deleted in bulk.
+    """
+    SOURCE_CHOICES = [
+        ("online", "Scanned online"),
+        ("offline", "Synced from an offline scanner"),
+    ]
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="check_ins")
+    participation_id = models.BigIntegerField()
+    checked_in_at = models.DateTimeField()
+    scanned_by_id = models.BigIntegerField(null=True, blank=True)
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default="online")
+    recorded_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("event", "participation_id")
+
+    def __str__(self):
+        return f"{self.event_id}/{self.participation_id} @ {self.checked_in_at:%Y-%m-%d %H:%M}"
+
+
+class RevokedTicket(models.Model):
+    """The ticket of a cancelled registration. Scanners download these per event."""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="revoked_tickets")
+    participation_id = models.BigIntegerField()
+    revoked_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("event", "participation_id")
+
+    def __str__(self):
+        return f"{self.event_id}/{self.participation_id}"
+
+
+class EventRecommendation(models.Model):
+    """
+    Precomputed "events you may like" for a user, written by the
+    compute_recommendations command. Lower rank = better match.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="event_recommendations",
+    )
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="recommendations")
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+    computed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("user", "event")
+        ordering = ["rank"]
+        indexes = [models.Index(fields=["user", "rank"])]
+
+    def __str__(self):
+        return f"{self.user.username} #{self.rank} → {self.event.title}"
+
+
+class RecommendationRefresh(models.Model):
+    """Users whose participations or feedback changed since their recommendations were built."""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="+",
+    )
+    requested_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.requested_at}"
+
+
+class ActivityRollup(models.Model):
+    """Joins and feedback counted per time bucket. Filled by the update_rollups command."""
+    GRANULARITY_CHOICES = [
+        ("hour", "Hourly"),
+        ("day", "Daily"),
+    ]
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()
+    joins = models.PositiveIntegerField(default=0)
+    feedback_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+        ordering = ["bucket"]
+
+    @property
+    def avg_rating(self):
+        if not self.feedback_count:
+            return None
+        return round(self.rating_sum / self.feedback_count, 2)
+
+
+class EventActivityRollup(ActivityRollup):
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="activity_rollups")
+
+    class Meta(ActivityRollup.Meta):
+        unique_together = ("event", "granularity", "bucket")
+
+    def __str__(self):
+        return f"{self.event.title} {self.granularity} {self.bucket:%Y-%m-%d %H:%M}"
+
+
+class OrganizerActivityRollup(ActivityRollup):
+    organizer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="activity_rollups",
+    )
+
+    class Meta(ActivityRollup.Meta):
+        unique_together = ("organizer", "granularity", "bucket")
+
+    def __str__(self):
+        return f"{self.organizer.username} {self.granularity} {self.bucket:%Y-%m-%d %H:%M}"
+
+
+class RollupWatermark(models.Model):
+    """Highest Participation/Feedback id already folded into the rollups."""
+    source = models.CharField(max_length=50, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} @ {self.last_id}"
+
+
+class OutboxMessage(models.Model):
+    """
+    One row per notifiable change, written in the same transaction as the
+    change itself. The dispatch_notifications command turns it into emails.
+    """
+    KIND_CHOICES = [
+        ("event_approved", "Event approved"),
+        ("event_declined", "Event declined"),
+        ("event_deleted", "Event deleted"),
+        ("participant_joined", "Participant joined"),
+        ("participant_left", "Participant left"),
+    ]
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    ]
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    # Plain id: the event may be gone by the time the message is sent
+    event_id = models.BigIntegerField()
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(auto_now_add=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.kind} #{self.event_id} ({self.status})"
+
+
+class NotificationDelivery(models.Model):
+    """A recipient who already got a given outbox message, so retries never resend."""
+    message = models.ForeignKey(OutboxMessage, on_delete=models.CASCADE, related_name="deliveries")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("message", "user")
+
+    def __str__(self):
+        return f"{self.message_id} → {self.user_id}"
+
+
+class ArchivedEvent(models.Model):
+    """
+    An event past the retention horizon, moved out of Event by the
+    archive_events command together with its capacity. Keeps its old id.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=200)
+    date = models.DateField(null=True, blank=True)
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    location = models.CharField(max_length=200, blank=True)
+    short_description = models.TextField(blank=True)
+    organizer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_events",
+    )
+    status = models.CharField(max_length=20, choices=Event.STATUS_CHOICES)
+    image = models.ImageField(upload_to=event_image_upload_path, null=True, blank=True)
+    max_participants = models.PositiveIntegerField(null=True, blank=True)
+    participant_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-date", "-id"]
+        indexes = [
+            models.Index(fields=["organizer", "-date"]),
+            models.Index(fields=["-date", "-id"]),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedParticipation(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="archived_participations")
+    event = models.ForeignKey(ArchivedEvent, on_delete=models.CASCADE, related_name="participants")
+    joined_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("user", "event")
+
+    def __str__(self):
+        return f"{self.user.username} → {self.event.title}"
+
+
+class ArchivedFeedback(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    event = models.ForeignKey(ArchivedEvent, on_delete=models.CASCADE, related_name="feedbacks")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    rating = models.IntegerField(choices=Feedback.RATING_CHOICES)
+    comment = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.event.title} - {self.user.username} ({self.rating}★)"
+
+
+class AuditEntry(models.Model):
+    """
+    Append-only record of an admin or organizer action, written in batches
+    by events.audit. Actor and target are plain ids so entries outlive the
+    users and events they mention.
+    """
+    ACTION_CHOICES = [
+        ("event.approve", "Approved event"),
+        ("event.decline", "Declined event"),
+        ("event.update", "Updated event"),
+        ("event.delete", "Deleted event"),
+        ("series.approve", "Approved recurring event"),
+        ("series.decline", "Declined recurring event"),
+        ("user.update", "Updated user"),
+        ("user.delete", "Deleted user"),
+    ]
+    created_at = models.DateTimeField()
+    actor_id = models.BigIntegerField(null=True, blank=True)
+    actor_username = models.CharField(max_length=150, blank=True)
+    action = models.CharField(max_length=30, choices=ACTION_CHOICES)
+    target_type = models.CharField(max_length=20)
+    target_id = models.BigIntegerField()
+    target_repr = models.CharField(max_length=200, blank=True)
+    changes = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["-created_at", "-id"]),
+            models.Index(fields=["actor_id", "-created_at"]),
+            models.Index(fields=["target_type", "target_id", "-created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.created_at:%Y-%m-%d %H:%M} {self.actor_username} {self.action} {self.target_type}#{self.target_id}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Audit entries are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Audit entries are append-only.")
+
+
+class DeletionJob(models.Model):
+    """
+    An event, series or user that has been tombstoned and is waiting for
+    the purge_deletions command to remove it and everything that depends
+    on it, a batch at a time.
+    """
+    KIND_CHOICES = [
+        ("event", "Event"),
+        ("series", "Recurring event"),
+        ("user", "User"),
+    ]
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Plain id: the object is gone once the job is done
+    object_id = models.BigIntegerField()
+    object_repr = models.CharField(max_length=200, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    # Rows to remove, counted when the purge starts, and rows removed so far
+    total = models.PositiveIntegerField(null=True, blank=True)
+    progress = models.JSONField(default=dict, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(auto_now_add=True)
+    last_error = models.TextField(blank=True)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} ({self.status})"
+
+    @property
+    def removed(self):
+        """Rows removed so far; image files are reported but not counted."""
+        return sum(count for label, count in self.progress.items() if label != "files")
+
+    @property
+    def percent(self):
+        if self.status == "done":
+            return 100
+        if not self.total:
+            return 0
+        return min(99, self.removed * 100 // self.total)
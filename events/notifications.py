@@ -0,0 +1,198 @@
+"""
+Email notifications through a transactional outbox.
+
+Views call enqueue() inside the same transaction as the change they make,
+so a notification exists if and only if the change was committed. The
+dispatch_notifications command then works through pending OutboxMessage
+rows:
+
+- recipients are resolved and sent in chunks of ``batch_size`` over one
+  reused mail connection (console or file backend locally, SMTP in prod);
+- every recipient that got a message is recorded in NotificationDelivery,
+  so a retry only goes to the people who haven't had it yet;
+- failures back off exponentially and give up after MAX_ATTEMPTS.
+
+Delivery is at-least-once: a crash between sending a chunk and recording
+it can resend that one chunk.
+"""
+
+import logging
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import NotificationDelivery, OutboxMessage, Participation
+
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 60 * 60
+
+SUBJECTS = {
+    "event_approved": "Event approved: {title}",
+    "event_declined": "Event declined: {title}",
+    "event_deleted": "Event cancelled: {title}",
+    "participant_joined": "New registration for {title}",
+    "participant_left": "Registration cancelled for {title}",
+}
+
+BODIES = {
+    "event_approved": "“{title}” on {date} at {location} has been approved and is now open for registration.",
+    "event_declined": "“{title}” on {date} has been declined by an administrator.",
+    "event_deleted": "“{title}” on {date} has been cancelled by the organizer. Your registration has been removed.",
+    "participant_joined": "{attendee} registered for “{title}” on {date}.",
+    "participant_left": "{attendee} cancelled their registration for “{title}” on {date}.",
+}
+
+
+def enqueue(kind, event, **extra):
+    """
+    Record a notification for ``event``. Call it inside the transaction
+    that makes the change; nothing is sent from the request itself.
+    """
+    payload = {
+        "title": event.title,
+        "date": event.date.isoformat() if event.date else "",
+        "location": event.location,
+        "organizer_id": event.organizer_id,
+        **extra,
+    }
+    return OutboxMessage.objects.create(kind=kind, event_id=event.pk, payload=payload)
+
+
+def recipient_ids(message):
+    """User ids a message goes to, without duplicates, in a stable order."""
+    payload = message.payload
+    if message.kind in ("participant_joined", "participant_left"):
+        ids = [payload["organizer_id"]]
+    elif message.kind == "event_deleted":
+        # Participations are gone with the event, so they were saved at delete time
+        ids = payload.get("recipients", [])
+    else:
+        ids = [payload["organizer_id"]]
+        ids += Participation.objects.filter(event_id=message.event_id).order_by("user_id").values_list("user_id", flat=True)
+    return list(dict.fromkeys(ids))
+
+
+def build_email(message, user, connection):
+    payload = message.payload
+    context = {
+        "title": payload.get("title", ""),
+        "date": payload.get("date") or "a date to be announced",
+        "location": payload.get("location") or "a location to be announced",
+        "attendee": payload.get("attendee", ""),
+    }
+    name = user.first_name or user.username
+    body = f"Hi {name},\n\n{BODIES[message.kind].format(**context)}\n\n— BIG-IN Community Events"
+    return EmailMessage(
+        subject=SUBJECTS[message.kind].format(**context),
+        body=body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email],
+        connection=connection,
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter so failed messages don't retry in lockstep."""
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def deliver(message, connection, batch_size, stats):
+    """Send ``message`` to everyone who hasn't had it yet."""
+    User = get_user_model()
+    already = set(message.deliveries.values_list("user_id", flat=True))
+    stats["duplicates_skipped"] += len(already)
+    pending = [user_id for user_id in recipient_ids(message) if user_id not in already]
+
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        users = list(User.objects.filter(id__in=chunk).only("id", "email", "first_name", "username"))
+        with_email = [u for u in users if u.email]
+        stats["no_email"] += len(users) - len(with_email)
+
+        if with_email:
+            connection.send_messages([build_email(message, u, connection) for u in with_email])
+        NotificationDelivery.objects.bulk_create(
+            [NotificationDelivery(message=message, user=u) for u in users],
+            ignore_conflicts=True,
+        )
+        stats["emails_sent"] += len(with_email)
+
+
+def dispatch(limit=100, batch_size=500):
+    """
+    Deliver up to ``limit`` due outbox messages. Returns counters including
+    emails per second for the run.
+    """
+    stats = dict.fromkeys(
+        ("messages_sent", "messages_retrying", "messages_failed", "emails_sent", "duplicates_skipped", "no_email"),
+        0,
+    )
+    started = time.monotonic()
+
+    messages = list(
+        OutboxMessage.objects
+        .filter(status="pending", next_attempt_at__lte=timezone.now())
+        .order_by("id")[:limit]
+    )
+    if messages:
+        connection = get_connection(fail_silently=False)
+        connection.open()
+        try:
+            for message in messages:
+                try:
+                    deliver(message, connection, batch_size, stats)
+                except Exception as exc:
+                    logger.warning("Outbox message %s failed: %s", message.pk, exc)
+                    record_failure(message, exc, stats)
+                    # The connection may be in a bad state after an error
+                    connection.close()
+                    try:
+                        connection.open()
+                    except Exception as exc:
+                        logger.warning("Mail server unavailable, stopping this run: %s", exc)
+                        break
+                else:
+                    message.status = "sent"
+                    message.sent_at = timezone.now()
+                    message.save(update_fields=["status", "sent_at"])
+                    stats["messages_sent"] += 1
+        finally:
+            connection.close()
+
+    elapsed = time.monotonic() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["emails_per_second"] = round(stats["emails_sent"] / elapsed, 1) if elapsed else 0.0
+    return stats
+
+
+def record_failure(message, exc, stats):
+    message.attempts += 1
+    message.last_error = f"{type(exc).__name__}: {exc}"
+    if message.attempts >= MAX_ATTEMPTS:
+        message.status = "failed"
+        stats["messages_failed"] += 1
+    else:
+        message.next_attempt_at = timezone.now() + retry_delay(message.attempts)
+        stats["messages_retrying"] += 1
+    message.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+
+
+def outbox_backlog():
+    """Pending messages and the age of the oldest one, for monitoring."""
+    pending = OutboxMessage.objects.filter(status="pending")
+    oldest = pending.order_by("id").values_list("created_at", flat=True).first()
+    return {
+        "pending": pending.count(),
+        "failed": OutboxMessage.objects.filter(status="failed").count(),
+        "oldest_pending_seconds": round((timezone.now() - oldest).total_seconds()) if oldest else 0,
+    }
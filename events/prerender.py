@@ -0,0 +1,382 @@
+"""
+Static snapshots of the public event catalogue.
+
+The catalogue (upcoming approved and full events, PRERENDER_PAGE_SIZE per
+page) and the page of every approved or full event are the same for every
+visitor, so prerender() writes each of them to PRERENDER_ROOT as HTML and
+JSON, laid out like their URLs:
+
+    catalogue/index.html, catalogue/index.json        page 1
+    catalogue/page/2/index.html, …/index.json        further pages
+    catalogue/42/index.html, catalogue/42/index.json  event 42
+
+A front-end server can serve that directory directly (falling back to
+Django for a missing file), and the catalogue views serve it otherwise.
+What differs per visitor, whether they are signed in and which of the
+events shown they joined, comes from catalogue_state, which the pages
+fetch to fill in their join and feedback buttons.
+
+Only pages whose content changed are written. One query reads every
+published event with its capacity, organizer and rating, and each event
+gets a fingerprint of that data. A catalogue page's fingerprint covers the
+fingerprints of its events, so editing an event rewrites its own page and
+the catalogue page showing it, while adding, removing or re-dating one
+rewrites the catalogue pages whose contents shifted. The fingerprints of
+the last run are kept in manifest.json. A change to the templates changes
+every fingerprint.
+
+The prerender_events command runs it. With --loop, it waits for the view
+cache tags (events.caching) that Event, capacity, participation and
+feedback changes bump, and checks anyway every PRERENDER_CHECK_INTERVAL
+seconds for changes that bump none (organizer names, say). The tags and
+the run lock live in the cache, so the worker and the web server must
+share one (not the per-process LocMemCache); otherwise only the periodic
+check picks up changes.
+
+An event that is deleted or leaves PUBLISHED_STATUSES does not wait for
+the next run: withdraw() removes its page when the change commits.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import date, time as clock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Avg, Count
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.template.loader import get_template, render_to_string
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.utils.http import http_date
+
+from community_events.media import not_modified
+
+from .caching import tag_versions
+from .models import Event, EventSeries, Feedback
+from .recurrence import describe
+
+
+PUBLISHED_STATUSES = ("approved", "full")
+# View cache tags bumped by every change that shows on the pages
+CHANGE_TAGS = ("events", "capacity", "participations", "feedback")
+LOCK_KEY = "prerender:lock"
+CATALOGUE_TEMPLATE = "events/prerendered/catalogue.html"
+EVENT_TEMPLATE = "events/prerendered/event.html"
+BASE_TEMPLATE = "events/prerendered/base.html"
+# Per-event links, reversed once per run rather than three times per event
+EVENT_URLS = {
+    "url": "events:catalogue_event",
+    "join_url": "events:attendee_join_event",
+    "feedback_url": "events:feedback_create",
+}
+URL_PLACEHOLDER = 2_147_483_647
+
+
+def prerender_setting(name):
+    defaults = {
+        "PRERENDER_ROOT": os.path.join(settings.BASE_DIR, "prerendered"),
+        "PRERENDER_PAGE_SIZE": 24,
+        "PRERENDER_CHECK_INTERVAL": 10 * 60,
+        "PRERENDER_MAX_AGE": 60,
+        "PRERENDER_LOCK_TIMEOUT": 10 * 60,
+    }
+    return getattr(settings, name, defaults[name])
+
+
+def change_token():
+    """Changes whenever something shown on the pages may have changed."""
+    return tag_versions(CHANGE_TAGS)
+
+
+# Data
+
+def display_name(first, last, username):
+    return f"{first} {last}".strip() or username
+
+
+def url_formats():
+    return {
+        key: reverse(name, args=[URL_PLACEHOLDER]).replace(str(URL_PLACEHOLDER), "{}")
+        for key, name in EVENT_URLS.items()
+    }
+
+
+def event_data(row, ratings, rules, urls):
+    pk = row["id"]
+    limit = row["capacity__max_participants"]
+    joined = row["capacity__current_participants"] or 0
+    rating, reviews = ratings.get(pk, (None, 0))
+    return {
+        "id": pk,
+        "title": row["title"],
+        "date": row["date"],
+        "start_time": row["start_time"],
+        "end_time": row["end_time"],
+        "location": row["location"],
+        "short_description": row["short_description"],
+        "status": row["status"],
+        "image_url": default_storage.url(row["image"]) if row["image"] else None,
+        "organizer": display_name(row["organizer__first_name"], row["organizer__last_name"], row["organizer__username"]),
+        "max_participants": limit,
+        "participants": joined,
+        "capacity_percent": min(100, round(joined * 100 / limit)) if limit else 0,
+        "rating": rating,
+        "reviews": reviews,
+        "series_rule": rules.get(row["series_id"]),
+        **{key: url.format(pk) for key, url in urls.items()},
+    }
+
+
+def published_events(ids=None):
+    """Data of every approved or full event (or of those among ``ids``), soonest first."""
+    events = Event.objects.filter(status__in=PUBLISHED_STATUSES)
+    if ids is not None:
+        events = events.filter(id__in=ids)
+    rows = list(events.order_by("date", "start_time", "id").values(
+        "id", "title", "date", "start_time", "end_time", "location", "short_description", "status", "image",
+        "series_id", "organizer__username", "organizer__first_name", "organizer__last_name",
+        "capacity__max_participants", "capacity__current_participants",
+    ))
+
+    feedback = Feedback.objects.filter(event__in=events).order_by().values("event_id")
+    ratings = {
+        r["event_id"]: (round(r["avg"], 1), r["n"])
+        for r in feedback.annotate(avg=Avg("rating"), n=Count("id"))
+    }
+    series_ids = {row["series_id"] for row in rows if row["series_id"]}
+    rules = {series.pk: describe(series) for series in EventSeries.objects.filter(pk__in=series_ids)}
+    urls = url_formats()
+    return [event_data(row, ratings, rules, urls) for row in rows]
+
+
+def upcoming(events, today):
+    """The catalogue: ``events`` from ``today`` on, undated ones last."""
+    listed = [e for e in events if e["date"] is None or e["date"] >= today]
+    return sorted(listed, key=lambda e: (
+        e["date"] is None, e["date"] or date.min, e["start_time"] or clock.min, e["id"],
+    ))
+
+
+def paginate(events):
+    size = prerender_setting("PRERENDER_PAGE_SIZE")
+    # An empty catalogue still has its first page
+    return [events[i:i + size] for i in range(0, len(events), size)] or [[]]
+
+
+def fingerprint(*parts):
+    return hashlib.sha1(json.dumps(parts, cls=DjangoJSONEncoder, sort_keys=True).encode()).hexdigest()
+
+
+def templates_digest():
+    """Changes with the templates and whatever the shared layout renders (static file names)."""
+    sources = [get_template(name).template.source for name in (CATALOGUE_TEMPLATE, EVENT_TEMPLATE)]
+    return fingerprint(sources, render_to_string(BASE_TEMPLATE, {}))
+
+
+# Files
+
+def root():
+    return str(prerender_setting("PRERENDER_ROOT"))
+
+
+def event_dir(event_id):
+    return f"catalogue/{event_id}"
+
+
+def page_dir(page):
+    return "catalogue" if page == 1 else f"catalogue/page/{page}"
+
+
+def write_file(path, content):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix=".prerender-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.chmod(temporary, 0o644)
+        # The front-end server never sees half a page
+        os.replace(temporary, path)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write(directory, html, data):
+    base = os.path.join(root(), directory)
+    write_file(os.path.join(base, "index.json"), json.dumps(data, cls=DjangoJSONEncoder))
+    write_file(os.path.join(base, "index.html"), html)
+
+
+def remove_event(event_id):
+    shutil.rmtree(os.path.join(root(), event_dir(event_id)), ignore_errors=True)
+
+
+def withdraw(event_ids):
+    """
+    Remove the pages of events that stopped being published once the
+    transaction commits; respond() would serve them until the next run.
+    """
+    event_ids = set(event_ids)
+    transaction.on_commit(lambda: [remove_event(event_id) for event_id in event_ids])
+
+
+def remove_page(page):
+    base = os.path.join(root(), page_dir(page))
+    for name in ("index.html", "index.json"):
+        try:
+            os.remove(os.path.join(base, name))
+        except FileNotFoundError:
+            pass
+
+
+def written(directory):
+    return os.path.exists(os.path.join(root(), directory, "index.html"))
+
+
+def manifest_path():
+    return os.path.join(root(), "manifest.json")
+
+
+def load_manifest():
+    try:
+        with open(manifest_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# Rendering
+
+def render_event(event):
+    write(event_dir(event["id"]), render_to_string(EVENT_TEMPLATE, {"event": event}), event)
+
+
+def render_page(page, pages):
+    events = pages[page - 1]
+    context = {
+        "events": events,
+        "page": page,
+        "pages": len(pages),
+        "previous_url": reverse_page(page - 1) if page > 1 else None,
+        "next_url": reverse_page(page + 1) if page < len(pages) else None,
+    }
+    write(page_dir(page), render_to_string(CATALOGUE_TEMPLATE, context), context)
+
+
+def reverse_page(page):
+    return reverse("events:catalogue") if page == 1 else reverse("events:catalogue_page", args=[page])
+
+
+def prerender(full=False):
+    """
+    Write the pages that changed since the last run, or every page with
+    ``full``, and remove those of events no longer published. Returns a
+    report (events_written, events_removed, pages_written, pages_removed,
+    unchanged, seconds), or None when another run holds the lock.
+    """
+    if not cache.add(LOCK_KEY, 1, prerender_setting("PRERENDER_LOCK_TIMEOUT")):
+        return None
+    try:
+        return run(full)
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def run(full):
+    started = time.monotonic()
+    digest = templates_digest()
+    previous = {} if full else load_manifest()
+    if previous.get("digest") != digest:
+        previous = {}
+    old_events, old_pages = previous.get("events", {}), previous.get("pages", {})
+    report = {"events_written": 0, "events_removed": 0, "pages_written": 0, "pages_removed": 0, "unchanged": 0}
+
+    events = published_events()
+    event_fingerprints = {}
+    for event in events:
+        key = str(event["id"])
+        event_fingerprints[key] = fingerprint(digest, event)
+        if old_events.get(key) == event_fingerprints[key] and written(event_dir(key)):
+            report["unchanged"] += 1
+            continue
+        render_event(event)
+        report["events_written"] += 1
+    for key in set(old_events) - set(event_fingerprints):
+        remove_event(key)
+        report["events_removed"] += 1
+
+    pages = paginate(upcoming(events, date.today()))
+    page_fingerprints = {}
+    for page, listed in enumerate(pages, start=1):
+        key = str(page)
+        page_fingerprints[key] = fingerprint(digest, page, len(pages), [event_fingerprints[str(e["id"])] for e in listed])
+        if old_pages.get(key) == page_fingerprints[key] and written(page_dir(page)):
+            report["unchanged"] += 1
+            continue
+        render_page(page, pages)
+        report["pages_written"] += 1
+    for key in set(old_pages) - set(page_fingerprints):
+        remove_page(int(key))
+        report["pages_removed"] += 1
+
+    write_file(manifest_path(), json.dumps({"digest": digest, "events": event_fingerprints, "pages": page_fingerprints}))
+    report["seconds"] = round(time.monotonic() - started, 3)
+    return report
+
+
+# Serving
+
+def render_missing(kind, key):
+    """Write a page nothing prerendered yet; False when there is no such page."""
+    if kind == "event":
+        found = published_events(ids=[key])
+        if not found:
+            return False
+        render_event(found[0])
+        return True
+    pages = paginate(upcoming(published_events(), date.today()))
+    if not 1 <= key <= len(pages):
+        return False
+    render_page(key, pages)
+    return True
+
+
+def respond(request, kind, key, as_json=False):
+    """The prerendered ``kind`` ("event" or "page") ``key``, written first if it is missing."""
+    directory = event_dir(key) if kind == "event" else page_dir(key)
+    name = "index.json" if as_json else "index.html"
+    try:
+        path = safe_join(root(), directory, name)
+    except SuspiciousFileOperation:
+        raise Http404("Invalid page.")
+    if not os.path.exists(path) and not render_missing(kind, key):
+        raise Http404("No such page.")
+    try:
+        stat = os.stat(path)
+    except OSError:
+        # Removed by prerender() in the meantime
+        raise Http404("No such page.")
+
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    if not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        content_type = "application/json" if as_json else "text/html; charset=utf-8"
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+        response["Last-Modified"] = http_date(stat.st_mtime)
+    response["ETag"] = etag
+    response["Cache-Control"] = f"public, max-age={prerender_setting('PRERENDER_MAX_AGE')}"
+    return response
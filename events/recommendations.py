@@ -0,0 +1,211 @@
+"""
+Item-item "events you may like" recommendations.
+
+The job builds a sparse user × event matrix from Participation (weight 1)
+and Feedback (rating / 3, so a 5★ review counts more than just joining and
+a 1★ review counts less), computes cosine similarity between events in
+column blocks, keeps the best NEIGHBOURS per event, and scores users in
+batches. Only the top-K per user is written to EventRecommendation.
+
+Peak memory is roughly the interaction matrix (~16 bytes per participation)
+plus one similarity block (events × item_block) and one user batch's score
+matrix, so it stays flat as the tables grow.
+"""
+
+from array import array
+from datetime import date
+
+import numpy as np
+from scipy import sparse
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Event, EventRecommendation, Feedback, Participation, RecommendationRefresh
+
+
+NEIGHBOURS = 50
+TOP_K = 20
+
+
+def load_interactions(chunk_size=50_000):
+    """Return (user_ids, event_ids, weights) as numpy arrays, streamed from the DB."""
+    users, events, weights = array("q"), array("q"), array("d")
+
+    participations = Participation.objects.values_list("user_id", "event_id")
+    for user_id, event_id in participations.iterator(chunk_size=chunk_size):
+        users.append(user_id)
+        events.append(event_id)
+        weights.append(1.0)
+
+    # Feedback shifts the joined weight of 1.0 to rating / 3
+    feedback = Feedback.objects.values_list("user_id", "event_id", "rating")
+    for user_id, event_id, rating in feedback.iterator(chunk_size=chunk_size):
+        users.append(user_id)
+        events.append(event_id)
+        weights.append(rating / 3 - 1.0)
+
+    return (
+        np.frombuffer(users, dtype=np.int64),
+        np.frombuffer(events, dtype=np.int64),
+        np.frombuffer(weights, dtype=np.float64),
+    )
+
+
+def build_matrix(user_ids, event_ids, weights):
+    """CSR user × event matrix plus the id arrays for its rows and columns."""
+    row_ids, rows = np.unique(user_ids, return_inverse=True)
+    col_ids, cols = np.unique(event_ids, return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (weights.astype(np.float32), (rows, cols)),
+        shape=(len(row_ids), len(col_ids)),
+    )
+    # Duplicates were summed; feedback without a participation can go negative
+    matrix.data = np.clip(matrix.data, 0, None)
+    matrix.eliminate_zeros()
+    return matrix, row_ids, col_ids
+
+
+def item_neighbours(matrix, neighbours=NEIGHBOURS, item_block=2048):
+    """
+    Cosine similarity between events, keeping only the top ``neighbours``
+    per event. Computed one block of columns at a time.
+    """
+    n_items = matrix.shape[1]
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    normalized = (matrix @ sparse.diags(1.0 / norms)).tocsc()
+    normalized_t = normalized.T.tocsr()
+
+    rows, cols, vals = [], [], []
+    for start in range(0, n_items, item_block):
+        stop = min(start + item_block, n_items)
+        block = (normalized_t @ normalized[:, start:stop]).tocsc()
+        block.setdiag(0, k=-start)
+        block.eliminate_zeros()
+
+        for j in range(stop - start):
+            lo, hi = block.indptr[j], block.indptr[j + 1]
+            if lo == hi:
+                continue
+            idx, data = block.indices[lo:hi], block.data[lo:hi]
+            if len(data) > neighbours:
+                keep = np.argpartition(data, -neighbours)[-neighbours:]
+                idx, data = idx[keep], data[keep]
+            rows.append(idx)
+            cols.append(np.full(len(idx), start + j, dtype=idx.dtype))
+            vals.append(data)
+
+    if not vals:
+        return sparse.csr_matrix((n_items, n_items), dtype=np.float32)
+    return sparse.csr_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_items, n_items),
+    )
+
+
+def candidate_mask(col_ids):
+    """Boolean mask over matrix columns: approved events that haven't happened yet."""
+    open_ids = np.fromiter(
+        Event.objects
+        .filter(status="approved")
+        .filter(Q(date__gte=date.today()) | Q(date__isnull=True))
+        .values_list("id", flat=True)
+        .iterator(),
+        dtype=np.int64,
+    )
+    return np.isin(col_ids, open_ids)
+
+
+def top_k_rows(scores, k):
+    """Yield (row, column indices, scores) with the best k entries of each CSR row."""
+    for row in range(scores.shape[0]):
+        lo, hi = scores.indptr[row], scores.indptr[row + 1]
+        if lo == hi:
+            continue
+        idx, data = scores.indices[lo:hi], scores.data[lo:hi]
+        if len(data) > k:
+            keep = np.argpartition(data, -k)[-k:]
+            idx, data = idx[keep], data[keep]
+        order = np.argsort(-data, kind="stable")
+        yield row, idx[order], data[order]
+
+
+def insert_recommendations(rows):
+    """
+    Plain executemany insert. Building hundreds of thousands of model
+    instances for bulk_create costs far more than the maths above.
+    """
+    if not rows:
+        return
+    opts = EventRecommendation._meta
+    qn = connection.ops.quote_name
+    columns = ", ".join(
+        qn(opts.get_field(name).column) for name in ("user", "event", "score", "rank", "computed_at")
+    )
+    sql = f"INSERT INTO {qn(opts.db_table)} ({columns}) VALUES (%s, %s, %s, %s, %s)"
+    field = opts.get_field("computed_at")
+    computed_at = field.get_db_prep_save(rows[0][4], connection)
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [row[:4] + (computed_at,) for row in rows])
+
+
+def compute_recommendations(user_ids=None, top_k=TOP_K, batch_size=2000, item_block=2048, stdout=None):
+    """
+    Rebuild recommendations for ``user_ids`` (all users with interactions
+    when None). Returns the number of users whose rows were rewritten.
+    """
+    started_at = timezone.now()
+    matrix, row_ids, col_ids = build_matrix(*load_interactions())
+
+    similarity = item_neighbours(matrix, item_block=item_block)
+    allowed = candidate_mask(col_ids)
+
+    if user_ids is None:
+        target_rows = np.arange(len(row_ids))
+    else:
+        wanted = np.asarray(sorted(user_ids), dtype=np.int64)
+        target_rows = np.flatnonzero(np.isin(row_ids, wanted))
+        # Users who no longer have any interactions just lose their rows
+        missing = set(wanted.tolist()) - set(row_ids[target_rows].tolist())
+        if missing:
+            EventRecommendation.objects.filter(user_id__in=missing).delete()
+            RecommendationRefresh.objects.filter(user_id__in=missing, requested_at__lte=started_at).delete()
+
+    written = 0
+    for start in range(0, len(target_rows), batch_size):
+        batch = target_rows[start:start + batch_size]
+        history = matrix[batch]
+        scores = (history @ similarity).tocsr()
+
+        # Drop events the user already joined and ones that aren't open
+        scores = scores - scores.multiply(history.astype(bool))
+        scores = scores.multiply(allowed[np.newaxis, :]).tocsr()
+        scores.eliminate_zeros()
+
+        batch_user_ids = row_ids[batch]
+        now = timezone.now()
+        new_rows = [
+            (int(batch_user_ids[row]), int(col_ids[col]), float(score), rank, now)
+            for row, cols, values in top_k_rows(scores, top_k)
+            for rank, (col, score) in enumerate(zip(cols, values), start=1)
+        ]
+
+        with transaction.atomic():
+            EventRecommendation.objects.filter(user_id__in=batch_user_ids.tolist()).delete()
+            insert_recommendations(new_rows)
+            RecommendationRefresh.objects.filter(
+                user_id__in=batch_user_ids.tolist(),
+                requested_at__lte=started_at,
+            ).delete()
+
+        written += len(batch)
+        if stdout is not None:
+            stdout.write(f"  {written}/{len(target_rows)} users")
+
+    return written
+
+
+def stale_user_ids():
+    return list(RecommendationRefresh.objects.values_list("user_id", flat=True))
@@ -0,0 +1,229 @@
+"""
+Recurring event series.
+
+An EventSeries stores its rule (FREQ, INTERVAL, BYDAY, UNTIL and COUNT in
+RRULE terms) instead of one Event per date. dates_between() computes the
+occurrences inside a window directly: it jumps to the first period that
+can reach the window rather than walking from the start, so listing next
+week of a series that began years ago costs the same as listing its
+first week.
+
+Occurrences stay plain Occurrence objects until they are needed as rows.
+materialize() creates the Event, with its capacity, the first time someone
+joins an occurrence or the organizer edits one. A weekly series for a year
+is therefore one row until it is used.
+
+Cancelled dates are skipped but still count toward COUNT, like EXDATE.
+Monthly rules repeat on the day of the month of the first occurrence and
+skip months that don't have that day.
+"""
+
+import calendar
+from datetime import date, time, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Event, EventCapacity, EventSeries
+
+
+MAX_COUNT = 1000
+
+
+def weekdays(series):
+    """BYDAY as sorted weekday numbers (Monday = 0), defaulting to the first date's weekday."""
+    days = sorted({int(d) for d in series.weekdays.split(",") if d.strip()}) if series.weekdays else []
+    return days or [series.starts_on.weekday()]
+
+
+def months_between(first, second):
+    return (second.year - first.year) * 12 + second.month - first.month
+
+
+def candidates(series, start, end):
+    """
+    Yield (index, date) for occurrences from ``start`` to ``end``, where
+    index is the occurrence's position in the whole series. Ignores UNTIL,
+    COUNT and cancellations.
+    """
+    first = series.starts_on
+    interval = max(series.interval, 1)
+
+    if series.freq == "daily":
+        n = max(0, -(-(start - first).days // interval))
+        day = first + timedelta(days=n * interval)
+        while day <= end:
+            yield n, day
+            n += 1
+            day += timedelta(days=interval)
+
+    elif series.freq == "weekly":
+        days = weekdays(series)
+        monday = first - timedelta(days=first.weekday())
+        before_first = sum(1 for d in days if d < first.weekday())
+        period = max(0, (start - monday).days // (7 * interval))
+        while True:
+            week = monday + timedelta(weeks=period * interval)
+            if week > end:
+                return
+            for position, d in enumerate(days):
+                day = week + timedelta(days=d)
+                if day < first or day < start:
+                    continue
+                if day > end:
+                    return
+                yield period * len(days) + position - before_first, day
+            period += 1
+
+    elif series.freq == "monthly":
+        # Without short months in play the n-th period is the n-th occurrence;
+        # otherwise count from the start, which COUNT keeps short anyway
+        exact = first.day <= 28 or series.count is None
+        period = max(0, months_between(first, start) // interval) if exact else 0
+        index = period
+        while True:
+            month = first.month - 1 + period * interval
+            year, month = first.year + month // 12, month % 12 + 1
+            if date(year, month, 1) > end:
+                return
+            if first.day <= calendar.monthrange(year, month)[1]:
+                day = date(year, month, first.day)
+                if day > end:
+                    return
+                if day >= start:
+                    yield index, day
+                index += 1
+            period += 1
+
+
+def dates_between(series, start, end):
+    """Occurrence dates of ``series`` from ``start`` to ``end`` inclusive."""
+    start = max(start, series.starts_on)
+    if series.until:
+        end = min(end, series.until)
+    if start > end:
+        return
+    cancelled = set(series.cancelled_dates or ())
+    for index, day in candidates(series, start, end):
+        if series.count is not None and index >= series.count:
+            return
+        if day.isoformat() not in cancelled:
+            yield day
+
+
+def last_occurrence(series):
+    """Date of the final occurrence, or None for an open-ended series."""
+    if series.count is None:
+        return series.until
+    end = series.until or date.max
+    last = None
+    for index, day in candidates(series, series.starts_on, end):
+        if index >= series.count:
+            break
+        last = day
+    return last
+
+
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+UNITS = {"daily": "day", "weekly": "week", "monthly": "month"}
+
+
+def describe(series):
+    """The rule in words, e.g. "Every 2 weeks on Mon, Thu, 10 times"."""
+    unit = UNITS[series.freq]
+    text = f"Every {unit}" if series.interval == 1 else f"Every {series.interval} {unit}s"
+    if series.freq == "weekly":
+        text += " on " + ", ".join(WEEKDAY_NAMES[d] for d in weekdays(series))
+    elif series.freq == "monthly":
+        text += f" on day {series.starts_on.day}"
+    if series.count:
+        text += f", {series.count} times"
+    if series.until:
+        text += f", until {series.until:%b %d, %Y}"
+    return text
+
+
+def is_occurrence(series, day):
+    return any(True for _ in dates_between(series, day, day))
+
+
+class Occurrence:
+    """One date of a series without an Event row yet. Has the Event attributes listings use."""
+
+    virtual = True
+    pk = id = None
+    capacity = None
+
+    def __init__(self, series, day):
+        self.series = series
+        self.series_id = series.pk
+        self.date = self.occurrence_date = day
+        for field in ("title", "start_time", "end_time", "location", "short_description",
+                      "organizer", "organizer_id", "image", "status", "max_participants"):
+            setattr(self, field, getattr(series, field))
+
+
+def overlapping(queryset, start, end):
+    """Series in ``queryset`` with at least one date that can fall in the window."""
+    return queryset.filter(starts_on__lte=end).filter(Q(last_date__isnull=True) | Q(last_date__gte=start))
+
+
+def occurrences_between(queryset, start, end):
+    """
+    Occurrences of the series in ``queryset`` from ``start`` to ``end`` that
+    have no Event row yet, in date order. Materialized ones are listed as
+    ordinary events, so they are left out here.
+    """
+    series_list = list(overlapping(queryset, start, end).select_related("organizer"))
+    if not series_list:
+        return []
+    materialized = set(
+        Event.objects
+        .filter(series__in=series_list, occurrence_date__range=(start, end))
+        .values_list("series_id", "occurrence_date")
+    )
+    found = [
+        Occurrence(series, day)
+        for series in series_list
+        for day in dates_between(series, start, end)
+        if (series.pk, day) not in materialized
+    ]
+    found.sort(key=lambda o: (o.date, o.start_time or time.min, o.title))
+    return found
+
+
+def materialize(series, day):
+    """The Event for ``series`` on ``day``, created with its capacity if needed. Returns (event, created)."""
+    with transaction.atomic():
+        event, created = Event.objects.get_or_create(
+            series=series,
+            occurrence_date=day,
+            defaults={
+                "title": series.title,
+                "date": day,
+                "start_time": series.start_time,
+                "end_time": series.end_time,
+                "location": series.location,
+                "short_description": series.short_description,
+                "organizer_id": series.organizer_id,
+                "status": series.status,
+                # Occurrences share the series image file
+                "image": series.image.name if series.image else None,
+            },
+        )
+        if created:
+            EventCapacity.objects.create(event=event, max_participants=series.max_participants, current_participants=0)
+    return event, created
+
+
+def cancel_date(series_id, day):
+    """Leave ``day`` out of the series from now on. Call inside a transaction."""
+    return cancel_dates(series_id, [day])
+
+
+def cancel_dates(series_id, days):
+    """cancel_date() for several days at once."""
+    series = EventSeries.all_objects.select_for_update().get(pk=series_id)
+    series.cancelled_dates = sorted({*series.cancelled_dates, *(day.isoformat() for day in days)})
+    series.save(update_fields=["cancelled_dates", "last_date"])
+    return series
@@ -0,0 +1,159 @@
+"""
+Hourly and daily activity rollups for organizer analytics.
+
+update_rollups() folds Participation and Feedback rows that are newer than
+the stored watermark (their primary key) into EventActivityRollup and
+OrganizerActivityRollup, one chunk per transaction. Rows are only ever
+added, so leaving an event still counts as a registration on the day it
+happened, and editing a rating keeps the original one in the rollup.
+"""
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import (
+    EventActivityRollup,
+    Feedback,
+    OrganizerActivityRollup,
+    Participation,
+    RollupWatermark,
+)
+
+
+COUNTERS = ("joins", "feedback_count", "rating_sum")
+
+SOURCES = {
+    "participation": (Participation, "joined_at", {"joins": Count("id")}),
+    "feedback": (Feedback, "created_at", {"feedback_count": Count("id"), "rating_sum": Sum("rating")}),
+}
+
+MAX_RANGE = {
+    "hour": timedelta(days=14),
+    "day": timedelta(days=366),
+}
+
+
+def update_rollups(chunk_size=10_000):
+    """Fold every new row into the rollups. Returns {source: rows processed}."""
+    processed = {}
+    for source in SOURCES:
+        total = 0
+        while True:
+            count = fold_chunk(source, chunk_size)
+            if not count:
+                break
+            total += count
+        processed[source] = total
+    return processed
+
+
+def fold_chunk(source, chunk_size):
+    model, time_field, aggregates = SOURCES[source]
+
+    with transaction.atomic():
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(source=source)
+        ids = list(
+            model.objects
+            .filter(id__gt=watermark.last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:chunk_size]
+        )
+        if not ids:
+            return 0
+
+        rows = (
+            model.objects
+            .filter(id__gt=watermark.last_id, id__lte=ids[-1])
+            .annotate(bucket=TruncHour(time_field))
+            .values("event_id", "event__organizer_id", "bucket")
+            .annotate(**aggregates)
+            .order_by()
+        )
+
+        event_deltas = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+        organizer_deltas = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+        for row in rows:
+            hour = row["bucket"]
+            day = hour.replace(hour=0)
+            for granularity, bucket in (("hour", hour), ("day", day)):
+                for counter in aggregates:
+                    event_deltas[(row["event_id"], granularity, bucket)][counter] += row[counter] or 0
+                    organizer_deltas[(row["event__organizer_id"], granularity, bucket)][counter] += row[counter] or 0
+
+        apply_deltas(EventActivityRollup, "event_id", event_deltas)
+        apply_deltas(OrganizerActivityRollup, "organizer_id", organizer_deltas)
+
+        watermark.last_id = ids[-1]
+        watermark.save()
+
+    return len(ids)
+
+
+def apply_deltas(model, key_field, deltas):
+    """Add ``deltas`` {(key, granularity, bucket): {counter: n}} onto existing rollup rows."""
+    if not deltas:
+        return
+    keys = {k for k, _, _ in deltas}
+    buckets = {b for _, _, b in deltas}
+    existing = {
+        (getattr(r, key_field), r.granularity, r.bucket): r
+        for r in model.objects.filter(**{f"{key_field}__in": keys}, bucket__in=buckets)
+    }
+
+    to_update, to_create = [], []
+    for key, counts in deltas.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            rollup = model(**{key_field: key[0]}, granularity=key[1], bucket=key[2])
+            to_create.append(rollup)
+        else:
+            to_update.append(rollup)
+        for counter, value in counts.items():
+            setattr(rollup, counter, getattr(rollup, counter) + value)
+
+    model.objects.bulk_update(to_update, COUNTERS, batch_size=500)
+    model.objects.bulk_create(to_create, batch_size=500)
+
+
+def bucket_range(granularity, start, end):
+    """Every bucket start between the dates ``start`` and ``end`` (inclusive)."""
+    tz = timezone.get_current_timezone()
+    current = timezone.make_aware(datetime.combine(start, time.min), tz)
+    stop = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz)
+    step = timedelta(hours=1) if granularity == "hour" else timedelta(days=1)
+    while current < stop:
+        yield current
+        current += step
+
+
+def activity_series(granularity, start, end, organizer=None, event=None):
+    """
+    Zero-filled series for one organizer or one event between two dates,
+    read straight from the rollups.
+    """
+    if event is not None:
+        qs = EventActivityRollup.objects.filter(event=event)
+    else:
+        qs = OrganizerActivityRollup.objects.filter(organizer=organizer)
+
+    buckets = list(bucket_range(granularity, start, end))
+    found = {
+        r.bucket: r
+        for r in qs.filter(granularity=granularity, bucket__gte=buckets[0], bucket__lte=buckets[-1])
+    }
+
+    series = []
+    for bucket in buckets:
+        r = found.get(bucket)
+        series.append({
+            "bucket": bucket.isoformat(),
+            "joins": r.joins if r else 0,
+            "feedback": r.feedback_count if r else 0,
+            "avg_rating": r.avg_rating if r else None,
+        })
+    return series
@@ -0,0 +1,136 @@
+"""
+Schedule conflict detection.
+
+Two events conflict when their time slots overlap on the same date. For a
+venue, that means same (normalised) location. For an attendee, it means
+any two events they joined.
+
+Each event stores its venue_key(), the location case-folded with its
+whitespace collapsed, when it is saved. Computing it in Python rather
+than with the database's LOWER and TRIM (ASCII-only in SQLite) keeps the
+lookups and the report sweep in agreement for "PARAÑAQUE" or a location
+padded with tabs. Lookups for a single event go through
+``event_venue_slot_idx`` on (venue_key, date, start_time), so the
+database only ever visits the handful of events at that venue on that
+day. The full report
+streams every active event in index order and sweeps each (venue, day)
+group once, which is O(n log n) overall instead of comparing every pair.
+"""
+
+from datetime import time
+from heapq import heappop, heappush
+from itertools import groupby
+
+from .models import Event
+
+
+# Declined events never take up a slot
+ACTIVE_STATUSES = ("pending", "approved", "full")
+
+DAY_START = time.min
+DAY_END = time.max
+
+
+def venue_key(location):
+    """The location case-folded, with runs of whitespace as one space and none at the ends."""
+    return " ".join((location or "").split()).casefold()[:200]
+
+
+def slot(start_time, end_time):
+    """
+    (start, end) for an event. A missing start means it begins at midnight;
+    a missing end, or one before the start, runs to the end of the day.
+    """
+    start = start_time or DAY_START
+    end = end_time if end_time and end_time > start else DAY_END
+    return start, end
+
+
+def slot_label(event):
+    start, end = slot(event.start_time, event.end_time)
+    end_label = "end of day" if end == DAY_END else end.strftime("%H:%M")
+    return f"{start.strftime('%H:%M')}–{end_label}"
+
+
+def overlaps(a, b):
+    """Half-open overlap, so back-to-back events don't conflict."""
+    return a[0] < b[1] and b[0] < a[1]
+
+
+def venue_conflicts(location, date, start_time, end_time, exclude_pk=None):
+    """Active events at the same venue and date whose slot overlaps this one."""
+    key = venue_key(location)
+    if not key or date is None:
+        return []
+
+    qs = (
+        Event.objects
+        .filter(venue_key=key, date=date, status__in=ACTIVE_STATUSES)
+        .order_by("start_time")
+    )
+    if exclude_pk is not None:
+        qs = qs.exclude(pk=exclude_pk)
+
+    wanted = slot(start_time, end_time)
+    return [e for e in qs if overlaps(wanted, slot(e.start_time, e.end_time))]
+
+
+def attendee_conflicts(user, event):
+    """Events ``user`` already joined that overlap ``event``."""
+    if event.date is None:
+        return []
+
+    joined = (
+        Event.objects
+        .filter(participants__user=user, date=event.date)
+        .exclude(pk=event.pk)
+        .order_by("start_time")
+    )
+    wanted = slot(event.start_time, event.end_time)
+    return [e for e in joined if overlaps(wanted, slot(e.start_time, e.end_time))]
+
+
+def sweep(events):
+    """
+    Yield (earlier, later) overlapping pairs from events sharing one venue
+    and day. Events still running are kept in a heap keyed by end time, so
+    each event is only compared with the ones it can overlap.
+    """
+    running = []
+    ordered = sorted(events, key=lambda e: slot(e.start_time, e.end_time))
+    for index, event in enumerate(ordered):
+        start, end = slot(event.start_time, event.end_time)
+        while running and running[0][0] <= start:
+            heappop(running)
+        for _, _, other in running:
+            yield other, event
+        heappush(running, (end, index, event))
+
+
+def conflict_report(date_from=None, chunk_size=2000):
+    """
+    Every pair of overlapping active events at the same venue, grouped as
+    [{"date", "location", "pairs": [(a, b), ...]}], ordered by date.
+    """
+    qs = (
+        Event.objects
+        .filter(status__in=ACTIVE_STATUSES, date__isnull=False)
+        .exclude(venue_key="")
+        .select_related("organizer")
+        .order_by("venue_key", "date", "start_time")
+    )
+    if date_from is not None:
+        qs = qs.filter(date__gte=date_from)
+
+    groups = []
+    rows = qs.iterator(chunk_size=chunk_size)
+    for (_, day), events in groupby(rows, key=lambda e: (e.venue_key, e.date)):
+        events = list(events)
+        if len(events) < 2:
+            continue
+        pairs = list(sweep(events))
+        if pairs:
+            groups.append({"date": day, "location": events[0].location, "pairs": pairs})
+
+    groups.sort(key=lambda g: (g["date"], g["location"].lower()))
+    return groups
@@ -0,0 +1,170 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .caching import invalidate as invalidate_views
+from .calendars import invalidate_all, invalidate_dates
+from .geo import apply_geocode
+from .mediafiles import release
+from .prerender import PUBLISHED_STATUSES, withdraw
+from .models import Event, EventCapacity, EventSeries, Feedback, Participation, RecommendationRefresh
+from .recurrence import last_occurrence
+from .schedule import venue_key
+from .suggest import changed as suggestions_changed
+from .tickets import invalidate, revoke
+
+
+@receiver(post_save, sender=Participation)
+@receiver(post_delete, sender=Participation)
+@receiver(post_save, sender=Feedback)
+@receiver(post_delete, sender=Feedback)
+def mark_recommendations_stale(sender, instance, **kwargs):
+    """Queue the user for the next incremental compute_recommendations run."""
+    RecommendationRefresh.objects.bulk_create(
+        [RecommendationRefresh(user_id=instance.user_id, requested_at=timezone.now())],
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=["requested_at"],
+    )
+
+
+@receiver(post_delete, sender=Participation)
+def revoke_ticket(sender, instance, origin=None, **kwargs):
+    """A cancelled registration's ticket must stop working at the door."""
+    if isinstance(origin, Event) or getattr(origin, "model", None) is Event:
+        # The event is going too, and its tickets with it
+        return
+    revoke([(instance.event_id, instance.pk)])
+
+
+@receiver(post_save, sender=Event)
+def refresh_ticket_context(sender, instance, raw=False, **kwargs):
+    """Status changes open or close the door; scanners must see them."""
+    if not raw:
+        invalidate([instance.pk])
+
+
+@receiver(pre_save, sender=Event)
+def remember_stored(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Note the stored date, image and status, so the calendar also drops the
+    month an event moves out of, a replaced image file can be released and
+    an unpublished event's static page removed.
+    """
+    if raw or instance.pk is None:
+        return
+    fields = [f for f in ("date", "image", "status") if update_fields is None or f in update_fields]
+    if not fields:
+        return
+    stored = Event.all_objects.filter(pk=instance.pk).values(*fields).first() or {}
+    instance.previous_date = stored.get("date")
+    instance.previous_image = stored.get("image")
+    instance.previous_status = stored.get("status")
+
+
+@receiver(pre_save, sender=EventSeries)
+def remember_series_image(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.pk is None or (update_fields is not None and "image" not in update_fields):
+        return
+    instance.previous_image = EventSeries.all_objects.filter(pk=instance.pk).values_list("image", flat=True).first()
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_save, sender=EventSeries)
+def release_replaced_image(sender, instance, raw=False, **kwargs):
+    """The old file goes unless another event still uses it (see events/mediafiles.py)."""
+    previous = getattr(instance, "previous_image", None)
+    if not raw and previous and previous != instance.image.name:
+        release([previous])
+
+
+@receiver(post_save, sender=Event)
+def withdraw_unpublished(sender, instance, raw=False, **kwargs):
+    """Declining or reopening a published event takes its prerendered page down."""
+    previous = getattr(instance, "previous_status", None)
+    if not raw and previous in PUBLISHED_STATUSES and instance.status not in PUBLISHED_STATUSES:
+        withdraw([instance.pk])
+
+
+@receiver(post_delete, sender=Event)
+def withdraw_deleted(sender, instance, **kwargs):
+    withdraw([instance.pk])
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def refresh_calendar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_dates([instance.date, getattr(instance, "previous_date", None)])
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def refresh_suggestions(sender, instance, raw=False, **kwargs):
+    """Approval, edits and deletion change what the title suggestions offer."""
+    if not raw:
+        suggestions_changed([instance.pk])
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def refresh_event_views(sender, instance, raw=False, **kwargs):
+    """Dashboards count events by status; organizers only see their own."""
+    if not raw:
+        invalidate_views("events", f"organizer:{instance.organizer_id}")
+
+
+@receiver(post_save, sender=Participation)
+@receiver(post_delete, sender=Participation)
+def refresh_participation_views(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_views("participations")
+
+
+@receiver(post_save, sender=EventCapacity)
+@receiver(post_delete, sender=EventCapacity)
+def refresh_capacity_views(sender, instance, raw=False, **kwargs):
+    """Seats taken and left show on the prerendered catalogue."""
+    if not raw:
+        invalidate_views("capacity")
+
+
+@receiver(post_save, sender=Feedback)
+@receiver(post_delete, sender=Feedback)
+def refresh_feedback_views(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_views("feedback")
+
+
+@receiver(post_save, sender=EventSeries)
+@receiver(post_delete, sender=EventSeries)
+def refresh_series_views(sender, instance, raw=False, **kwargs):
+    """Approving or declining a series updates the status of its dates in bulk."""
+    if not raw:
+        invalidate_views("events", f"organizer:{instance.organizer_id}")
+
+
+@receiver(post_save, sender=EventSeries)
+@receiver(post_delete, sender=EventSeries)
+def refresh_series_calendar(sender, instance, raw=False, **kwargs):
+    """A series can have dates in any month, and approving it updates its dates in bulk."""
+    if not raw:
+        invalidate_all()
+
+
+@receiver(pre_save, sender=Event)
+def geocode_location(sender, instance, raw=False, **kwargs):
+    """Look the location up again whenever it changes."""
+    if not raw and instance.location != instance.geocoded_location:
+        apply_geocode(instance)
+
+
+@receiver(pre_save, sender=Event)
+def store_venue_key(sender, instance, **kwargs):
+    instance.venue_key = venue_key(instance.location)
+
+
+@receiver(pre_save, sender=EventSeries)
+def store_last_date(sender, instance, **kwargs):
+    """Keep last_date in step with the rule, for window lookups."""
+    instance.last_date = last_occurrence(instance)
@@ -0,0 +1,247 @@
+"""
+Search-as-you-type suggestions for approved event titles.
+
+Suggestions come from an in-process index, never from the database: a
+sorted list of keys, one per word a title can be found by ("Community
+Garden Day" is found by "community garden day", "garden day" and "day"),
+each key ending with the event id. That is a trie laid out flat: the keys
+starting with a prefix are one contiguous slice, found with two binary
+searches. Suggestions are the slice's most popular events (participants
+at the last refresh). A short slice is ranked directly; for a long one,
+from a prefix of a letter or two, the events are walked in popularity
+order instead until enough of them match, which takes a few steps
+because most of them do. Results for recent prefixes are memoized until
+the index changes.
+
+Memory is bounded: at most SUGGEST_MAX_EVENTS events (the most popular
+win), SUGGEST_KEYS_PER_TITLE keys each, truncated to SUGGEST_KEY_LENGTH
+characters.
+
+The index is built on first use and then kept up to date incrementally.
+Saving, approving, editing or deleting an event calls changed(), which
+bumps a version number in the shared cache and stores the event ids under
+it. Before a lookup, each process reads the version and re-reads just the
+events changed since its own version, in one query. When the log has gaps
+(evicted keys, too many changes) or SUGGEST_REBUILD_INTERVAL has passed,
+which also refreshes popularity, the index is rebuilt from one query
+instead.
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .geo import normalize
+from .models import Event
+
+
+VERSION_KEY = "suggest:version"
+SEPARATOR = "\x00"
+MAX_LIMIT = 20
+MEMO_SIZE = 2048
+# Slices longer than this, and than 1/16 of all keys, are answered by walking
+# events in popularity order: enough of them match to stop early
+LONG_SLICE = 512
+# Changes a process catches up on before it rebuilds instead
+MAX_CHANGES = 500
+
+
+def suggest_setting(name):
+    defaults = {
+        "SUGGEST_MAX_EVENTS": 20_000,
+        "SUGGEST_KEYS_PER_TITLE": 4,
+        "SUGGEST_KEY_LENGTH": 40,
+        "SUGGEST_REBUILD_INTERVAL": 15 * 60,
+        "SUGGEST_CHANGE_TTL": 60 * 60,
+    }
+    return getattr(settings, name, defaults[name])
+
+
+def change_key(version):
+    return f"suggest:change:{version}"
+
+
+def title_keys(title):
+    """The keys ``title`` is found by: its normalized text from each word on."""
+    words = normalize(title).split()
+    length = suggest_setting("SUGGEST_KEY_LENGTH")
+    return list(dict.fromkeys(
+        " ".join(words[i:])[:length] for i in range(min(len(words), suggest_setting("SUGGEST_KEYS_PER_TITLE")))
+    ))
+
+
+def indexed_events():
+    return (
+        Event.objects
+        .filter(status="approved")
+        .values_list("id", "title", "date", "organizer_id", "capacity__current_participants")
+    )
+
+
+class TitleIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keys = []
+        # id -> (title, date, organizer id, popularity, keys)
+        self.events = {}
+        # (-popularity, id), most popular first
+        self.ranking = []
+        self.by_organizer = defaultdict(set)
+        self.memo = OrderedDict()
+        self.version = None
+        self.built_at = 0.0
+
+    # Maintenance
+
+    def rebuild(self, version):
+        self.keys, self.events, self.ranking = [], {}, []
+        self.by_organizer = defaultdict(set)
+        limit = suggest_setting("SUGGEST_MAX_EVENTS")
+        for row in indexed_events().order_by("-capacity__current_participants", "-id")[:limit]:
+            self.store(*row)
+        self.keys.sort()
+        self.ranking.sort()
+        self.memo.clear()
+        self.version = version
+        self.built_at = time.monotonic()
+
+    def store(self, pk, title, day, organizer_id, popularity):
+        popularity = popularity or 0
+        entry_keys = [f"{key}{SEPARATOR}{pk}" for key in title_keys(title)]
+        self.events[pk] = (title, day, organizer_id, popularity, entry_keys)
+        self.by_organizer[organizer_id].add(pk)
+        self.keys.extend(entry_keys)
+        self.ranking.append((-popularity, pk))
+
+    def remove(self, pk):
+        entry = self.events.pop(pk, None)
+        if entry is None:
+            return
+        for key in entry[4]:
+            i = bisect_left(self.keys, key)
+            if i < len(self.keys) and self.keys[i] == key:
+                del self.keys[i]
+        i = bisect_left(self.ranking, (-entry[3], pk))
+        if i < len(self.ranking) and self.ranking[i] == (-entry[3], pk):
+            del self.ranking[i]
+        self.by_organizer[entry[2]].discard(pk)
+
+    def add(self, pk, title, day, organizer_id, popularity):
+        popularity = popularity or 0
+        if len(self.events) >= suggest_setting("SUGGEST_MAX_EVENTS"):
+            weakest = self.ranking[-1]
+            if -weakest[0] >= popularity:
+                return
+            self.remove(weakest[1])
+        entry_keys = [f"{key}{SEPARATOR}{pk}" for key in title_keys(title)]
+        self.events[pk] = (title, day, organizer_id, popularity, entry_keys)
+        self.by_organizer[organizer_id].add(pk)
+        for key in entry_keys:
+            insort(self.keys, key)
+        insort(self.ranking, (-popularity, pk))
+
+    def apply(self, ids, version):
+        """Re-read the events ``ids`` and update their entries."""
+        rows = {row[0]: row for row in indexed_events().filter(id__in=ids)}
+        for pk in ids:
+            self.remove(pk)
+            if pk in rows:
+                self.add(*rows[pk])
+        self.memo.clear()
+        self.version = version
+
+    def catch_up(self):
+        """Bring the index up to the shared version. Call with the lock held."""
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, 0, None)
+            version = cache.get(VERSION_KEY, 0)
+        if version == self.version:
+            if time.monotonic() - self.built_at < suggest_setting("SUGGEST_REBUILD_INTERVAL"):
+                return
+        elif self.version is not None and 0 < version - self.version <= MAX_CHANGES:
+            wanted = [change_key(v) for v in range(self.version + 1, version + 1)]
+            found = cache.get_many(wanted)
+            if len(found) == len(wanted) and all(ids is not None for ids in found.values()):
+                self.apply({pk for ids in found.values() for pk in ids}, version)
+                return
+        self.rebuild(version)
+
+    # Lookups
+
+    def matches(self, pk, prefix):
+        return any(key.startswith(prefix) for key in self.events[pk][4])
+
+    def candidates(self, prefix, organizer_id):
+        """Ids of events with a key starting with ``prefix``, most popular first."""
+        if organizer_id is not None:
+            own = [pk for pk in self.by_organizer.get(organizer_id, ()) if self.matches(pk, prefix)]
+            return sorted(own, key=lambda pk: (-self.events[pk][3], pk))
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + "\U0010ffff", lo)
+        if hi - lo > max(LONG_SLICE, len(self.keys) // 16):
+            return (pk for _, pk in self.ranking if self.matches(pk, prefix))
+        ids = {int(key.rpartition(SEPARATOR)[2]) for key in self.keys[lo:hi]}
+        return sorted(ids, key=lambda pk: (-self.events[pk][3], pk))
+
+    def lookup(self, prefix, limit, organizer_id=None):
+        """The ``limit`` most popular events with a key starting with ``prefix``."""
+        memo_key = (prefix, limit, organizer_id)
+        if memo_key in self.memo:
+            self.memo.move_to_end(memo_key)
+            return self.memo[memo_key]
+
+        results, seen = [], set()
+        for pk in self.candidates(prefix, organizer_id):
+            title, day = self.events[pk][:2]
+            # Titles repeated across events (series dates, say) are shown once
+            if title.casefold() in seen:
+                continue
+            seen.add(title.casefold())
+            results.append({"id": pk, "title": title, "date": day.isoformat() if day else None})
+            if len(results) == limit:
+                break
+
+        self.memo[memo_key] = results
+        if len(self.memo) > MEMO_SIZE:
+            self.memo.popitem(last=False)
+        return results
+
+    def suggest(self, text, limit=8, organizer_id=None):
+        prefix = normalize(text)[:suggest_setting("SUGGEST_KEY_LENGTH")]
+        if not prefix:
+            return []
+        with self.lock:
+            self.catch_up()
+            return self.lookup(prefix, min(max(limit, 1), MAX_LIMIT), organizer_id)
+
+
+index = TitleIndex()
+
+
+def suggest(text, limit=8, organizer_id=None):
+    """Approved events whose title has a word starting with ``text``, most popular first."""
+    return index.suggest(text, limit, organizer_id)
+
+
+def publish(ids):
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 0, None)
+        version = cache.incr(VERSION_KEY)
+    cache.set(change_key(version), ids, suggest_setting("SUGGEST_CHANGE_TTL"))
+
+
+def changed(event_ids=None):
+    """
+    Tell every process the events ``event_ids`` changed, once the
+    transaction commits. None means too many to list: rebuild.
+    """
+    ids = sorted(set(event_ids)) if event_ids is not None else None
+    transaction.on_commit(lambda: publish(ids))
@@ -1,3 +1,159 @@
+import base64
+from datetime import date, time, timedelta
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import Profile
+
+from .archive import archive_batch
+from .capacity import reconcile_capacities
+from .models import Event, EventCapacity, EventSeries, Participation
+from .recurrence import dates_between, materialize, occurrences_between
+from .tickets import make_token, read_token
+
+
+def make_user(username, role):
+    user = User.objects.create_user(username, f"{username}@example.com", "pw")
+    Profile.objects.create(user=user, role=role)
+    return user
+
+
+class TicketTokenTests(TestCase):
+    def test_round_trip(self):
+        token = make_token(12, 345)
+        self.assertEqual(read_token(token), (12, 345))
+        self.assertEqual(read_token(f"  {token}\n"), (12, 345))
+
+    def test_tampered_signature(self):
+        raw = bytearray(base64.urlsafe_b64decode(make_token(12, 345) + "=="))
+        raw[-1] ^= 1
+        self.assertIsNone(read_token(base64.urlsafe_b64encode(raw).decode().rstrip("=")))
+
+    def test_tampered_ids(self):
+        # Another event's or participation's ids under this token's signature
+        raw = bytearray(base64.urlsafe_b64decode(make_token(12, 345) + "=="))
+        for offset in (8, 16):
+            forged = bytearray(raw)
+            forged[offset] ^= 1
+            self.assertIsNone(read_token(base64.urlsafe_b64encode(forged).decode().rstrip("=")))
+
+    def test_each_event_signs_with_its_own_key(self):
+        raw = base64.urlsafe_b64decode(make_token(12, 345) + "==")
+        other = base64.urlsafe_b64decode(make_token(13, 345) + "==")
+        self.assertIsNone(read_token(base64.urlsafe_b64encode(other[:17] + raw[17:]).decode().rstrip("=")))
+
+    def test_malformed(self):
+        token = make_token(12, 345)
+        for value in ("", None, "not a token!", token[:-4], token + "AAAA"):
+            self.assertIsNone(read_token(value))
+
+
+class DatesBetweenTests(TestCase):
+    def series(self, **rule):
+        return EventSeries(title="Meetup", **rule)
+
+    def test_count(self):
+        # Mondays and Thursdays, five times
+        series = self.series(freq="weekly", weekdays="0,3", starts_on=date(2024, 1, 1), count=5)
+        self.assertEqual(
+            list(dates_between(series, date(2023, 12, 1), date(2024, 12, 31))),
+            [date(2024, 1, 1), date(2024, 1, 4), date(2024, 1, 8), date(2024, 1, 11), date(2024, 1, 15)],
+        )
+        self.assertEqual(list(dates_between(series, date(2024, 1, 9), date(2024, 1, 31))),
+                         [date(2024, 1, 11), date(2024, 1, 15)])
+
+    def test_until(self):
+        series = self.series(freq="daily", interval=2, starts_on=date(2024, 1, 1), until=date(2024, 1, 9))
+        self.assertEqual(
+            list(dates_between(series, date(2024, 1, 1), date(2024, 2, 1))),
+            [date(2024, 1, 1), date(2024, 1, 3), date(2024, 1, 5), date(2024, 1, 7), date(2024, 1, 9)],
+        )
+
+    def test_cancelled_dates_still_count(self):
+        series = self.series(freq="weekly", weekdays="0,3", starts_on=date(2024, 1, 1), count=5,
+                             cancelled_dates=["2024-01-04", "2024-01-15"])
+        self.assertEqual(list(dates_between(series, date(2024, 1, 1), date(2024, 12, 31))),
+                         [date(2024, 1, 1), date(2024, 1, 8), date(2024, 1, 11)])
+
+    def test_window_long_after_start(self):
+        series = self.series(freq="weekly", interval=2, weekdays="2", starts_on=date(2020, 1, 1))
+        self.assertEqual(list(dates_between(series, date(2024, 1, 1), date(2024, 1, 31))),
+                         [date(2024, 1, 10), date(2024, 1, 24)])
+
+    def test_monthly_skips_short_months(self):
+        series = self.series(freq="monthly", starts_on=date(2024, 1, 31), count=3)
+        self.assertEqual(list(dates_between(series, date(2024, 1, 1), date(2024, 12, 31))),
+                         [date(2024, 1, 31), date(2024, 3, 31), date(2024, 5, 31)])
+
+
+class ReconcileCapacitiesTests(TestCase):
+    def setUp(self):
+        organizer = make_user("org", "organizer")
+        self.event = Event.objects.create(title="Meetup", organizer=organizer, status="approved",
+                                          date=date.today() + timedelta(days=7))
+        EventCapacity.objects.create(event=self.event, max_participants=2, current_participants=0)
+        for name in ("ann", "ben"):
+            Participation.objects.create(user=make_user(name, "attendee"), event=self.event)
+
+    def test_recounts_drift_and_marks_full(self):
+        report = reconcile_capacities(dry_run=True)
+        self.assertEqual((report["drifted"], report["total_drift"], report["filled"]), (1, 2, 1))
+        self.assertEqual(EventCapacity.objects.get(event=self.event).current_participants, 0)
+
+        report = reconcile_capacities()
+        self.assertEqual((report["drifted"], report["filled"]), (1, 1))
+        self.assertEqual(EventCapacity.objects.get(event=self.event).current_participants, 2)
+        self.assertEqual(Event.objects.get(pk=self.event.pk).status, "full")
+        self.assertEqual(reconcile_capacities()["rows"], [])
+
+    def test_reopens_when_count_was_too_high(self):
+        EventCapacity.objects.filter(event=self.event).update(current_participants=5)
+        Event.objects.filter(pk=self.event.pk).update(status="full")
+        Participation.objects.filter(user__username="ben").delete()
+
+        report = reconcile_capacities()
+        self.assertEqual((report["total_drift"], report["reopened"]), (4, 1))
+        self.assertEqual(EventCapacity.objects.get(event=self.event).current_participants, 1)
+        self.assertEqual(Event.objects.get(pk=self.event.pk).status, "approved")
+
+
+class OccurrencesAfterRemovalTests(TestCase):
+    def setUp(self):
+        self.organizer = make_user("org", "organizer")
+        self.start = date.today() - timedelta(days=date.today().weekday()) + timedelta(weeks=1)
+        self.series = EventSeries.objects.create(
+            title="Weekly meetup", organizer=self.organizer, status="approved", start_time=time(18),
+            freq="weekly", starts_on=self.start, count=4,
+        )
+        self.end = self.start + timedelta(weeks=4)
+
+    def dates(self):
+        return [o.date for o in occurrences_between(EventSeries.objects.all(), self.start, self.end)]
+
+    def test_materialized_dates_are_left_out(self):
+        materialize(self.series, self.start)
+        self.assertEqual(self.dates(), [self.start + timedelta(weeks=n) for n in (1, 2, 3)])
+
+    def test_archived_date_stays_gone(self):
+        event, _ = materialize(self.series, self.start + timedelta(weeks=1))
+        archive_batch([event.pk])
+        self.assertFalse(Event.all_objects.filter(pk=event.pk).exists())
+        self.assertEqual(self.dates(), [self.start + timedelta(weeks=n) for n in (0, 2, 3)])
+
+    def test_cancelled_date_stays_gone(self):
+        day = self.start + timedelta(weeks=2)
+        event, _ = materialize(self.series, day)
+        self.client.force_login(self.organizer)
+        self.client.post(reverse("events:series_occurrence_cancel", args=[self.series.pk, day.isoformat()]))
+        self.assertIsNotNone(Event.all_objects.get(pk=event.pk).deleted_at)
+        self.assertEqual(self.dates(), [self.start + timedelta(weeks=n) for n in (0, 1, 3)])
 
-# Create your tests here.
+    def test_deleted_series_has_no_dates(self):
+        event, _ = materialize(self.series, self.start)
+        self.client.force_login(self.organizer)
+        self.client.post(reverse("events:series_delete", args=[self.series.pk]))
+        self.assertIsNotNone(EventSeries.all_objects.get(pk=self.series.pk).deleted_at)
+        self.assertIsNotNone(Event.all_objects.get(pk=event.pk).deleted_at)
+        self.assertEqual(self.dates(), [])
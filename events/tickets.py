@@ -0,0 +1,348 @@
+"""
+Signed tickets and door check-in.
+
+Every Participation has a ticket: its event id and participation id,
+signed with HMAC-SHA256 and encoded as a short base64url token that the
+attendee's ticket page shows as a QR code. Nothing is stored per ticket.
+
+Each event signs with its own key, derived from SECRET_KEY. Keys never
+leave the server: anyone holding one could sign tickets. Changing
+SECRET_KEY invalidates every ticket.
+
+Scanning at the door costs one primary key lookup in Participation:
+
+- the token's signature is checked in memory;
+- the participation must still exist for that event, since a genuine
+  token can outlive its registration when a whole event is deleted;
+- cancelled registrations are looked up in the event's revocation list,
+  cached with the organizer and event status (ticket_context) and dropped
+  from the cache whenever it changes;
+- a second scan of the same ticket is caught with cache.add(), which is
+  atomic, so use a shared cache (Redis, Memcached) with several workers;
+- the check-in joins a per-process buffer written with one bulk INSERT
+  every CHECKIN_FLUSH_SIZE scans or CHECKIN_FLUSH_INTERVAL seconds, as the
+  audit log does.
+
+Scanners without a connection download scanner_bundle() first (the
+participation ids holding a ticket, the revocation list and the tickets
+already used) and post what they scanned to sync_check_ins() later. Offline
+a scanner can only read the ids out of a token, not check its signature,
+so every token is verified again and looked up when it is synced.
+Check-ins are unique per ticket, so the first scan wins and syncing twice
+is harmless.
+"""
+
+import atexit
+import base64
+import binascii
+import hashlib
+import hmac
+import logging
+import struct
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from django.utils.dateparse import parse_datetime
+
+from .models import CheckIn, Event, Participation, RevokedTicket
+
+
+logger = logging.getLogger(__name__)
+
+TOKEN_VERSION = 1
+TOKEN_BODY = struct.Struct(">BQQ")
+MAC_BYTES = 12
+
+CHECK_IN_STATUSES = {"approved", "full"}
+MAX_SYNC_ITEMS = 5000
+
+MESSAGES = {
+    "ok": "Checked in.",
+    "duplicate": "This ticket was already used.",
+    "revoked": "This registration was cancelled.",
+    "invalid": "Not a valid ticket.",
+    "wrong_event": "This ticket is for another event.",
+    "closed": "This event is not open for check-in.",
+}
+
+
+def ticket_setting(name):
+    defaults = {
+        "TICKET_CONTEXT_TTL": 60,
+        "CHECKIN_SEEN_TTL": 2 * 24 * 60 * 60,
+        "CHECKIN_FLUSH_SIZE": 50,
+        "CHECKIN_FLUSH_INTERVAL": 2,
+    }
+    return getattr(settings, name, defaults[name])
+
+
+# Tokens
+
+@lru_cache(maxsize=1024)
+def event_key(event_id):
+    return salted_hmac("events.tickets", f"event:{event_id}", algorithm="sha256").digest()
+
+
+def signature(event_id, body):
+    return hmac.new(event_key(event_id), body, hashlib.sha256).digest()[:MAC_BYTES]
+
+
+def make_token(event_id, participation_id):
+    body = TOKEN_BODY.pack(TOKEN_VERSION, event_id, participation_id)
+    return base64.urlsafe_b64encode(body + signature(event_id, body)).decode("ascii").rstrip("=")
+
+
+def ticket_token(participation):
+    return make_token(participation.event_id, participation.pk)
+
+
+def read_token(token):
+    """(event id, participation id) of a genuine token, or None."""
+    token = (token or "").strip()
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (binascii.Error, ValueError):
+        return None
+    if len(raw) != TOKEN_BODY.size + MAC_BYTES:
+        return None
+    body, mac = raw[:TOKEN_BODY.size], raw[TOKEN_BODY.size:]
+    version, event_id, participation_id = TOKEN_BODY.unpack(body)
+    if version != TOKEN_VERSION or not hmac.compare_digest(mac, signature(event_id, body)):
+        return None
+    return event_id, participation_id
+
+
+# What a scan needs to know about the event, cached
+
+TicketContext = namedtuple("TicketContext", "organizer_id open revoked")
+
+
+def context_key(event_id):
+    return f"tickets:event:{event_id}"
+
+
+def seen_key(event_id, participation_id):
+    return f"tickets:seen:{event_id}:{participation_id}"
+
+
+def ticket_context(event_id):
+    """TicketContext for the event, or None if there is no such event."""
+    context = cache.get(context_key(event_id))
+    if context is None:
+        row = Event.objects.filter(pk=event_id).values_list("organizer_id", "status").first()
+        if row is None:
+            context = False
+        else:
+            revoked = RevokedTicket.objects.filter(event_id=event_id).values_list("participation_id", flat=True)
+            context = TicketContext(row[0], row[1] in CHECK_IN_STATUSES, frozenset(revoked))
+        cache.set(context_key(event_id), context, ticket_setting("TICKET_CONTEXT_TTL"))
+    return context or None
+
+
+def invalidate(event_ids):
+    keys = [context_key(event_id) for event_id in set(event_ids)]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def revoke(tickets):
+    """Revoke the tickets of the (event id, participation id) pairs. Call inside the deleting transaction."""
+    RevokedTicket.objects.bulk_create(
+        [RevokedTicket(event_id=event_id, participation_id=pk) for event_id, pk in tickets],
+        ignore_conflicts=True,
+    )
+    invalidate(event_id for event_id, _ in tickets)
+
+
+# Recording check-ins
+
+class CheckInBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.check_ins = []
+        self.thread = None
+
+    def add(self, check_in):
+        with self.lock:
+            self.check_ins.append(check_in)
+            full = len(self.check_ins) >= ticket_setting("CHECKIN_FLUSH_SIZE")
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="checkin-flush", daemon=True)
+                self.thread.start()
+        if full:
+            self.flush()
+
+    def run(self):
+        while True:
+            time.sleep(ticket_setting("CHECKIN_FLUSH_INTERVAL"))
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Periodic check-in flush failed")
+            finally:
+                connection.close()
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of check-ins written."""
+        with self.flush_lock:
+            with self.lock:
+                check_ins, self.check_ins = self.check_ins, []
+            if not check_ins:
+                return 0
+            try:
+                CheckIn.objects.bulk_create(check_ins, batch_size=500, ignore_conflicts=True)
+            except Exception:
+                logger.exception("Could not write %d check-ins; keeping them for the next flush", len(check_ins))
+                with self.lock:
+                    self.check_ins = check_ins + self.check_ins
+                return 0
+            return len(check_ins)
+
+
+buffer = CheckInBuffer()
+atexit.register(buffer.flush)
+
+
+def flush():
+    return buffer.flush()
+
+
+def check_in(token, event_id, context, user):
+    """
+    Verify a ticket scanned at ``event_id``'s door and queue its check-in.
+    Returns {"result", "ticket", "message"} plus "checked_in_at" for a
+    ticket that was already used.
+    """
+    ticket = read_token(token)
+    if ticket is None:
+        result, participation_id = "invalid", None
+    else:
+        ticket_event, participation_id = ticket
+        if ticket_event != event_id:
+            result = "wrong_event"
+        elif not context.open:
+            result = "closed"
+        elif participation_id in context.revoked:
+            result = "revoked"
+        elif not Participation.objects.filter(pk=participation_id, event_id=event_id).exists():
+            result = "invalid"
+        else:
+            now = timezone.now()
+            key = seen_key(event_id, participation_id)
+            if cache.add(key, now.isoformat(), ticket_setting("CHECKIN_SEEN_TTL")):
+                buffer.add(CheckIn(
+                    event_id=event_id,
+                    participation_id=participation_id,
+                    checked_in_at=now,
+                    scanned_by_id=user.pk,
+                    source="online",
+                ))
+                result = "ok"
+            else:
+                response = {"result": "duplicate", "ticket": participation_id, "message": MESSAGES["duplicate"]}
+                response["checked_in_at"] = cache.get(key)
+                return response
+    return {"result": result, "ticket": participation_id, "message": MESSAGES[result]}
+
+
+def scanned_at(value, now):
+    try:
+        moment = parse_datetime(value) if isinstance(value, str) else None
+    except ValueError:
+        # Well formed but impossible, like 2024-02-30T10:00:00
+        moment = None
+    if moment is None:
+        return now
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    # A scanner's clock can be off; never record a check-in in the future
+    return min(moment, now)
+
+
+def sync_check_ins(event_id, context, items, user):
+    """
+    Record check-ins an offline scanner made: ``items`` is a list of
+    {"token", "checked_in_at"}. Every token is verified again and its
+    participation looked up, in one query for the whole batch. Returns
+    {"accepted", "duplicates", "rejected": [{"token", "result"}]}.
+    """
+    now = timezone.now()
+    accepted, tokens, rejected = {}, {}, []
+    for item in items[:MAX_SYNC_ITEMS]:
+        token = item.get("token", "") if isinstance(item, dict) else ""
+        ticket = read_token(token)
+        if ticket is None:
+            result = "invalid"
+        elif ticket[0] != event_id:
+            result = "wrong_event"
+        elif not context.open:
+            result = "closed"
+        elif ticket[1] in context.revoked:
+            result = "revoked"
+        else:
+            moment = scanned_at(item.get("checked_in_at"), now)
+            # Two scanners may have let the same ticket in; keep the earliest
+            if ticket[1] not in accepted or moment < accepted[ticket[1]]:
+                accepted[ticket[1]] = moment
+            tokens.setdefault(ticket[1], []).append(token)
+            continue
+        rejected.append({"token": token, "result": result})
+
+    registered = set(
+        Participation.objects
+        .filter(event_id=event_id, pk__in=list(accepted))
+        .values_list("pk", flat=True)
+    )
+    for pk in [pk for pk in accepted if pk not in registered]:
+        del accepted[pk]
+        rejected.extend({"token": token, "result": "invalid"} for token in tokens[pk])
+
+    # Online scans from this process have to be in the table to be seen
+    flush()
+    already = set(
+        CheckIn.objects
+        .filter(event_id=event_id, participation_id__in=list(accepted))
+        .values_list("participation_id", flat=True)
+    )
+    new = [
+        CheckIn(event_id=event_id, participation_id=pk, checked_in_at=moment, scanned_by_id=user.pk, source="offline")
+        for pk, moment in accepted.items()
+        if pk not in already
+    ]
+    CheckIn.objects.bulk_create(new, batch_size=500, ignore_conflicts=True)
+    cache.set_many(
+        {seen_key(event_id, c.participation_id): c.checked_in_at.isoformat() for c in new},
+        ticket_setting("CHECKIN_SEEN_TTL"),
+    )
+    return {
+        "accepted": len(new),
+        "duplicates": len(accepted) - len(new),
+        "rejected": rejected,
+        "truncated": len(items) > MAX_SYNC_ITEMS,
+    }
+
+
+def scanner_bundle(event):
+    """
+    Everything a scanner needs to check tickets for ``event`` without a
+    connection. Holds no key: the scanner accepts a token whose
+    participation id is in "tickets", and sync_check_ins() checks the
+    signature afterwards.
+    """
+    flush()
+    return {
+        "event": {"id": event.pk, "title": event.title, "date": event.date},
+        "token_version": TOKEN_VERSION,
+        "token_bytes": TOKEN_BODY.size + MAC_BYTES,
+        "tickets": sorted(Participation.objects.filter(event=event).values_list("pk", flat=True)),
+        "revoked": sorted(RevokedTicket.objects.filter(event=event).values_list("participation_id", flat=True)),
+        "checked_in": sorted(CheckIn.objects.filter(event=event).values_list("participation_id", flat=True)),
+        "generated_at": timezone.now(),
+    }
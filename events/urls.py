@@ -6,20 +6,34 @@ app_name = "events"
 urlpatterns = [
     # Attendee
     path("attendee/events/", views.attendee_events, name="attendee_events"),  # All events
+    path("attendee/events/nearby/", views.events_nearby_data, name="events_nearby_data"),
     path("attendee/my-events/", views.attendee_my_events, name="attendee_my_events"),  # My registered events
     path("attendee/events/<int:event_id>/join/", views.attendee_join_event, name="attendee_join_event"),
     path("attendee/events/<int:event_id>/leave/", views.attendee_leave_event, name="attendee_leave_event"),
     path("attendee/events/<int:event_id>/feedback/", views.feedback_create, name="feedback_create"),
+    path("attendee/events/<int:event_id>/ticket/", views.attendee_ticket, name="attendee_ticket"),
     path("attendee/profile/", views.attendee_profile_edit, name="attendee_profile"),
 
     # Organizer
     path("organizer/dashboard/", views.organizer_dashboard, name="organizer_dashboard"),
     path("organizer/events/", views.organizer_events, name="organizer_events"),
     path("organizer/events/create/", views.event_create, name="event_create"),
+    path("organizer/events/import/", views.event_import, name="event_import"),
     path("organizer/events/<int:pk>/update/", views.event_update, name="event_update"),
     path("organizer/events/<int:pk>/delete/", views.event_delete, name="event_delete"),
     path("organizer/events/<int:event_id>/feedback/", views.organizer_event_feedback, name="organizer_event_feedback"),
+    path("organizer/events/<int:pk>/check-in/", views.organizer_checkin, name="organizer_checkin"),
+    path("organizer/events/<int:pk>/check-in/scan/", views.checkin_scan, name="checkin_scan"),
+    path("organizer/events/<int:pk>/check-in/bundle/", views.checkin_bundle, name="checkin_bundle"),
+    path("organizer/events/<int:pk>/check-in/sync/", views.checkin_sync, name="checkin_sync"),
+    path("organizer/series/", views.organizer_series, name="organizer_series"),
+    path("organizer/series/create/", views.series_create, name="series_create"),
+    path("organizer/series/<int:pk>/delete/", views.series_delete, name="series_delete"),
+    path("organizer/series/<int:pk>/<str:day>/edit/", views.series_occurrence_edit, name="series_occurrence_edit"),
+    path("organizer/series/<int:pk>/<str:day>/cancel/", views.series_occurrence_cancel, name="series_occurrence_cancel"),
     path("organizer/profile/", views.organizer_profile_edit, name="organizer_profile"),
+    path("organizer/analytics/", views.organizer_analytics, name="organizer_analytics"),
+    path("organizer/analytics/data/", views.organizer_analytics_data, name="organizer_analytics_data"),
 
     # Admin
     path("admin/dashboard/", views.admin_dashboard, name="admin_dashboard"),
@@ -27,9 +41,38 @@ urlpatterns = [
     path("admin/events/", views.admin_review, name="admin_events"),  # alias to review list
     path("admin/approve/<int:pk>/", views.admin_approve, name="admin_approve"),
     path("admin/decline/<int:pk>/", views.admin_decline, name="admin_decline"),
+    path("admin/approve-series/<int:pk>/", views.admin_approve_series, name="admin_approve_series"),
+    path("admin/decline-series/<int:pk>/", views.admin_decline_series, name="admin_decline_series"),
     path("admin/feedback/", views.admin_feedback_overview, name="admin_feedback_overview"),  # All events
     path("admin/users/", views.admin_user_management, name="admin_user_management"),
+    path("admin/conflicts/", views.admin_schedule_conflicts, name="admin_schedule_conflicts"),
+    path("admin/audit/", views.admin_audit_log, name="admin_audit_log"),
+    path("admin/deletions/", views.admin_deletions, name="admin_deletions"),
+    path("admin/profiles/", views.admin_profiles, name="admin_profiles"),
+    path("admin/profiles/<str:profile_id>/", views.admin_profile_detail, name="admin_profile_detail"),
+    path("admin/profiles/<str:profile_id>/folded/", views.admin_profile_folded, name="admin_profile_folded"),
 
     # Event detail page (shared)
     path("events/<int:event_id>/", views.event_detail, name="event_detail"),
+    path("events/suggest/", views.event_suggest, name="event_suggest"),
+    path("series/<int:pk>/<str:day>/", views.series_occurrence, name="series_occurrence"),
+    path("series/<int:pk>/<str:day>/join/", views.series_join, name="series_join"),
+    path("events/<int:event_id>/participants/", views.event_participants, name="event_participants"),
+
+    # Calendar of approved events (shared)
+    path("calendar/", views.event_calendar, name="event_calendar"),
+    path("calendar/data/", views.event_calendar_data, name="event_calendar_data"),
+
+    # Public catalogue, prerendered to PRERENDER_ROOT
+    path("catalogue/", views.catalogue, name="catalogue"),
+    path("catalogue/index.json", views.catalogue, {"as_json": True}, name="catalogue_json"),
+    path("catalogue/page/<int:page>/", views.catalogue, name="catalogue_page"),
+    path("catalogue/page/<int:page>/index.json", views.catalogue, {"as_json": True}, name="catalogue_page_json"),
+    path("catalogue/state/", views.catalogue_state, name="catalogue_state"),
+    path("catalogue/<int:event_id>/", views.catalogue_event, name="catalogue_event"),
+    path("catalogue/<int:event_id>/index.json", views.catalogue_event, {"as_json": True}, name="catalogue_event_json"),
+
+    # Archived past events (shared)
+    path("history/", views.event_history, name="event_history"),
+    path("history/<int:event_id>/", views.event_history_detail, name="event_history_detail"),
 ]
@@ -1,12 +1,33 @@
-from datetime import datetime, date
+import json
+import math
+from datetime import datetime, date, timedelta
+from itertools import islice
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.db.models import Q
-from .models import Event, Participation, Feedback, EventCapacity
-from .forms import EventForm, FeedbackForm
+from django.urls import reverse
+from django.db import transaction
+from django.db.models import Avg, Count, FloatField, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from .models import Event, EventSeries, Participation, Feedback, EventCapacity, ArchivedEvent, ArchivedFeedback, CheckIn, DeletionJob
+from .forms import EventForm, EventImportFileForm, EventSeriesForm, FeedbackForm
+from . import audit, geo, prerender
+from .caching import cached, caching_setting
+from .calendars import VIEWS as CALENDAR_VIEWS, calendar_window
+from .images import upload_errors
+from .imports import detect_format, import_events
+from .deletion import deletion_backlog, tombstone_event, tombstone_series
+from .notifications import enqueue
+from .recurrence import Occurrence, cancel_date, dates_between, describe, is_occurrence, materialize, occurrences_between
+from .rollups import MAX_RANGE, activity_series
+from .schedule import attendee_conflicts, conflict_report, slot_label, venue_conflicts
+from .suggest import suggest
+from .tickets import check_in, flush as flush_check_ins, scanner_bundle, sync_check_ins, ticket_context, ticket_token
 from accounts.forms import UserProfileForm
+from community_events import profiling
 
 
 User = get_user_model()
@@ -16,6 +37,10 @@ def user_role(user):
     return getattr(getattr(user, "profile", None), "role", "attendee")
 
 
+def is_admin(user):
+    return user.is_superuser or user_role(user) == "admin"
+
+
 def allow(request, roles: set):
     """Check if the current user can view this page."""
     if request.user.is_superuser:
@@ -26,8 +51,68 @@ def allow(request, roles: set):
     return False
 
 
+# Dashboard and listing data, cached (see events/caching.py)
+
+def feedback_summary():
+    """{event id: (average rating, review count)} of every event with feedback."""
+    def compute():
+        rows = Feedback.objects.order_by().values("event_id").annotate(avg=Avg("rating"), n=Count("id"))
+        return {r["event_id"]: (round(r["avg"], 1), r["n"]) for r in rows}
+
+    return cached("feedback-summary", compute, caching_setting("VIEW_CACHE_TTL"), tags=("feedback",))
+
+
+def with_ratings(events):
+    """Set avg_rating and fb_count on each of ``events``."""
+    summary = feedback_summary()
+    for e in events:
+        e.avg_rating, e.fb_count = summary.get(e.id, ("-", 0))
+    return events
+
+
 #This are all for the attendee side
 
+RECOMMENDATIONS_SHOWN = 4
+DEFAULT_RADIUS_KM = 25
+RADIUS_CHOICES_KM = (5, 10, 25, 50, 100)
+NEARBY_DATA_LIMIT = 500
+# How far ahead recurring event dates are listed
+SERIES_LISTING_DAYS = 28
+
+
+def search_origin(request):
+    """
+    Centre of an "events near" search: browser coordinates (lat/lng) or a
+    place name looked up in the gazetteer (near). Returns (origin, error);
+    both are None when neither is given.
+    """
+    try:
+        radius = float(request.GET.get("radius", DEFAULT_RADIUS_KM))
+    except ValueError:
+        radius = DEFAULT_RADIUS_KM
+    if not math.isfinite(radius):
+        radius = DEFAULT_RADIUS_KM
+    radius = min(max(radius, 1), geo.MAX_RADIUS_KM)
+
+    lat, lng = request.GET.get("lat", ""), request.GET.get("lng", "")
+    if lat and lng:
+        try:
+            lat, lng = float(lat), float(lng)
+        except ValueError:
+            lat = lng = None
+        if lat is not None and math.isfinite(lat) and math.isfinite(lng) and -90 <= lat <= 90 and -180 <= lng <= 180:
+            return {"latitude": lat, "longitude": lng, "radius": radius, "label": "your location"}, None
+        return None, "Your location could not be read."
+
+    near = request.GET.get("near", "").strip()
+    if not near:
+        return None, None
+    place = geo.geocode(near)
+    if place is None:
+        return None, f"We couldn't find “{near}”. Try a city or a well-known venue."
+    return {"latitude": place.latitude, "longitude": place.longitude, "radius": radius, "label": place.name}, None
+
+
 @login_required
 def attendee_events(request):
     if not allow(request, {"attendee"}):
@@ -38,32 +123,104 @@ def attendee_events(request):
     if q:
         events = events.filter(title__icontains=q)
 
-    joined_qs = Participation.objects.filter(user=request.user)
+    origin, near_error = search_origin(request)
+    if origin:
+        events = geo.nearby(events, origin["latitude"], origin["longitude"], origin["radius"])
+
+    # Dates of recurring events nobody has joined yet have no Event row
+    today = date.today()
+    series = EventSeries.objects.filter(status="approved")
+    if q:
+        series = series.filter(title__icontains=q)
+    occurrences = occurrences_between(series, today, today + timedelta(days=SERIES_LISTING_DAYS))
+    if origin:
+        occurrences = geo.nearby_items(occurrences, origin["latitude"], origin["longitude"], origin["radius"])
+
+    joined_qs = Participation.objects.filter(user=request.user, event__deleted_at__isnull=True)
     joined_ids = set(joined_qs.values_list("event_id", flat=True))
 
     total_joined = joined_qs.count()
-    today = date.today()
     upcoming_joined = joined_qs.filter(event__date__gte=today).count()
 
-    for e in events:
-        feedbacks = Feedback.objects.filter(event=e)
-        if feedbacks.exists():
-            total = sum(f.rating for f in feedbacks)
-            e.avg_rating = round(total / feedbacks.count(), 1)
-            e.fb_count = feedbacks.count()
-        else:
-            e.avg_rating = "-"
-            e.fb_count = 0
+    with_ratings(events)
+
+    # Precomputed by the compute_recommendations command
+    recommended = (
+        Event.objects
+        .filter(recommendations__user=request.user, status="approved")
+        .exclude(participants__user=request.user)
+        .order_by("recommendations__rank")[:RECOMMENDATIONS_SHOWN]
+    )
 
     return render(request, "events/attendee_events.html", {
         "events": events,
         "q": q,
+        "origin": origin,
+        "occurrences": occurrences,
+        "near_error": near_error,
+        "near": request.GET.get("near", "").strip(),
+        "radius": origin["radius"] if origin else DEFAULT_RADIUS_KM,
+        "radius_choices": RADIUS_CHOICES_KM,
         "joined_ids": joined_ids,
         "total_joined": total_joined,
         "upcoming_joined": upcoming_joined,
+        "recommended": recommended,
     })
 
 
+@login_required
+def events_nearby_data(request):
+    """
+    Approved events as JSON, either within ``radius`` km of lat/lng (nearest
+    first) or inside ``bbox=south,west,north,east`` for a map viewport.
+    """
+    events = Event.objects.filter(status="approved").only(
+        "id", "title", "date", "start_time", "location", "latitude", "longitude",
+    )
+    bbox = request.GET.get("bbox")
+    if bbox:
+        try:
+            south, west, north, east = (float(v) for v in bbox.split(","))
+        except ValueError:
+            return JsonResponse({"error": "bbox must be south,west,north,east."}, status=400)
+        if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+            return JsonResponse({"error": "bbox is out of range."}, status=400)
+        found = list(geo.in_box(events, south, west, north, east).order_by("date", "start_time")[:NEARBY_DATA_LIMIT])
+    else:
+        origin, error = search_origin(request)
+        if origin is None:
+            return JsonResponse({"error": error or "Give lat and lng, near, or bbox."}, status=400)
+        found = geo.nearby(events, origin["latitude"], origin["longitude"], origin["radius"])[:NEARBY_DATA_LIMIT]
+
+    return JsonResponse({"events": [
+        {
+            "id": e.id,
+            "title": e.title,
+            "date": e.date.isoformat() if e.date else None,
+            "location": e.location,
+            "latitude": e.latitude,
+            "longitude": e.longitude,
+            "distance_km": round(e.distance_km, 1) if hasattr(e, "distance_km") else None,
+        }
+        for e in found
+    ]})
+
+
+SUGGESTIONS_SHOWN = 8
+
+
+@login_required
+def event_suggest(request):
+    """Title suggestions for the search boxes, from the in-process index (see events/suggest.py)."""
+    try:
+        limit = int(request.GET.get("limit", SUGGESTIONS_SHOWN))
+    except ValueError:
+        return JsonResponse({"error": "limit must be a number."}, status=400)
+    # Organizers searching their own events only get their own titles
+    organizer_id = request.user.id if request.GET.get("mine") else None
+    return JsonResponse({"suggestions": suggest(request.GET.get("q", ""), limit, organizer_id)})
+
+
 @login_required
 def attendee_my_events(request):
     """Events the attendee has registered for."""
@@ -72,23 +229,12 @@ def attendee_my_events(request):
 
     participations = (
         Participation.objects
-        .filter(user=request.user)
+        .filter(user=request.user, event__deleted_at__isnull=True)
         .select_related("event")
         .order_by("event__date")
     )
 
-    events = []
-    for p in participations:
-        e = p.event
-        feedbacks = Feedback.objects.filter(event=e)
-        if feedbacks.exists():
-            total = sum(f.rating for f in feedbacks)
-            e.avg_rating = round(total / feedbacks.count(), 1)
-            e.fb_count = feedbacks.count()
-        else:
-            e.avg_rating = "-"
-            e.fb_count = 0
-        events.append(e)
+    events = with_ratings([p.event for p in participations])
 
     return render(request, "events/attendee_my_events.html", {
         "events": events,
@@ -141,20 +287,30 @@ def attendee_join_event(request, event_id):
         messages.error(request, "This event is already full.")
         return redirect("events:attendee_events")
 
-    # Prevent double-joining
-    participation, created = Participation.objects.get_or_create(
-        user=request.user,
-        event=event,
-    )
+    # Attendees can't be in two places at once
+    clashes = attendee_conflicts(request.user, event)
+    if clashes:
+        titles = ", ".join(f"“{e.title}” ({slot_label(e)})" for e in clashes)
+        messages.error(request, f"This event overlaps with {titles}, which you already joined.")
+        return redirect("events:attendee_events")
+
+    with transaction.atomic():
+        # Prevent double-joining
+        participation, created = Participation.objects.get_or_create(
+            user=request.user,
+            event=event,
+        )
+
+        if created:
+            # 🔹 Recalculate and sync cached current_participants
+            capacity.current_participants = event.participants.count()
+            capacity.save()
+            enqueue("participant_joined", event, attendee=request.user.get_full_name() or request.user.username)
 
     if not created:
         messages.info(request, "You have already joined this event.")
         return redirect("events:attendee_events")
 
-    # 🔹 Recalculate and sync cached current_participants
-    capacity.current_participants = event.participants.count()
-    capacity.save()
-
     messages.success(request, "You successfully joined this event.")
     return redirect("events:attendee_events")
 
@@ -165,8 +321,8 @@ def attendee_leave_event(request, event_id):
     if not allow(request, {"attendee"}):
         return redirect("route_after_login")
 
-    # Only approved events can be left
-    event = get_object_or_404(Event, pk=event_id, status="approved")
+    # Only approved events can be left, full ones included
+    event = get_object_or_404(Event, pk=event_id, status__in=("approved", "full"))
 
     participation = Participation.objects.filter(
         user=request.user,
@@ -192,24 +348,27 @@ def attendee_leave_event(request, event_id):
         # Just redirect if someone hits the URL directly via GET
         return redirect("events:attendee_my_events")
 
-    # Delete the participation
-    participation.delete()
+    with transaction.atomic():
+        # Delete the participation
+        participation.delete()
 
-    # Update capacity if it exists
-    try:
-        capacity = event.capacity
-    except EventCapacity.DoesNotExist:
-        capacity = None
+        # Update capacity if it exists
+        try:
+            capacity = event.capacity
+        except EventCapacity.DoesNotExist:
+            capacity = None
 
-    if capacity:
-        # sync cached count with real participants
-        capacity.current_participants = event.participants.count()
-        capacity.save()
+        if capacity:
+            # sync cached count with real participants
+            capacity.current_participants = event.participants.count()
+            capacity.save()
 
-        # if event was full and now has space, reopen it
-        if event.status == "full" and capacity.current_participants < capacity.max_participants:
-            event.status = "approved"
-            event.save(update_fields=["status"])
+            # if event was full and now has space, reopen it
+            if event.status == "full" and capacity.current_participants < capacity.max_participants:
+                event.status = "approved"
+                event.save(update_fields=["status"])
+
+        enqueue("participant_left", event, attendee=request.user.get_full_name() or request.user.username)
 
     messages.success(request, "You have been unregistered from this event.")
     return redirect("events:attendee_my_events")
@@ -258,29 +417,26 @@ def organizer_dashboard(request):
         return redirect("route_after_login")
 
     today = date.today()
-    my_events = Event.objects.filter(organizer=request.user)
-
-    total_events = my_events.count()
-    pending = my_events.filter(status="pending").count()
-    approved = my_events.filter(status="approved").count()
-    declined = my_events.filter(status="declined").count()
-    upcoming = my_events.filter(date__gte=today, status="approved").count()
-
-    total_participants = Participation.objects.filter(event__organizer=request.user).count()
-    total_feedback = Feedback.objects.filter(event__organizer=request.user).count()
-
-    upcoming_list = my_events.filter(date__gte=today).order_by("date")[:5]
-
-    return render(request, "events/organizer_dashboard.html", {
-        "total_events": total_events,
-        "pending": pending,
-        "approved": approved,
-        "declined": declined,
-        "upcoming": upcoming,
-        "total_participants": total_participants,
-        "total_feedback": total_feedback,
-        "upcoming_list": upcoming_list,
-    })
+    return render(request, "events/organizer_dashboard.html", cached(
+        f"organizer-dashboard:{request.user.id}:{today.isoformat()}",
+        lambda: organizer_overview(request.user.id, today),
+        caching_setting("VIEW_CACHE_TTL"),
+        tags=(f"organizer:{request.user.id}", "participations", "feedback"),
+    ))
+
+
+def organizer_overview(organizer_id, today):
+    my_events = Event.objects.filter(organizer_id=organizer_id)
+    return {
+        "total_events": my_events.count(),
+        "pending": my_events.filter(status="pending").count(),
+        "approved": my_events.filter(status="approved").count(),
+        "declined": my_events.filter(status="declined").count(),
+        "upcoming": my_events.filter(date__gte=today, status="approved").count(),
+        "total_participants": Participation.objects.filter(event__in=my_events).count(),
+        "total_feedback": Feedback.objects.filter(event__in=my_events).count(),
+        "upcoming_list": list(my_events.filter(date__gte=today).order_by("date").values("id", "title", "date")[:5]),
+    }
 
 
 @login_required
@@ -304,15 +460,7 @@ def organizer_events(request):
     if date_to:
         my_events = my_events.filter(date__lte=date_to)
 
-    for e in my_events:
-        feedbacks = Feedback.objects.filter(event=e)
-        if feedbacks.exists():
-            total = sum(f.rating for f in feedbacks)
-            e.avg_rating = round(total / feedbacks.count(), 1)
-            e.fb_count = feedbacks.count()
-        else:
-            e.avg_rating = "-"
-            e.fb_count = 0
+    with_ratings(my_events)
 
     return render(request, "events/organizer_events.html", {
         "my_events": my_events,
@@ -323,13 +471,63 @@ def organizer_events(request):
     })
 
 
+@login_required
+def organizer_analytics(request):
+    if not allow(request, {"organizer"}):
+        return redirect("route_after_login")
+
+    my_events = Event.objects.filter(organizer=request.user).only("id", "title").order_by("-date")
+    return render(request, "events/organizer_analytics.html", {
+        "my_events": my_events,
+        "default_start": date.today() - timedelta(days=29),
+        "default_end": date.today(),
+    })
+
+
+@login_required
+def organizer_analytics_data(request):
+    """JSON series of joins and ratings, answered from the rollup tables."""
+    if not (request.user.is_superuser or user_role(request.user) == "organizer"):
+        return JsonResponse({"error": "Organizer access only."}, status=403)
+
+    granularity = request.GET.get("granularity", "day")
+    if granularity not in MAX_RANGE:
+        return JsonResponse({"error": "granularity must be 'hour' or 'day'."}, status=400)
+
+    try:
+        end = date.fromisoformat(request.GET.get("end") or date.today().isoformat())
+        start = date.fromisoformat(request.GET.get("start") or (end - timedelta(days=29)).isoformat())
+    except ValueError:
+        return JsonResponse({"error": "start and end must be YYYY-MM-DD dates."}, status=400)
+    if start > end or end - start > MAX_RANGE[granularity]:
+        return JsonResponse({"error": f"Range too large for {granularity} buckets."}, status=400)
+
+    event = None
+    event_id = request.GET.get("event")
+    if event_id:
+        try:
+            event_id = int(event_id)
+        except ValueError:
+            return JsonResponse({"error": "event must be an event id."}, status=400)
+        events = Event.objects.all() if request.user.is_superuser else Event.objects.filter(organizer=request.user)
+        event = get_object_or_404(events, pk=event_id)
+
+    return JsonResponse({
+        "granularity": granularity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "event": event.id if event else None,
+        "series": activity_series(granularity, start, end, organizer=request.user, event=event),
+    })
+
+
 @login_required
 def event_create(request):
     if not allow(request, {"organizer"}):
         return redirect("route_after_login")
 
     if request.method == "POST":
-        form = EventForm(request.POST, request.FILES)
+        form = EventForm(request.POST, request.FILES, upload_errors=upload_errors(request))
         if form.is_valid():
             event = form.save(commit=False)
             event.organizer = request.user
@@ -348,6 +546,40 @@ def event_create(request):
     return render(request, "events/event_form.html", {"form": form})
 
 
+@login_required
+def event_import(request):
+    """Create many events at once from a CSV or iCalendar file (see events/imports.py)."""
+    if not allow(request, {"organizer"}):
+        return redirect("route_after_login")
+
+    report = None
+    if request.method == "POST":
+        form = EventImportFileForm(request.POST, request.FILES)
+        valid = form.is_valid()
+        for field, message in upload_errors(request).items():
+            form.add_error(field if field in form.fields else None, message)
+        if valid and not form.errors:
+            upload = form.cleaned_data["file"]
+            report = import_events(
+                upload,
+                request.user,
+                file_format=detect_format(upload.name),
+                dry_run=form.cleaned_data["dry_run"],
+            )
+            if "application/json" in request.headers.get("Accept", ""):
+                return JsonResponse(report)
+            if report["created"] and not form.cleaned_data["dry_run"]:
+                messages.success(request, f"{report['created']} events imported and submitted for review.")
+    else:
+        form = EventImportFileForm()
+
+    return render(request, "events/event_import.html", {
+        "form": form,
+        "report": report,
+        "dry_run": form.cleaned_data.get("dry_run") if report else False,
+    })
+
+
 @login_required
 def event_update(request, pk):
     if not allow(request, {"organizer"}):
@@ -360,7 +592,15 @@ def event_update(request, pk):
         return redirect("events:organizer_events")
 
     if request.method == "POST":
-        form = EventForm(request.POST, request.FILES, instance=event)
+        form = EventForm(
+            request.POST,
+            request.FILES,
+            instance=event,
+            initial={
+                "max_participants": EventCapacity.objects.filter(event=event).values_list("max_participants", flat=True).first(),
+            },
+            upload_errors=upload_errors(request),
+        )
         if form.is_valid():
             updated_event = form.save()
 
@@ -376,6 +616,7 @@ def event_update(request, pk):
             capacity.max_participants = max_participants
             capacity.save()
 
+            audit.record(request, "event.update", updated_event, changes=audit.form_changes(form))
             messages.success(request, "Event updated.")
             return redirect("events:organizer_events")
         else:
@@ -409,7 +650,15 @@ def event_delete(request, pk):
 
     event = get_object_or_404(Event, pk=pk, organizer=request.user)
     if request.method == "POST":
-        event.delete()
+        with transaction.atomic():
+            recipients = list(event.participants.values_list("user_id", flat=True))
+            enqueue("event_deleted", event, recipients=recipients)
+            audit.record(request, "event.delete", event, changes={"status": event.status, "participants": len(recipients)})
+            if event.series_id:
+                # Otherwise the date would come back as an unmaterialized occurrence
+                cancel_date(event.series_id, event.occurrence_date)
+            # Hidden now; participations, feedback and the image go in the background
+            tombstone_event(event)
         messages.success(request, "Event deleted.")
         return redirect("events:organizer_events")
 
@@ -466,48 +715,48 @@ def admin_dashboard(request):
         messages.error(request, "Admin access only.")
         return redirect("route_after_login")
 
-    from datetime import timedelta
     today = date.today()
-    week_from_now = today + timedelta(days=7)
+    return render(request, "events/admin_dashboard.html", cached(
+        f"admin-dashboard:{today.isoformat()}",
+        lambda: admin_overview(today),
+        caching_setting("VIEW_CACHE_TTL"),
+        tags=("events", "profiles", "feedback"),
+    ))
 
-    events_qs = Event.objects.all()
 
-    total_events = events_qs.count()
-    pending_events = events_qs.filter(status="pending").count()
-    approved_events = events_qs.filter(status="approved").count()
-    declined_events = events_qs.filter(status="declined").count()
-    upcoming_events = events_qs.filter(date__gte=today).count()
-
-    total_users = User.objects.count()
-    attendees = User.objects.filter(profile__role="attendee").count()
-    organizers = User.objects.filter(profile__role="organizer").count()
-    admins = User.objects.filter(profile__role="admin").count()
-
-    events_next_week = events_qs.filter(date__gte=today, date__lte=week_from_now).order_by("date")[:5]
-
-    top_events = []
-    approved = events_qs.filter(status="approved")
-    for e in approved:
-        fbs = Feedback.objects.filter(event=e)
-        if fbs.exists():
-            total = sum(f.rating for f in fbs)
-            avg = round(total / fbs.count(), 1)
-            top_events.append((avg, fbs.count(), e))
+def admin_overview(today):
+    events_qs = Event.objects.all()
+    users = User.objects.filter(profile__deleted_at__isnull=True)
+
+    rated = (
+        events_qs
+        .filter(status="approved")
+        .annotate(avg=Avg("feedbacks__rating"), n=Count("feedbacks"))
+        .filter(n__gt=0)
+        .order_by("id")
+        .values_list("id", "title", "avg", "n")
+    )
+    top_events = [(round(avg, 1), n, {"id": pk, "title": title}) for pk, title, avg, n in rated]
     top_events = sorted(top_events, key=lambda x: (-x[0], -x[1]))[:5]
 
-    return render(request, "events/admin_dashboard.html", {
-        "total_events": total_events,
-        "pending_events": pending_events,
-        "approved_events": approved_events,
-        "declined_events": declined_events,
-        "upcoming_events": upcoming_events,
-        "total_users": total_users,
-        "attendees": attendees,
-        "organizers": organizers,
-        "admins": admins,
-        "events_next_week": events_next_week,
+    return {
+        "total_events": events_qs.count(),
+        "pending_events": events_qs.filter(status="pending").count(),
+        "approved_events": events_qs.filter(status="approved").count(),
+        "declined_events": events_qs.filter(status="declined").count(),
+        "upcoming_events": events_qs.filter(date__gte=today).count(),
+        "total_users": users.count(),
+        "attendees": users.filter(profile__role="attendee").count(),
+        "organizers": users.filter(profile__role="organizer").count(),
+        "admins": users.filter(profile__role="admin").count(),
+        "events_next_week": list(
+            events_qs
+            .filter(date__gte=today, date__lte=today + timedelta(days=7))
+            .order_by("date")
+            .values("id", "title", "date")[:5]
+        ),
         "top_events": top_events,
-    })
+    }
 
 
 @login_required
@@ -516,8 +765,15 @@ def admin_review(request):
         messages.error(request, "Admin access only.")
         return redirect("route_after_login")
 
-    submissions = Event.objects.filter(status="pending")
-    return render(request, "events/admin_events.html", {"submissions": submissions})
+    # Dates of a pending series are approved along with the series
+    submissions = Event.objects.filter(status="pending", series__isnull=True)
+    series_submissions = list(EventSeries.objects.filter(status="pending").select_related("organizer"))
+    for series in series_submissions:
+        series.rule = describe(series)
+    return render(request, "events/admin_events.html", {
+        "submissions": submissions,
+        "series_submissions": series_submissions,
+    })
 
 
 @login_required
@@ -528,9 +784,16 @@ def admin_approve(request, pk):
 
     event = get_object_or_404(Event, pk=pk, status="pending")
     if request.method == "POST":
-        event.status = "approved"
-        event.save()
+        with transaction.atomic():
+            event.status = "approved"
+            event.save()
+            enqueue("event_approved", event)
+            audit.record(request, "event.approve", event, changes={"status": ["pending", "approved"]})
         messages.success(request, "Event approved.")
+        clashes = venue_conflicts(event.location, event.date, event.start_time, event.end_time, exclude_pk=event.pk)
+        if clashes:
+            titles = ", ".join(f"“{e.title}”" for e in clashes)
+            messages.warning(request, f"It overlaps with {titles} at the same location.")
     return redirect("events:admin_review")
 
 
@@ -542,8 +805,11 @@ def admin_decline(request, pk):
 
     event = get_object_or_404(Event, pk=pk, status="pending")
     if request.method == "POST":
-        event.status = "declined"
-        event.save()
+        with transaction.atomic():
+            event.status = "declined"
+            event.save()
+            enqueue("event_declined", event)
+            audit.record(request, "event.decline", event, changes={"status": ["pending", "declined"]})
         messages.warning(request, "Event declined.")
     return redirect("events:admin_review")
 
@@ -571,15 +837,7 @@ def admin_feedback_overview(request):
     if status:
         events = events.filter(status=status)
 
-    for e in events:
-        feedbacks = Feedback.objects.filter(event=e)
-        if feedbacks.exists():
-            total = sum(f.rating for f in feedbacks)
-            e.avg_rating = round(total / feedbacks.count(), 1)
-            e.fb_count = feedbacks.count()
-        else:
-            e.avg_rating = "-"
-            e.fb_count = 0
+    with_ratings(events)
 
     return render(request, "events/admin_feedback_overview.html", {
         "events": events,
@@ -588,6 +846,191 @@ def admin_feedback_overview(request):
     })
 
 
+USERS_PER_PAGE = 50
+
+
+CONFLICT_GROUPS_PER_PAGE = 50
+
+
+@login_required
+def admin_schedule_conflicts(request):
+    if not (request.user.is_superuser or user_role(request.user) == "admin"):
+        messages.error(request, "Admin access only.")
+        return redirect("route_after_login")
+
+    show_past = request.GET.get("past") == "1"
+    groups = conflict_report(date_from=None if show_past else date.today())
+    page_obj = Paginator(groups, CONFLICT_GROUPS_PER_PAGE).get_page(request.GET.get("page"))
+
+    return render(request, "events/admin_schedule_conflicts.html", {
+        "groups": page_obj,
+        "page_obj": page_obj,
+        "pair_count": sum(len(g["pairs"]) for g in groups),
+        "show_past": show_past,
+    })
+
+
+AUDIT_PER_PAGE = 50
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+@login_required
+def admin_audit_log(request):
+    if not is_admin(request.user):
+        messages.error(request, "Admin access only.")
+        return redirect("route_after_login")
+
+    # Show this process's buffered entries straight away
+    audit.flush()
+
+    actor = request.GET.get("actor", "").strip()
+    target_type = request.GET.get("target_type", "")
+    target_id = request.GET.get("target_id", "").strip()
+    date_from = parse_date(request.GET.get("from"))
+    date_to = parse_date(request.GET.get("to"))
+
+    actor_id = None
+    if actor:
+        actor_id = User.objects.filter(username=actor).values_list("id", flat=True).first()
+    entries = audit.audit_entries(
+        actor_id=actor_id,
+        target_type=target_type if target_type in {"event", "eventseries", "user"} else None,
+        target_id=int(target_id) if target_id.isdigit() else None,
+        start=date_from,
+        end=date_to + timedelta(days=1) if date_to else None,
+    )
+    if actor and actor_id is None:
+        # Deleted users only survive as the username snapshot
+        entries = entries.filter(actor_username=actor)
+
+    page_obj = Paginator(entries, AUDIT_PER_PAGE).get_page(request.GET.get("page"))
+    filters = request.GET.copy()
+    filters.pop("page", None)
+
+    return render(request, "events/admin_audit_log.html", {
+        "entries": page_obj,
+        "page_obj": page_obj,
+        "actor": actor,
+        "target_type": target_type,
+        "target_id": target_id,
+        "date_from": date_from,
+        "date_to": date_to,
+        "filter_query": filters.urlencode(),
+    })
+
+
+DELETIONS_SHOWN = 100
+PROFILE_MAX_MINUTES = 120
+
+
+@login_required
+def admin_deletions(request):
+    """Deleted events and users still being purged, and the latest finished purges."""
+    if not is_admin(request.user):
+        messages.error(request, "Admin access only.")
+        return redirect("route_after_login")
+
+    active = DeletionJob.objects.exclude(status="done")
+    finished = DeletionJob.objects.filter(status="done").order_by("-finished_at", "-id")
+    return render(request, "events/admin_deletions.html", {
+        "active": active[:DELETIONS_SHOWN],
+        "finished": finished[:DELETIONS_SHOWN],
+        "backlog": deletion_backlog(),
+    })
+
+
+# Request profiles (see community_events/profiling.py)
+
+@login_required
+def admin_profiles(request):
+    """Stored request profiles, and the form that starts or stops sampling."""
+    if not request.user.is_superuser:
+        messages.error(request, "Superuser access only.")
+        return redirect("route_after_login")
+
+    error = ""
+    if request.method == "POST":
+        if request.POST.get("action") == "stop":
+            profiling.stop_sampling()
+            return redirect("events:admin_profiles")
+        try:
+            rate = float(request.POST.get("rate", ""))
+            minutes = int(request.POST.get("minutes", ""))
+        except ValueError:
+            rate = minutes = 0
+        mode = request.POST.get("mode", "sample")
+        path = request.POST.get("path", "/").strip() or "/"
+        if not 0 < rate <= 1 or not 1 <= minutes <= PROFILE_MAX_MINUTES:
+            error = f"Give a rate between 0 and 1 and 1 to {PROFILE_MAX_MINUTES} minutes."
+        elif mode not in profiling.MODES or not path.startswith("/"):
+            error = "Choose a profiler and a path starting with /."
+        else:
+            profiling.start_sampling(rate, path, mode, minutes)
+            return redirect("events:admin_profiles")
+
+    sampling = profiling.sampling()
+    return render(request, "events/admin_profiles.html", {
+        "profiles": profiling.list_profiles(),
+        "sampling": sampling,
+        "modes": profiling.MODES,
+        "error": error,
+    })
+
+
+@login_required
+def admin_profile_detail(request, profile_id):
+    if not request.user.is_superuser:
+        messages.error(request, "Superuser access only.")
+        return redirect("route_after_login")
+
+    found = profiling.load_profile(profile_id)
+    if found is None:
+        raise Http404("No such profile.")
+    meta, folded = found
+    return render(request, "events/admin_profile_detail.html", {
+        "profile": meta,
+        "tree": profiling.folded_tree(folded),
+    })
+
+
+@login_required
+def admin_profile_folded(request, profile_id):
+    """The raw folded stacks, for flamegraph.pl or speedscope."""
+    if not request.user.is_superuser:
+        return HttpResponseForbidden("Superuser access only.")
+
+    found = profiling.load_profile(profile_id)
+    if found is None:
+        raise Http404("No such profile.")
+    response = HttpResponse(found[1], content_type="text/plain; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{profile_id}.folded"'
+    return response
+
+
+def prefix_match(field, prefix):
+    """Index-friendly ``startswith``: a range scan on an already-lowercased column."""
+    return Q(**{f"{field}__gte": prefix, f"{field}__lt": prefix + "\uffff"})
+
+
+def count_of(model, field):
+    """Correlated COUNT(*) subquery, evaluated only for the rows actually returned."""
+    counts = (
+        model.objects
+        .filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(n=Count("*"))
+        .values("n")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
 @login_required
 def admin_user_management(request):
     if not (request.user.is_superuser or user_role(request.user) == "admin"):
@@ -597,21 +1040,33 @@ def admin_user_management(request):
     role_filter = (request.GET.get("role") or "").strip()
     q = (request.GET.get("q") or "").strip()
 
-    users = User.objects.all().select_related("profile").order_by("username")
+    # Deleted users are waiting to be purged
+    users = User.objects.filter(profile__deleted_at__isnull=True).select_related("profile").order_by("username")
 
     if role_filter:
         users = users.filter(profile__role=role_filter)
 
-    if q:
+    # Every word has to prefix-match the username, a name or the email
+    for term in q.lower().split():
         users = users.filter(
-            Q(username__icontains=q) |
-            Q(first_name__icontains=q) |
-            Q(last_name__icontains=q) |
-            Q(email__icontains=q)
+            prefix_match("search__username", term) |
+            prefix_match("search__first_name", term) |
+            prefix_match("search__last_name", term) |
+            prefix_match("search__email", term)
         )
 
+    users = users.annotate(
+        organized_count=count_of(Event, "organizer"),
+        participation_count=count_of(Participation, "user"),
+        feedback_count=count_of(Feedback, "user"),
+    )
+
+    paginator = Paginator(users, USERS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get("page"))
+
     context = {
-        "users": users,
+        "users": page_obj,
+        "page_obj": page_obj,
         "role_filter": role_filter,
         "q": q,
     }
@@ -620,21 +1075,522 @@ def admin_user_management(request):
 
 #This part is for the shared parts
 
+PARTICIPANTS_PER_PAGE = 50
+
+
+def can_view_participants(user):
+    """Only admins and organizers get to see who joined an event."""
+    return user.is_superuser or user_role(user) in {"admin", "organizer"}
+
+
 @login_required
 def event_detail(request, event_id):
-    """Detail page for an event, with participant list for organizers/admin."""
-    event = get_object_or_404(Event, pk=event_id)
+    """Detail page for an event. The participant roster is loaded separately."""
+    event = get_object_or_404(
+        Event.objects
+        .select_related("organizer", "capacity", "series")
+        .annotate(participant_count=Count("participants")),
+        pk=event_id,
+    )
     joined = Participation.objects.filter(user=request.user, event=event).exists()
 
+    capacity = getattr(event, "capacity", None)
+    if capacity and capacity.max_participants:
+        capacity_percent = min(100, round(event.participant_count * 100 / capacity.max_participants))
+    else:
+        capacity_percent = 0
+
+    return render(request, "events/event_detail.html", {
+        "event": event,
+        "joined": joined,
+        "capacity": capacity,
+        "participant_count": event.participant_count,
+        "capacity_percent": capacity_percent,
+        "show_participants": can_view_participants(request.user),
+        "series_rule": describe(event.series) if event.series_id else None,
+    })
+
+
+@login_required
+def event_participants(request, event_id):
+    """Paginated, searchable participant roster fragment for event_detail."""
+    if not can_view_participants(request.user):
+        return HttpResponseForbidden()
+
+    event = get_object_or_404(Event, pk=event_id)
+    q = (request.GET.get("q") or "").strip()
+
     participants = (
         Participation.objects
         .filter(event=event)
         .select_related("user")
-        .order_by("joined_at")
+        .only("joined_at", "user__username", "user__first_name", "user__last_name")
+        .order_by("joined_at", "id")
+    )
+    if q:
+        participants = participants.filter(
+            Q(user__username__icontains=q) |
+            Q(user__first_name__icontains=q) |
+            Q(user__last_name__icontains=q)
+        )
+
+    paginator = Paginator(participants, PARTICIPANTS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get("page"))
+
+    return render(request, "events/event_participants.html", {
+        "event": event,
+        "page_obj": page_obj,
+        "q": q,
+    })
+
+
+# Archived events (see events/archive.py)
+
+HISTORY_PER_PAGE = 25
+
+
+@login_required
+def event_history(request):
+    """Past events moved to the archive, scoped to what the user organized or joined."""
+    events = ArchivedEvent.objects.select_related("organizer")
+    if is_admin(request.user):
+        pass
+    elif user_role(request.user) == "organizer":
+        events = events.filter(organizer=request.user)
+    else:
+        events = events.filter(participants__user=request.user)
+
+    q = request.GET.get("q", "").strip()
+    if q:
+        events = events.filter(Q(title__icontains=q) | Q(location__icontains=q))
+
+    avg_rating = (
+        ArchivedFeedback.objects
+        .filter(event=OuterRef("pk"))
+        .order_by()
+        .values("event")
+        .annotate(avg=Avg("rating"))
+        .values("avg")
+    )
+    events = events.annotate(
+        feedback_count=count_of(ArchivedFeedback, "event"),
+        avg_rating=Subquery(avg_rating, output_field=FloatField()),
+    )
+
+    page_obj = Paginator(events, HISTORY_PER_PAGE).get_page(request.GET.get("page"))
+    return render(request, "events/event_history.html", {
+        "events": page_obj,
+        "page_obj": page_obj,
+        "q": q,
+    })
+
+
+@login_required
+def event_history_detail(request, event_id):
+    event = get_object_or_404(ArchivedEvent.objects.select_related("organizer"), pk=event_id)
+
+    allowed = (
+        is_admin(request.user)
+        or event.organizer_id == request.user.id
+        or event.participants.filter(user=request.user).exists()
+    )
+    if not allowed:
+        messages.error(request, "You are not allowed to view this page.")
+        return redirect("events:event_history")
+
+    feedbacks = event.feedbacks.select_related("user")
+    summary = feedbacks.aggregate(avg=Avg("rating"), count=Count("id"))
+
+    return render(request, "events/event_history_detail.html", {
+        "event": event,
+        "feedbacks": feedbacks,
+        "avg_rating": summary["avg"],
+        "feedback_count": summary["count"],
+    })
+
+
+# Calendar of approved events (see events/calendars.py)
+
+# Public catalogue, prerendered (see events/prerender.py). No login: the
+# pages hold nothing per visitor, catalogue_state fills that in.
+
+STATE_MAX_IDS = 100
+
+
+def catalogue(request, page=1, as_json=False):
+    return prerender.respond(request, "page", page, as_json)
+
+
+def catalogue_event(request, event_id, as_json=False):
+    return prerender.respond(request, "event", event_id, as_json)
+
+
+def catalogue_state(request):
+    """Who is looking at a prerendered page, and which of its events (``ids``) they joined."""
+    try:
+        ids = [int(v) for v in request.GET.get("ids", "").split(",") if v][:STATE_MAX_IDS]
+    except ValueError:
+        return JsonResponse({"error": "ids must be numbers."}, status=400)
+
+    if not request.user.is_authenticated:
+        state = {"authenticated": False, "login_url": reverse("login")}
+    else:
+        joined = Participation.objects.filter(user=request.user, event_id__in=ids).values_list("event_id", flat=True)
+        state = {
+            "authenticated": True,
+            "name": request.user.get_full_name() or request.user.username,
+            "role": "admin" if request.user.is_superuser else user_role(request.user),
+            "dashboard_url": reverse("accounts:route_after_login"),
+            "joined": sorted(joined),
+        }
+    response = JsonResponse(state)
+    response["Cache-Control"] = "private, no-store"
+    return response
+
+
+# Years the calendar can be opened at; around date.min and date.max the
+# grid, which reaches into the neighbouring months, would overflow
+CALENDAR_YEARS = (1900, 2200)
+
+
+def calendar_params(request):
+    """(view, anchor date, error) from ?view=month|week&date=YYYY-MM-DD."""
+    view = request.GET.get("view", "month")
+    if view not in CALENDAR_VIEWS:
+        return None, None, "view must be 'month' or 'week'."
+    anchor = parse_date(request.GET.get("date"))
+    if anchor is None and request.GET.get("date"):
+        return None, None, "date must be a YYYY-MM-DD date."
+    if anchor is not None and not CALENDAR_YEARS[0] <= anchor.year <= CALENDAR_YEARS[1]:
+        return None, None, f"date must be between {CALENDAR_YEARS[0]} and {CALENDAR_YEARS[1]}."
+    return view, anchor or date.today(), None
+
+
+@login_required
+def event_calendar(request):
+    view, anchor, error = calendar_params(request)
+    if error:
+        messages.error(request, error)
+        view, anchor = "month", date.today()
+
+    cal = calendar_window(view, anchor)
+    if view == "week":
+        previous, following = anchor - timedelta(days=7), anchor + timedelta(days=7)
+    else:
+        first = anchor.replace(day=1)
+        previous = (first - timedelta(days=1)).replace(day=1)
+        following = (first + timedelta(days=31)).replace(day=1)
+
+    return render(request, "events/event_calendar.html", {
+        "cal": cal,
+        "weeks": [cal["days"][i:i + 7] for i in range(0, len(cal["days"]), 7)],
+        "view": view,
+        "anchor": anchor,
+        "previous": previous,
+        "following": following,
+        "today": date.today(),
+    })
+
+
+@login_required
+def event_calendar_data(request):
+    """The calendar window as JSON: per-day counts, event ids and series ids."""
+    view, anchor, error = calendar_params(request)
+    if error:
+        return JsonResponse({"error": error}, status=400)
+
+    cal = calendar_window(view, anchor)
+    return JsonResponse({
+        "view": view,
+        "start": cal["start"].isoformat(),
+        "end": cal["end"].isoformat(),
+        "days": [
+            {
+                "date": day["date"].isoformat(),
+                "count": day["count"],
+                "events": [e["id"] for e in day["events"]],
+                "series": [o["series"] for o in day["occurrences"]],
+            }
+            for day in cal["days"]
+        ],
+    })
+
+
+# Recurring event series (see events/recurrence.py)
+
+SERIES_PREVIEW_DATES = 5
+
+
+def occurrence_day(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+@login_required
+def organizer_series(request):
+    if not allow(request, {"organizer"}):
+        return redirect("route_after_login")
+
+    series_list = list(
+        EventSeries.objects
+        .filter(organizer=request.user)
+        .annotate(materialized=Count("occurrences"))
+        .order_by("-created_at")
     )
+    today = date.today()
+    for series in series_list:
+        series.rule = describe(series)
+        series.upcoming = list(islice(dates_between(series, today, date.max), SERIES_PREVIEW_DATES))
+
+    return render(request, "events/organizer_series.html", {"series_list": series_list})
+
+
+@login_required
+def series_create(request):
+    if not allow(request, {"organizer"}):
+        return redirect("route_after_login")
+
+    if request.method == "POST":
+        form = EventSeriesForm(request.POST, request.FILES, upload_errors=upload_errors(request))
+        if form.is_valid():
+            series = form.save(commit=False)
+            series.organizer = request.user
+            series.status = "pending"
+            series.save()
+            messages.success(request, "Recurring event created and submitted for review.")
+            return redirect("events:organizer_series")
+        messages.error(request, "Please correct the errors below.")
+    else:
+        form = EventSeriesForm()
+
+    return render(request, "events/series_form.html", {"form": form})
+
+
+@login_required
+def series_occurrence_edit(request, pk, day):
+    """Give one date of the series its own Event row, then edit it like any event."""
+    if not allow(request, {"organizer"}):
+        return redirect("route_after_login")
+
+    series = get_object_or_404(EventSeries, pk=pk, organizer=request.user)
+    day = occurrence_day(day)
+    if day is None or not is_occurrence(series, day):
+        messages.error(request, "That date is not part of this series.")
+        return redirect("events:organizer_series")
+    if series.status == "approved":
+        messages.warning(request, "Approved events can’t be edited.")
+        return redirect("events:organizer_series")
+
+    event, _ = materialize(series, day)
+    return redirect("events:event_update", pk=event.pk)
+
+
+@login_required
+def series_occurrence_cancel(request, pk, day):
+    """Drop one date from the series, removing its registrations if it had any."""
+    if not allow(request, {"organizer"}):
+        return redirect("route_after_login")
+
+    series = get_object_or_404(EventSeries, pk=pk, organizer=request.user)
+    day = occurrence_day(day)
+    if request.method == "POST" and day is not None and is_occurrence(series, day):
+        with transaction.atomic():
+            series = cancel_date(series.pk, day)
+            event = series.occurrences.filter(occurrence_date=day).first()
+            if event is not None:
+                recipients = list(event.participants.values_list("user_id", flat=True))
+                enqueue("event_deleted", event, recipients=recipients)
+                audit.record(request, "event.delete", event, changes={"status": event.status, "participants": len(recipients)})
+                # Hidden now; participations, feedback and the image go in the background
+                tombstone_event(event)
+        messages.success(request, f"{series.title} on {day:%b %d, %Y} cancelled.")
+    return redirect("events:organizer_series")
+
+
+@login_required
+def series_delete(request, pk):
+    if not allow(request, {"organizer"}):
+        return redirect("route_after_login")
+
+    series = get_object_or_404(EventSeries, pk=pk, organizer=request.user)
+    if request.method == "POST":
+        with transaction.atomic():
+            # Materialized dates go with the series; tell whoever joined upcoming ones
+            for event in series.occurrences.filter(date__gte=date.today()):
+                recipients = list(event.participants.values_list("user_id", flat=True))
+                if recipients:
+                    enqueue("event_deleted", event, recipients=recipients)
+            tombstone_series(series)
+        messages.success(request, "Recurring event deleted.")
+        return redirect("events:organizer_series")
+
+    return render(request, "events/event_delete.html", {"object": series})
+
+
+@login_required
+def series_occurrence(request, pk, day):
+    """One date of a series. Dates that already have a row use the normal event page."""
+    series = get_object_or_404(EventSeries.objects.select_related("organizer"), pk=pk)
+    day = occurrence_day(day)
+    if day is None or not is_occurrence(series, day):
+        messages.error(request, "That date is not part of this series.")
+        return redirect("route_after_login")
+
+    event = series.occurrences.filter(occurrence_date=day).only("id").first()
+    if event is not None:
+        return redirect("events:event_detail", event_id=event.pk)
+    if series.status != "approved" and not (is_admin(request.user) or series.organizer_id == request.user.id):
+        messages.error(request, "You are not allowed to view this page.")
+        return redirect("route_after_login")
 
     return render(request, "events/event_detail.html", {
+        "event": Occurrence(series, day),
+        "joined": False,
+        "capacity": {"max_participants": series.max_participants},
+        "participant_count": 0,
+        "capacity_percent": 0,
+        "show_participants": False,
+        "series_rule": describe(series),
+    })
+
+
+@login_required
+def series_join(request, pk, day):
+    """Join one date of a series, creating its Event row on first use."""
+    if not allow(request, {"attendee"}):
+        return redirect("route_after_login")
+
+    series = get_object_or_404(EventSeries, pk=pk, status="approved")
+    day = occurrence_day(day)
+    if day is None or day < date.today() or not is_occurrence(series, day):
+        messages.error(request, "That date is not open for registration.")
+        return redirect("events:attendee_events")
+
+    # Check clashes before creating a row nobody ends up using
+    clashes = attendee_conflicts(request.user, Occurrence(series, day))
+    if clashes:
+        titles = ", ".join(f"“{e.title}” ({slot_label(e)})" for e in clashes)
+        messages.error(request, f"This event overlaps with {titles}, which you already joined.")
+        return redirect("events:attendee_events")
+
+    event, _ = materialize(series, day)
+    return attendee_join_event(request, event.pk)
+
+
+@login_required
+def admin_approve_series(request, pk):
+    if not is_admin(request.user):
+        messages.error(request, "Admin access only.")
+        return redirect("route_after_login")
+
+    series = get_object_or_404(EventSeries, pk=pk, status="pending")
+    if request.method == "POST":
+        with transaction.atomic():
+            series.status = "approved"
+            series.save(update_fields=["status", "last_date"])
+            series.occurrences.filter(status="pending").update(status="approved")
+            audit.record(request, "series.approve", series, changes={"status": ["pending", "approved"]})
+        messages.success(request, "Recurring event approved.")
+    return redirect("events:admin_review")
+
+
+@login_required
+def admin_decline_series(request, pk):
+    if not is_admin(request.user):
+        messages.error(request, "Admin access only.")
+        return redirect("route_after_login")
+
+    series = get_object_or_404(EventSeries, pk=pk, status="pending")
+    if request.method == "POST":
+        with transaction.atomic():
+            series.status = "declined"
+            series.save(update_fields=["status", "last_date"])
+            series.occurrences.filter(status="pending").update(status="declined")
+            audit.record(request, "series.decline", series, changes={"status": ["pending", "declined"]})
+        messages.warning(request, "Recurring event declined.")
+    return redirect("events:admin_review")
+
+
+# Tickets and door check-in (see events/tickets.py)
+
+@login_required
+def attendee_ticket(request, event_id):
+    """The attendee's ticket for an event they joined, as a QR code."""
+    if not allow(request, {"attendee"}):
+        return redirect("route_after_login")
+
+    participation = get_object_or_404(
+        Participation.objects.select_related("event"),
+        user=request.user,
+        event_id=event_id,
+        event__deleted_at__isnull=True,
+    )
+    return render(request, "events/attendee_ticket.html", {
+        "event": participation.event,
+        "participation": participation,
+        "token": ticket_token(participation),
+    })
+
+
+def can_check_in(user, context):
+    return context.organizer_id == user.pk or is_admin(user)
+
+
+@login_required
+def organizer_checkin(request, pk):
+    """Door scanner for one event: scans online, or offline with a later sync."""
+    if not allow(request, {"organizer"}):
+        return redirect("route_after_login")
+
+    event = get_object_or_404(Event, pk=pk, organizer=request.user)
+    flush_check_ins()
+    return render(request, "events/organizer_checkin.html", {
         "event": event,
-        "joined": joined,
-        "participants": participants,
+        "participant_count": event.participants.count(),
+        "checked_in_count": CheckIn.objects.filter(event=event).count(),
     })
+
+
+@login_required
+def checkin_scan(request, pk):
+    """Verify one scanned ticket. Answers from the signature and the cached revocation list."""
+    if request.method != "POST":
+        return JsonResponse({"error": "POST the scanned token."}, status=405)
+    context = ticket_context(pk)
+    if context is None:
+        return JsonResponse({"error": "No such event."}, status=404)
+    if not can_check_in(request.user, context):
+        return JsonResponse({"error": "Only the organizer can check attendees in."}, status=403)
+    return JsonResponse(check_in(request.POST.get("token", ""), pk, context, request.user))
+
+
+@login_required
+def checkin_bundle(request, pk):
+    """Ticket list, revocation list and used tickets for an offline scanner."""
+    context = ticket_context(pk)
+    if context is None:
+        return JsonResponse({"error": "No such event."}, status=404)
+    if not can_check_in(request.user, context):
+        return JsonResponse({"error": "Only the organizer can check attendees in."}, status=403)
+    return JsonResponse(scanner_bundle(get_object_or_404(Event, pk=pk)))
+
+
+@login_required
+def checkin_sync(request, pk):
+    """Bulk upload of an offline scanner's check-ins: {"check_ins": [{"token", "checked_in_at"}]}."""
+    if request.method != "POST":
+        return JsonResponse({"error": "POST the scanner's check-ins."}, status=405)
+    context = ticket_context(pk)
+    if context is None:
+        return JsonResponse({"error": "No such event."}, status=404)
+    if not can_check_in(request.user, context):
+        return JsonResponse({"error": "Only the organizer can check attendees in."}, status=403)
+    try:
+        items = json.loads(request.body)["check_ins"]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "Expected JSON with a check_ins list."}, status=400)
+    if not isinstance(items, list):
+        return JsonResponse({"error": "Expected JSON with a check_ins list."}, status=400)
+    return JsonResponse(sync_check_ins(pk, context, items, request.user))